@@ -0,0 +1,302 @@
+import asyncio
+import sys
+import threading
+from pathlib import Path
+from typing import *
+
+parent_dir_path = str(Path(__file__).resolve().parents[3])
+sys.path.append(parent_dir_path + "/src/modbuslib/src")
+sys.path.append(parent_dir_path + "/src/system/src")
+
+from rpi_modbus_async import AsyncTcpMaster, TIMEOUT_TCP
+from rpi_verbose import verbose
+
+IDLE_TIMEOUT: float = 120  # close connection not used by anyone after this time
+HEALTH_CHECK_INTERVAL: float = 30
+# Devices behind gateway are spread over connections (one device with dead slave
+# does not hold every request slot of gateway)
+MAX_CONNECTIONS_PER_GATEWAY: int = 4
+
+T = TypeVar("T")
+
+
+class PooledTcpMaster:
+    """
+    Lease of pooled Modbus TCP connection for coroutine (same as AsyncTcpMaster).
+    close() give connection back to pool, it does not close socket.
+    """
+
+    def __init__(
+        self,
+        pool: "ModbusConnectionPool",
+        master: AsyncTcpMaster,
+        timeout_in_sec: float,
+        backoff: bool = True,
+    ) -> None:
+        self.pool = pool
+        self.master = master
+        self.host = master.host
+        self.port = master.port
+        self.timeout = timeout_in_sec
+        self.backoff = backoff
+        self.released = False
+
+    def set_timeout(self, timeout_in_sec: float) -> None:
+        self.timeout = timeout_in_sec
+
+    def get_timeout(self) -> float:
+        return self.timeout
+
+    def _execute(
+        self,
+        slave: int,
+        function_code: int,
+        starting_address: int,
+        quantity_of_x: int = 0,
+        output_value: Union[int, List[int]] = 0,
+    ) -> Coroutine[Any, Any, Tuple[int, ...]]:
+        return self.master.execute(
+            slave,
+            function_code,
+            starting_address,
+            quantity_of_x,
+            output_value,
+            timeout=self.timeout,
+            backoff=self.backoff,
+        )
+
+    async def execute(
+        self,
+        slave: int,
+        function_code: int,
+        starting_address: int,
+        quantity_of_x: int = 0,
+        output_value: Union[int, List[int]] = 0,
+    ) -> Tuple[int, ...]:
+        return await self.pool.run(
+            self._execute(
+                slave, function_code, starting_address, quantity_of_x, output_value
+            )
+        )
+
+    def close(self) -> None:
+        if not self.released:
+            self.released = True
+            self.pool.release(self.master)
+
+
+class PooledTcpMasterSync(PooledTcpMaster):
+    """
+    Lease of pooled Modbus TCP connection for blocking code, same execute as
+    modbus_tk TcpMaster. Must not be used in event loop of pool.
+    """
+
+    def execute(
+        self,
+        slave: int,
+        function_code: int,
+        starting_address: int,
+        quantity_of_x: int = 0,
+        output_value: Union[int, List[int]] = 0,
+    ) -> Tuple[int, ...]:
+        return self.pool.run_sync(
+            self._execute(
+                slave, function_code, starting_address, quantity_of_x, output_value
+            )
+        )
+
+
+class ModbusConnectionPool:
+    """
+    Modbus TCP connections shared by scanner, poller and command handler, by host:port.
+    Connections live in event loop of pool thread, they are reused between leases,
+    checked and closed after idle time. Number of connections of a gateway is limited,
+    leases share connection (pipelining) when limit is reached.
+    """
+
+    def __init__(
+        self,
+        max_connections_per_gateway: int = MAX_CONNECTIONS_PER_GATEWAY,
+        idle_timeout: float = IDLE_TIMEOUT,
+    ) -> None:
+        self.max_connections_per_gateway = max(1, max_connections_per_gateway)
+        self.idle_timeout = idle_timeout
+        self.gateways: Dict[Tuple[str, int], List[AsyncTcpMaster]] = {}
+        self.users: Dict[AsyncTcpMaster, int] = {}
+        self.lock = threading.Lock()
+        self.loop: Union[asyncio.AbstractEventLoop, None] = None
+        self.thread: Union[threading.Thread, None] = None
+
+    """
+    Event loop of pool
+    """
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self.lock:
+            if self.loop is None:
+                self.loop = asyncio.new_event_loop()
+                self.thread = threading.Thread(
+                    target=self._run, name="Modbus connection pool", daemon=True
+                )
+                self.thread.start()
+            return self.loop
+
+    def _run(self) -> None:
+        asyncio.set_event_loop(self.loop)
+        self.loop.create_task(self._health_check())
+        self.loop.run_forever()
+
+    async def run(self, coroutine: Awaitable[T]) -> T:
+        """
+        @brief      Run coroutine in event loop of pool from any event loop
+        @param      coroutine       coroutine use pooled connection
+        @retval     Result of coroutine
+        """
+
+        loop = self._ensure_loop()
+        if asyncio.get_event_loop() is loop:
+            return await coroutine
+        return await asyncio.wrap_future(
+            asyncio.run_coroutine_threadsafe(coroutine, loop)
+        )
+
+    def run_sync(self, coroutine: Awaitable[T]) -> T:
+        """
+        @brief      Run coroutine in event loop of pool and wait for result (blocking code)
+        @param      coroutine       coroutine use pooled connection
+        @retval     Result of coroutine
+        """
+
+        return asyncio.run_coroutine_threadsafe(coroutine, self._ensure_loop()).result()
+
+    """
+    Lease connection
+    """
+
+    def _acquire(self, host: str, port: int, max_in_flight: int) -> AsyncTcpMaster:
+        with self.lock:
+            masters = self.gateways.setdefault((host, port), [])
+            if len(masters) < self.max_connections_per_gateway and all(
+                self.users[x] > 0 for x in masters
+            ):
+                master = AsyncTcpMaster(host, port, max_in_flight=max_in_flight)
+                masters.append(master)
+                self.users[master] = 0
+            else:
+                master = min(masters, key=lambda x: self.users[x])
+                # Connection may be created by lease with lower limit (scanner)
+                if master.max_in_flight < max_in_flight:
+                    if self.loop is None:
+                        master.raise_max_in_flight(max_in_flight)
+                    else:
+                        self.loop.call_soon_threadsafe(
+                            master.raise_max_in_flight, max_in_flight
+                        )
+            self.users[master] += 1
+            return master
+
+    def get(
+        self,
+        host: str,
+        port: int = 502,
+        timeout_in_sec: float = TIMEOUT_TCP,
+        max_in_flight: int = 1,
+        backoff: bool = True,
+    ) -> PooledTcpMaster:
+        """
+        @brief      Get connection for coroutine (AsyncTcpMaster)
+        @param      host                IP of device/gateway
+        @param      port                port of device/gateway
+        @param      timeout_in_sec      timeout of each request
+        @param      max_in_flight       max requests wait for response, limit of
+                                        connection is raised to it if it is lower
+        @param      backoff             False if requests of lease must not start or
+                                        wait for backoff of unit (scanner)
+        @retval     Lease of connection, close() to give back
+        """
+
+        return PooledTcpMaster(
+            self, self._acquire(host, port, max_in_flight), timeout_in_sec, backoff
+        )
+
+    def get_sync(
+        self,
+        host: str,
+        port: int = 502,
+        timeout_in_sec: float = TIMEOUT_TCP,
+        max_in_flight: int = 1,
+        backoff: bool = True,
+    ) -> PooledTcpMasterSync:
+        """
+        @brief      Get connection for blocking code (modbus_tk TcpMaster)
+        @param      host                IP of device/gateway
+        @param      port                port of device/gateway
+        @param      timeout_in_sec      timeout of each request
+        @param      max_in_flight       max requests wait for response, limit of
+                                        connection is raised to it if it is lower
+        @param      backoff             False if requests of lease must not start or
+                                        wait for backoff of unit (scanner)
+        @retval     Lease of connection, close() to give back
+        """
+
+        return PooledTcpMasterSync(
+            self, self._acquire(host, port, max_in_flight), timeout_in_sec, backoff
+        )
+
+    def release(self, master: AsyncTcpMaster) -> None:
+        """
+        @brief      Give back connection, connection is kept for next lease until idle timeout.
+                    Connection which can not connect is removed at once.
+        @param      master          pooled connection
+        @retval     None
+        """
+
+        with self.lock:
+            if master not in self.users:
+                return
+            self.users[master] -= 1
+            if self.users[master] > 0 or master.writer is not None:
+                return
+            self._remove(master)
+
+    def _remove(self, master: AsyncTcpMaster) -> None:
+        self.users.pop(master, None)
+        key = (master.host, master.port)
+        masters = self.gateways.get(key, [])
+        if master in masters:
+            masters.remove(master)
+        if len(masters) == 0:
+            self.gateways.pop(key, None)
+
+    """
+    Health check
+    """
+
+    async def _health_check(self) -> None:
+        while True:
+            await asyncio.sleep(HEALTH_CHECK_INTERVAL)
+            try:
+                self.check_connections()
+            except Exception as error:
+                verbose("MODB - Connection pool", str(error), "ERROR")
+
+    def check_connections(self) -> None:
+        """
+        @brief      Close connection closed by device (reconnect in next request)
+                    and connection not used by anyone after idle timeout. Run in event loop of pool.
+        @retval     None
+        """
+
+        now = self.loop.time()
+        with self.lock:
+            for master in list(self.users.keys()):
+                if master.writer is not None and not master.is_connected():
+                    master.close()
+                if self.users[master] > 0:
+                    continue
+                if master.writer is None or now - master.last_used > self.idle_timeout:
+                    master.close()
+                    self._remove(master)
+
+
+modbus_connection_pool = ModbusConnectionPool()
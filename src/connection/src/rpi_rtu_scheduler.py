@@ -0,0 +1,518 @@
+import asyncio
+import heapq
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from pathlib import Path
+from typing import *
+
+import modbus_tk.defines as mbdefines
+import modbus_tk.modbus_rtu as mbrtu  # type:ignore
+from modbus_tk.exceptions import ModbusInvalidResponseError
+from modbus_tk.utils import calculate_rtu_inter_char
+
+parent_dir_path = str(Path(__file__).resolve().parents[3])
+sys.path.append(parent_dir_path + "/src/system/src")
+
+from rpi_verbose import verbose
+
+INTERFRAME_CHARACTERS: float = 3.5  # silence between 2 frames (Modbus RTU)
+UTILIZATION_INTERVAL: float = 300  # report bus utilization after this time
+DEFAULT_PERIOD: float = 15  # deadline of request after it is submitted
+
+# Adaptive timeout of slave, from percentile of its response time
+LATENCY_SAMPLES: int = 32
+MIN_LATENCY_SAMPLES: int = 8
+TIMEOUT_PERCENTILE: float = 0.95
+TIMEOUT_MULTIPLIER: float = 2
+TIMEOUT_MARGIN: float = 0.05
+# Requests to slave which has just timed out fail without using bus
+BACKOFF_MIN: float = 5
+BACKOFF_MAX: float = 300
+# Error of RtuMaster when nothing is received before timeout
+NO_RESPONSE_ERROR: str = "Response length is invalid 0"
+
+
+class RtuRequest:
+    """
+    Request wait in queue of RTU bus, ordered by deadline then submit order
+    """
+
+    __slots__ = (
+        "deadline",
+        "sequence",
+        "slave",
+        "function_code",
+        "starting_address",
+        "quantity_of_x",
+        "output_value",
+        "timeout",
+        "probe",
+        "future",
+    )
+
+    def __init__(
+        self,
+        deadline: float,
+        sequence: int,
+        slave: int,
+        function_code: int,
+        starting_address: int,
+        quantity_of_x: int,
+        output_value: Union[int, List[int]],
+        timeout: float = None,
+        probe: bool = False,
+    ) -> None:
+        self.deadline = deadline
+        self.sequence = sequence
+        self.slave = slave
+        self.function_code = function_code
+        self.starting_address = starting_address
+        self.quantity_of_x = quantity_of_x
+        self.output_value = output_value
+        self.timeout = timeout
+        self.probe = probe
+        self.future: Future = Future()
+
+    def __lt__(self, other: "RtuRequest") -> bool:
+        return (self.deadline, self.sequence) < (other.deadline, other.sequence)
+
+
+class SlaveState:
+    """
+    Response time and failures of one slave on RTU bus
+    """
+
+    __slots__ = ("latencies", "failures", "retry_after")
+
+    def __init__(self) -> None:
+        # Response time without time to transfer frames
+        self.latencies: Deque[float] = deque(maxlen=LATENCY_SAMPLES)
+        self.failures = 0
+        self.retry_after = 0.0
+
+    def timeout(self, default: float) -> float:
+        """
+        @brief      Get time to wait for response of slave
+        @param      default         timeout of bus, used until enough responses are measured
+        @retval     timeout (without time to transfer frames)
+        """
+
+        if len(self.latencies) < MIN_LATENCY_SAMPLES:
+            return default
+        ordered = sorted(self.latencies)
+        percentile = ordered[
+            min(len(ordered) - 1, int(TIMEOUT_PERCENTILE * len(ordered)))
+        ]
+        return min(default, percentile * TIMEOUT_MULTIPLIER + TIMEOUT_MARGIN)
+
+    def responded(self, latency: float) -> None:
+        self.latencies.append(max(0.0, latency))
+        self.failures = 0
+        self.retry_after = 0.0
+
+    def failed(self, now: float) -> None:
+        self.failures += 1
+        self.retry_after = now + min(BACKOFF_MAX, BACKOFF_MIN * 2 ** (self.failures - 1))
+
+
+class RtuBusScheduler:
+    """
+    Single owner of one serial port. Requests of every device on the bus wait in a
+    queue ordered by deadline, requests to same slave are sent one after another and
+    silence of 3.5 characters is kept between frames. Utilization of bus is logged
+    every UTILIZATION_INTERVAL.
+    Timeout of each slave is adapted to its response time, requests to a slave which
+    has just not responded (no response, not broken response) fail at once until its
+    backoff time is over.
+    """
+
+    def __init__(
+        self,
+        master: mbrtu.RtuMaster,
+        port: str = "RS485",
+        baudrate: int = 9600,
+        timeout: float = None,
+    ) -> None:
+        """
+        @brief      Start owner thread of bus
+        @param      master          RTU master of serial port
+        @param      port            name of serial port
+        @param      baudrate        baudrate of serial port
+        @param      timeout         max timeout of slave, None is timeout of master
+        @retval     None
+        """
+
+        self.master = master
+        self.port = port
+        self.character_time = calculate_rtu_inter_char(baudrate)
+        self.silence = INTERFRAME_CHARACTERS * self.character_time
+        self.timeout = master.get_timeout() if timeout is None else timeout
+        self.slaves: Dict[int, SlaveState] = {}
+        self.queue: List[RtuRequest] = []
+        self.sequence = 0
+        self.condition = threading.Condition()
+        self.running = True
+        self.last_frame_end = 0.0
+
+        # Utilization of current report interval
+        self.busy_time = 0.0
+        self.request_count = 0
+        self.report_start = time.monotonic()
+
+        self.thread = threading.Thread(
+            target=self._run, name="RTU bus " + port, daemon=True
+        )
+        self.thread.start()
+
+    def submit(
+        self,
+        slave: int,
+        function_code: int,
+        starting_address: int,
+        quantity_of_x: int = 0,
+        output_value: Union[int, List[int]] = 0,
+        deadline: float = None,
+        timeout: float = None,
+        probe: bool = False,
+    ) -> Future:
+        """
+        @brief      Put request to queue of bus
+        @param      slave               client ID
+        @param      function_code       modbus function code
+        @param      starting_address    first register
+        @param      quantity_of_x       number of registers (read)
+        @param      output_value        value(s) of registers (write)
+        @param      deadline            time.monotonic() request should be done,
+                                        None is DEFAULT_PERIOD after now
+        @param      timeout             time to wait for response (without time to
+                                        transfer frames), None is timeout of slave
+        @param      probe               request of scanner, state of slave (backoff,
+                                        response time) is not used or changed
+        @retval     Future of data of response, cancel it to drop request
+        """
+
+        if deadline is None:
+            deadline = time.monotonic() + DEFAULT_PERIOD
+        with self.condition:
+            if not self.running:
+                raise ConnectionError("RTU bus " + self.port + " is closed")
+            self.sequence += 1
+            request = RtuRequest(
+                deadline,
+                self.sequence,
+                slave,
+                function_code,
+                starting_address,
+                quantity_of_x,
+                output_value,
+                timeout,
+                probe,
+            )
+            heapq.heappush(self.queue, request)
+            self.condition.notify()
+        return request.future
+
+    def execute(
+        self,
+        slave: int,
+        function_code: int,
+        starting_address: int,
+        quantity_of_x: int = 0,
+        output_value: Union[int, List[int]] = 0,
+        deadline: float = None,
+        timeout: float = None,
+        probe: bool = False,
+    ) -> Tuple[int, ...]:
+        """
+        @brief      Same as submit but wait for response (blocking code)
+        @retval     data of response
+        """
+
+        return self.submit(
+            slave,
+            function_code,
+            starting_address,
+            quantity_of_x,
+            output_value,
+            deadline,
+            timeout,
+            probe,
+        ).result()
+
+    def _next_batch(self) -> List[RtuRequest]:
+        """
+        @brief      Take request with earliest deadline and every queued request to same slave
+        @retval     requests in order of deadline
+        """
+
+        head = heapq.heappop(self.queue)
+        batch = [head]
+        if any(x.slave == head.slave for x in self.queue):
+            batch.extend(sorted(x for x in self.queue if x.slave == head.slave))
+            self.queue = [x for x in self.queue if x.slave != head.slave]
+            heapq.heapify(self.queue)
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            with self.condition:
+                while self.running and len(self.queue) == 0:
+                    self.condition.wait(self._report_remaining())
+                    self._report_utilization()
+                if not self.running:
+                    return
+                batch = self._next_batch()
+
+            for request in batch:
+                # Request is cancelled by device (timeout or removed)
+                if not request.future.set_running_or_notify_cancel():
+                    continue
+                self._execute(request)
+            self._report_utilization()
+
+    def _transfer_time(self, request: RtuRequest) -> float:
+        """
+        @brief      Get time to send request and receive response on the bus
+        @param      request         request
+        @retval     time (s)
+        """
+
+        if (
+            request.function_code == mbdefines.READ_HOLDING_REGISTERS
+            or request.function_code == mbdefines.READ_INPUT_REGISTERS
+        ):
+            frame_bytes = 8 + 5 + 2 * request.quantity_of_x
+        elif request.function_code == mbdefines.WRITE_MULTIPLE_REGISTERS:
+            frame_bytes = 9 + 2 * len(request.output_value) + 8
+        else:
+            frame_bytes = 8 + 8
+        return frame_bytes * self.character_time
+
+    def _execute(self, request: RtuRequest) -> None:
+        if request.probe:
+            # State of probe is dropped, slow answer of polled slave to short probe
+            # does not start its backoff
+            slave = SlaveState()
+        else:
+            slave = self.slaves.setdefault(request.slave, SlaveState())
+        now = time.monotonic()
+        if now < slave.retry_after:
+            request.future.set_exception(
+                ModbusInvalidResponseError(
+                    "Slave {0} is not responding, retry in {1:.0f} s".format(
+                        request.slave, slave.retry_after - now
+                    )
+                )
+            )
+            return
+
+        wait = self.last_frame_end + self.silence - now
+        if wait > 0:
+            time.sleep(wait)
+
+        transfer_time = self._transfer_time(request)
+        if request.timeout is None:
+            self.master.set_timeout(transfer_time + slave.timeout(self.timeout))
+        else:
+            self.master.set_timeout(transfer_time + request.timeout)
+        start_time = time.monotonic()
+        try:
+            # Lock of modbus_tk is shared by every master, owner thread is enough
+            result = self.master.execute(
+                request.slave,
+                request.function_code,
+                request.starting_address,
+                request.quantity_of_x,
+                request.output_value,
+                threadsafe=False,
+            )
+        except ModbusInvalidResponseError as error:
+            # Backoff only when slave does not answer, CRC or framing error is
+            # failure of this request only
+            if str(error) == NO_RESPONSE_ERROR:
+                slave.failed(time.monotonic())
+            request.future.set_exception(error)
+        except Exception as error:
+            # Exception response, slave is alive
+            slave.responded(time.monotonic() - start_time - transfer_time)
+            request.future.set_exception(error)
+        else:
+            slave.responded(time.monotonic() - start_time - transfer_time)
+            request.future.set_result(result)
+        finally:
+            self.last_frame_end = time.monotonic()
+            self.busy_time += self.last_frame_end - start_time + self.silence
+            self.request_count += 1
+
+    """
+    Utilization
+    """
+
+    def _report_remaining(self) -> float:
+        return max(0, self.report_start + UTILIZATION_INTERVAL - time.monotonic())
+
+    def utilization(self) -> float:
+        """
+        @brief      Part of time bus is used in current report interval
+        @retval     utilization (0 - 1)
+        """
+
+        elapsed = time.monotonic() - self.report_start
+        if elapsed <= 0:
+            return 0.0
+        return min(1.0, self.busy_time / elapsed)
+
+    def _report_utilization(self) -> None:
+        if self._report_remaining() > 0:
+            return
+        verbose(
+            "MODB - RTU bus " + self.port,
+            "Utilization {0:.1f}% ({1} requests, {2} in queue)".format(
+                100 * self.utilization(), self.request_count, len(self.queue)
+            ),
+            "INFO",
+        )
+        self.busy_time = 0.0
+        self.request_count = 0
+        self.report_start = time.monotonic()
+
+    def close(self) -> None:
+        """
+        @brief      Stop owner thread, requests in queue get error
+        @retval     None
+        """
+
+        with self.condition:
+            self.running = False
+            for request in self.queue:
+                if request.future.set_running_or_notify_cancel():
+                    request.future.set_exception(
+                        ConnectionError("RTU bus " + self.port + " is closed")
+                    )
+            self.queue.clear()
+            self.condition.notify()
+        rtu_bus_registry.unregister(self)
+        self.master.close()
+
+
+class RtuBusRegistry:
+    """
+    Scheduler of each serial port polled by this process. Other threads (scanner)
+    must use bus of port instead of opening the port again.
+    """
+
+    def __init__(self) -> None:
+        self.buses: Dict[str, RtuBusScheduler] = {}
+        self.lock = threading.Lock()
+
+    def register(self, bus: RtuBusScheduler) -> None:
+        with self.lock:
+            self.buses[bus.port] = bus
+
+    def unregister(self, bus: RtuBusScheduler) -> None:
+        with self.lock:
+            if self.buses.get(bus.port) is bus:
+                del self.buses[bus.port]
+
+    def get(self, port: str) -> Union[RtuBusScheduler, None]:
+        """
+        @brief      Get scheduler which owns serial port
+        @param      port            name of serial port
+        @retval     scheduler, None if port is not polled
+        """
+
+        with self.lock:
+            return self.buses.get(port)
+
+
+class RtuBusClient:
+    """
+    Connection of one device on RTU bus for ModbusDevice.read_values_async,
+    execute is a coroutine and waits for request in queue of bus.
+    close() does not close bus, it is shared by every device on the bus.
+    """
+
+    def __init__(self, bus: RtuBusScheduler, period: float = DEFAULT_PERIOD) -> None:
+        """
+        @param bus       scheduler of serial port
+        @param period    poll time of device, deadline of request after it is submitted
+        """
+        self.bus = bus
+        self.period = period
+
+    async def execute(
+        self,
+        slave: int,
+        function_code: int,
+        starting_address: int,
+        quantity_of_x: int = 0,
+        output_value: Union[int, List[int]] = 0,
+    ) -> Tuple[int, ...]:
+        return await asyncio.wrap_future(
+            self.bus.submit(
+                slave,
+                function_code,
+                starting_address,
+                quantity_of_x,
+                output_value,
+                deadline=time.monotonic() + self.period,
+            )
+        )
+
+    def close(self) -> None:
+        pass
+
+
+class RtuBusConnection:
+    """
+    Blocking connection on RTU bus with same execute as RtuMaster (scanner), requests
+    wait in queue of bus together with requests of poller.
+    close() does not close bus.
+    """
+
+    def __init__(
+        self, bus: RtuBusScheduler, timeout: float = None, probe: bool = False
+    ) -> None:
+        """
+        @param bus       scheduler of serial port
+        @param timeout   time to wait for response, None is timeout of slave
+        @param probe     requests do not use or change state of slave (scanner)
+        """
+        self.bus = bus
+        self.timeout = timeout
+        self.probe = probe
+
+    def get_timeout(self) -> float:
+        return self.bus.timeout if self.timeout is None else self.timeout
+
+    def set_timeout(self, timeout: float) -> None:
+        self.timeout = timeout
+
+    def execute(
+        self,
+        slave: int,
+        function_code: int,
+        starting_address: int,
+        quantity_of_x: int = 0,
+        output_value: Union[int, List[int]] = 0,
+        threadsafe: bool = True,
+    ) -> Tuple[int, ...]:
+        # Owner thread of bus sends request, lock of modbus_tk is not needed
+        return self.bus.execute(
+            slave,
+            function_code,
+            starting_address,
+            quantity_of_x,
+            output_value,
+            timeout=self.timeout,
+            probe=self.probe,
+        )
+
+    def close(self) -> None:
+        pass
+
+
+rtu_bus_registry = RtuBusRegistry()
@@ -46,12 +46,12 @@ class ActorDatabase:
     def __init__(
         self,
     ) -> None:
-        self.actor_list: Dict[str, pykka.ThreadingActor] = {}
+        self.actor_list: Dict[str, Union[pykka.ActorProxy, Any]] = {}
 
     def add(
         self,
         serial_number: str,
-        source: pykka.ThreadingActor,
+        source: Union[pykka.ActorProxy, Any],
     ) -> None:
         """
         Create and run actor
@@ -65,7 +65,12 @@ class ActorDatabase:
         """
 
         if SN in self.actor_list:
-            _ = self.actor_list[SN].actor_ref.stop(True, timeout=100)
+            source = self.actor_list[SN]
+            if isinstance(source, pykka.ActorProxy):
+                _ = source.actor_ref.stop(True, timeout=100)
+            else:
+                # Source without thread (AsyncSource)
+                source.stop()
             self.actor_list.pop(SN)
         else:
             verbose("DATABASE", "Not have " + SN + " in Actor Database", "ERROR")
@@ -0,0 +1,86 @@
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import *
+
+parent_dir_path = str(Path(__file__).resolve().parents[4])
+sys.path.append(parent_dir_path + "/src/system/src")
+
+from rpi_FileIO import json2dict, dict2json
+
+
+class DiscoveryDatabase:
+    """
+    Address, model, SN, last seen time and probe latency of devices found by scanner,
+    kept in file so rescan verifies known address before sweeping network
+    """
+
+    def __init__(self) -> None:
+        self.path = ""
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def address(device: Dict[str, Any]) -> str:
+        """
+        Address of device, IP:port/client ID (TCP) or serial port/client ID (RTU)
+        """
+
+        if device.get("protocol") == "RTU":
+            return "{0}/{1}".format(device.get("serial_port", ""), device["client_ID"])
+        return "{0}:{1}/{2}".format(device["host"], device["port"], device["client_ID"])
+
+    def load(self, path: str) -> None:
+        """
+        Read cache file, cache is empty if file does not exist
+        """
+
+        with self.lock:
+            if path == self.path:
+                return
+            self.path = path
+            try:
+                self.entries = json2dict(path)["discovery_cache"]
+            except:
+                self.entries = {}
+
+    def save(self) -> None:
+        """
+        Write cache file
+        """
+
+        with self.lock:
+            if self.path != "":
+                dict2json(self.path, {"discovery_cache": self.entries})
+
+    def add(self, SN: str, device: Dict[str, Any], latency: float = None) -> None:
+        """
+        Add device found at address (mapping data of device), replace old address of device
+        """
+
+        entry = dict(device)
+        entry.update({"SN": SN, "last_seen": time.time(), "latency": latency})
+        with self.lock:
+            for address in [x for x, y in self.entries.items() if y["SN"] == SN]:
+                self.entries.pop(address)
+            self.entries[self.address(entry)] = entry
+
+    def remove(self, SN: str) -> None:
+        """
+        Remove device which is not at its address anymore
+        """
+
+        with self.lock:
+            for address in [x for x, y in self.entries.items() if y["SN"] == SN]:
+                self.entries.pop(address)
+
+    def get(self, SN: str) -> Union[Dict[str, Any], None]:
+        with self.lock:
+            for entry in self.entries.values():
+                if entry["SN"] == SN:
+                    return dict(entry)
+        return None
+
+    def get_all(self) -> Dict[str, Dict[str, Any]]:
+        return self.entries
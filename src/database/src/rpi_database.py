@@ -8,6 +8,7 @@ sys.path.append(parent_dir_path + "/src/database/src/modules")
 
 from rpi_actor_database import ActorDatabase, ActorErrorDatabase
 from rpi_device_database import DeviceDatabase
+from rpi_discovery_database import DiscoveryDatabase
 from rpi_thread_database import ThreadManager, ThreadErrorDatabase
 
 """
@@ -16,9 +17,11 @@ Database of device
 
 CONFIG_FILE_NAME = "system_config_preset.json"
 MAPPING_FILE_NAME = "system_mapping_preset.json"
+DISCOVERY_CACHE_FILE_NAME = "system_discovery_cache.json"
 
 actor_error_database = ActorErrorDatabase()
 actor_database = ActorDatabase()
 device_database = DeviceDatabase()
+discovery_database = DiscoveryDatabase()
 thread_database = ThreadManager()
 thread_error_database = ThreadErrorDatabase()
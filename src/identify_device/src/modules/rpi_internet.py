@@ -1,7 +1,10 @@
+import asyncio
+import queue
 import sys
 import socket
 import struct
-import subprocess
+import threading
+import time
 from typing import *
 
 from pathlib import Path
@@ -14,88 +17,153 @@ from rpi_ssh_protocal import ssh_command
 from rpi_verbose import verbose
 
 
-def get_all_device_in_network(gateway: str, mode: int = 1) -> List[str]:
+SWEEP_CONCURRENCY: int = 64  # connections opened at the same time
+SWEEP_TIMEOUT: float = 0.5  # connect timeout of each address
+SWEEP_TIMEOUT_FAST: float = 0.2
+GATEWAY_CACHE_TTL: float = 3600  # default gateway of host is looked up again after this time
+
+# Default gateway of host device, route table of container when it is looked up
+_host_gateway_cache: Dict[str, Any] = {"gateway": "", "route_table": "", "expire": 0.0}
+_host_gateway_lock = threading.Lock()
+
+
+def get_all_device_in_network(
+    gateway: str,
+    mode: int = 1,
+    port: int = 502,
+    concurrency: int = SWEEP_CONCURRENCY,
+    timeout: float = None,
+) -> List[str]:
     """
     @brief      Read and process data from modbus device
     @param      gateway                 Default gateway of host device
     @param      mode                    Scanning mode (0: Very fast mode, 1: Fast mode, 2: Slow mode)
+    @param      port                    Modbus port
+    @param      concurrency             Max connections at the same time (mode 1, 2)
+    @param      timeout                 Connect timeout of each address (mode 1, 2)
     @retval     List of device available in network
     """
 
     if mode == 0:
         return_data = _scan_very_fast_all_device_in_network(gateway=gateway)
     elif mode == 1:
-        return_data = _scan_fast_all_device_in_network(gateway=gateway)
+        verbose("SYSTEM - Scan thread", "Fast scan network", "INFO")
+        return_data = list(
+            stream_device_in_network(
+                gateway, port, concurrency, timeout or SWEEP_TIMEOUT_FAST
+            )
+        )
     elif mode == 2:
-        return_data = _scan_all_device_in_network(gateway=gateway)
-    return return_data
-
-
-def _scan_all_device_in_network(gateway: str) -> List[str]:
-    verbose("SYSTEM - Scan thread", "Scanning fully network", "INFO")
-
-    return_data: List[str] = []
-
-    gateway = gateway + "/24"
-
-    # Ping every ip address x.x.x.0 - x.x.x.255
-    stdout = subprocess.check_output(["nmap", gateway, "-sn", "-Pn"])
-
-    # Scan device have port 502 open
-    stdout = subprocess.check_output(["nmap", gateway, "-Pn", "-p", " 502", "--open"])
-
-    # Process nmap output
-    _stdout = stdout.decode("utf-8").splitlines()
-    for line in _stdout:
-        if len(line) > 0:
-            field = line.strip().split()
-            if field[0] == "Nmap" and field[1] == "scan":
-                dot_count = field[4].split(".")
-                if len(dot_count) == 4:
-                    return_data.append(field[4])
-                else:
-                    output = field[5]
-                    output = output.replace("(", "")
-                    output = output.replace(")", "")
-                    return_data.append(output)
-
+        verbose("SYSTEM - Scan thread", "Scanning fully network", "INFO")
+        return_data = list(
+            stream_device_in_network(gateway, port, concurrency, timeout or SWEEP_TIMEOUT)
+        )
     return return_data
 
 
-def _scan_fast_all_device_in_network(gateway: str) -> List[str]:
-    verbose("SYSTEM - Scan thread", "Fast scan network", "INFO")
-
-    return_data: List[str] = []
+async def _connect(host: str, port: int, timeout: float) -> bool:
+    try:
+        _, writer = await asyncio.wait_for(
+            asyncio.open_connection(host, port), timeout
+        )
+    except (OSError, asyncio.TimeoutError):
+        return False
+    writer.close()
+    return True
+
+
+async def sweep_port_in_network(
+    gateway: str,
+    port: int = 502,
+    concurrency: int = SWEEP_CONCURRENCY,
+    timeout: float = SWEEP_TIMEOUT,
+    stop: threading.Event = None,
+) -> AsyncIterator[str]:
+    """
+    @brief      Connect to port of every address x.x.x.1 - x.x.x.254 of gateway network (/24)
+    @param      gateway                 Default gateway of host device
+    @param      port                    Modbus port
+    @param      concurrency             Max connections at the same time
+    @param      timeout                 Connect timeout of each address
+    @param      stop                    Stop sweep when it is set
+    @retval     Address which port is open, as soon as it is found
+    """
 
-    gateway = gateway + "/24"
-
-    # Ping every ip address x.x.x.0 - x.x.x.255
-    stdout = subprocess.check_output(["nmap", gateway, "-sn", "-Pn"])
-
-    # Scan device have port 502 open
-    stdout = subprocess.check_output(["nmap", gateway, "-sn"])
-
-    # Process nmap output
-    _stdout = stdout.decode("utf-8").splitlines()
-    for line in _stdout:
-        if len(line) > 0:
-            field = line.strip().split()
-            if field[0] == "Nmap" and field[1] == "scan":
-                dot_count = field[4].split(".")
-                if len(dot_count) == 4:
-                    return_data.append(field[4])
-                else:
-                    output = field[5]
-                    output = output.replace("(", "")
-                    output = output.replace(")", "")
-                    return_data.append(output)
+    hosts = iter(_network_addresses(gateway))
+    found: asyncio.Queue = asyncio.Queue()
+
+    async def _worker() -> None:
+        for host in hosts:
+            if stop is not None and stop.is_set():
+                break
+            if await _connect(host, port, timeout):
+                await found.put(host)
+
+    workers = [asyncio.ensure_future(_worker()) for _ in range(max(1, concurrency))]
+    done = asyncio.ensure_future(asyncio.gather(*workers))
+    try:
+        while not done.done() or not found.empty():
+            get = asyncio.ensure_future(found.get())
+            await asyncio.wait([get, done], return_when=asyncio.FIRST_COMPLETED)
+            if get.done():
+                yield get.result()
+            else:
+                get.cancel()
+    finally:
+        for worker in workers:
+            worker.cancel()
+
+
+def stream_device_in_network(
+    gateway: str,
+    port: int = 502,
+    concurrency: int = SWEEP_CONCURRENCY,
+    timeout: float = SWEEP_TIMEOUT,
+) -> Iterator[str]:
+    """
+    @brief      Same as sweep_port_in_network for blocking code, sweep runs in its own
+                thread so devices can be probed before sweep is done
+    @param      gateway                 Default gateway of host device
+    @param      port                    Modbus port
+    @param      concurrency             Max connections at the same time
+    @param      timeout                 Connect timeout of each address
+    @retval     Address which port is open, as soon as it is found
+    """
 
-    return return_data
+    found: "queue.Queue[Union[str, None]]" = queue.Queue()
+    stop = threading.Event()
+
+    async def _sweep() -> None:
+        try:
+            async for host in sweep_port_in_network(
+                gateway, port, concurrency, timeout, stop
+            ):
+                found.put(host)
+        finally:
+            found.put(None)
+
+    thread = threading.Thread(
+        target=asyncio.run, args=(_sweep(),), name="Sweep network", daemon=True
+    )
+    thread.start()
+    try:
+        while True:
+            host = found.get()
+            if host is None:
+                return
+            yield host
+    finally:
+        # Consumer stops early (every device is found)
+        stop.set()
 
 
 def _scan_very_fast_all_device_in_network(gateway: str) -> List[str]:
     verbose("SYSTEM - Scan thread", "Very fast scan network", "INFO")
 
+    return _network_addresses(gateway)
+
+
+def _network_addresses(gateway: str) -> List[str]:
     return_data: List[str] = []
     gateway_attribution = gateway.split(".")
 
@@ -127,7 +195,35 @@ def get_default_gateway_linux() -> Union[str, None]:
     return return_data
 
 
-def get_host_default_gateway(user: str, pwds: str) -> str:
+def _read_route_table() -> str:
+    try:
+        with open("/proc/net/route") as fh:
+            return fh.read()
+    except OSError:
+        return ""
+
+
+def get_host_default_gateway(
+    user: str, pwds: str, ttl: float = GATEWAY_CACHE_TTL
+) -> str:
+    """
+    @brief      Get default gateway of host device by SSH to host (gateway of container).
+                Result is cached until TTL or route table of container is changed.
+    @param      user                    SSH user of host
+    @param      pwds                    SSH password of host
+    @param      ttl                     time (s) cached gateway is used
+    @retval     Default gateway of host device
+    """
+
+    route_table = _read_route_table()
+    with _host_gateway_lock:
+        if (
+            _host_gateway_cache["gateway"] != ""
+            and _host_gateway_cache["route_table"] == route_table
+            and time.monotonic() < _host_gateway_cache["expire"]
+        ):
+            return _host_gateway_cache["gateway"]
+
     return_data: str = ""
     ssh_stdout = ssh_command(get_default_gateway_linux(), user, pwds, "ip route")
 
@@ -136,4 +232,23 @@ def get_host_default_gateway(user: str, pwds: str) -> str:
         if field[0] == "default":
             return_data = field[2]
 
+    if return_data != "":
+        with _host_gateway_lock:
+            _host_gateway_cache.update(
+                {
+                    "gateway": return_data,
+                    "route_table": route_table,
+                    "expire": time.monotonic() + ttl,
+                }
+            )
     return return_data
+
+
+def invalidate_host_default_gateway() -> None:
+    """
+    @brief      Look up default gateway of host again in next scan (discovery fails)
+    @retval     None
+    """
+
+    with _host_gateway_lock:
+        _host_gateway_cache["gateway"] = ""
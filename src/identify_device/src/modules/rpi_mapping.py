@@ -15,6 +15,7 @@ class define:
     _tenant = "tenant"
     _location = "location"
     _master_device_SN = "master_device_SN"
+    _serial_port = "serial_port"
     _Natsio_servers_addr = "Natsio_servers_addr"
     _topic = "topic"
 
@@ -39,6 +40,7 @@ class Map:
         master_device_SN: str = "",
         host: str = "",
         port: int = 0,
+        serial_port: str = "",
     ):
         connection_type = site_config_data[device_SN]["protocol"]
         return_data: Dict[str, Any] = {}
@@ -62,6 +64,7 @@ class Map:
                         define._device_type: device_type,
                         define._protocol: connection_type,
                         define._client_ID: client_ID,
+                        define._serial_port: serial_port,
                         define._tenant: site_config_data[device_SN]["tenant"],
                         define._location: site_config_data[device_SN]["location"],
                     }
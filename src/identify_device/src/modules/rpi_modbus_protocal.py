@@ -3,34 +3,46 @@ import sys
 from typing import *
 from pathlib import Path
 
-import modbus_tk.modbus_tcp as mbtcp
 import modbus_tk.defines as mbdefines
 import modbus_tk.modbus_rtu as mbrtu
 
 parent_dir_path = str(Path(__file__).resolve().parents[4])
 sys.path.append(parent_dir_path + "/src/modbuslib/src")
+sys.path.append(parent_dir_path + "/src/connection/src")
 
 from rpi_modbus import ModbusDevice, DefaultDecoder
+from rpi_modbus_pool import modbus_connection_pool
 
 
 def read_TCP_device(
-    host: str, port: int, client_ID: int, path_driver_file: str, device_SN: str = ""
+    host: str,
+    port: int,
+    client_ID: int,
+    path_driver_file: str,
+    device_SN: str = "",
+    max_in_flight: int = 1,
 ):
-    connection = mbtcp.TcpMaster(host, port, timeout_in_sec=0.5)
-    device = ModbusDevice[str, int, float, int, int, int](
-        connection=connection,
-        device_SN=device_SN,
-        client_ID=client_ID,
-        decoder=DefaultDecoder(),
-        json_file_direct=path_driver_file,
+    # Connection is shared with poller and command handler, max_in_flight is number
+    # of threads which read the same gateway. Short timeout of scanner does not put
+    # unit polled by poller in backoff
+    connection = modbus_connection_pool.get_sync(
+        host, port, timeout_in_sec=0.5, max_in_flight=max_in_flight, backoff=False
     )
+    try:
+        device = ModbusDevice[str, int, float, int, int, int](
+            connection=connection,
+            device_SN=device_SN,
+            client_ID=client_ID,
+            decoder=DefaultDecoder(),
+            json_file_direct=path_driver_file,
+        )
 
-    result = device.read_values(
-        registers=["SN", "Md"],
-        type_function=mbdefines.READ_HOLDING_REGISTERS,
-    )
-
-    device.close_modbus()
+        result = device.read_values(
+            registers=["SN", "Md"],
+            type_function=mbdefines.READ_HOLDING_REGISTERS,
+        )
+    finally:
+        connection.close()
     return result
 
 
@@ -1,5 +1,6 @@
 import sys, threading, os
-from time import sleep
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from time import sleep, monotonic
 
 from typing import *
 from pathlib import Path
@@ -15,22 +16,37 @@ sys.path.append(parent_dir_path + "/src/modbuslib/src")
 sys.path.append(parent_dir_path + "/src/natsio/src")
 sys.path.append(parent_dir_path + "/src/system/src")
 sys.path.append(parent_dir_path + "/src/database/src")
+sys.path.append(parent_dir_path + "/src/connection/src")
 
 from rpi_identify_device_exception import DeviceNotSupported
-from rpi_internet import get_host_default_gateway, get_all_device_in_network
+from rpi_internet import (
+    get_host_default_gateway,
+    invalidate_host_default_gateway,
+    stream_device_in_network,
+)
 from rpi_modbus import *
 from rpi_system import *
-from rpi_IO import connect_serial, get_port_RS485
+from rpi_IO import connect_serial, get_ports_RS485, get_serial_settings
 from rpi_mapping import Map
 from rpi_modbus_protocal import read_RTU_device, read_TCP_device
+from rpi_rtu_scheduler import RtuBusConnection, rtu_bus_registry
+from rpi_driver import driver_registry
 from rpi_verbose import verbose
-from rpi_database import device_database
+from rpi_database import device_database, discovery_database
 
 range_device_id_SMA_75 = [126, 167]
+# Max devices probed at the same time
+MAX_PROBES_PER_SUBNET: int = 16
+MAX_PROBES_PER_GATEWAY: int = 4
 range_device_id_RTU = [1, 255]
+# Probe (read of 1 register before full read) waits for transfer of request and
+# response and turnaround of slave
+PROBE_FRAME_BYTES_RTU: int = 8 + 7
+PROBE_TURNAROUND_RTU: float = 0.05
 mapping = Map()
 
 device_count = 0
+device_count_lock = threading.Lock()
 
 
 def filter_undiscovery_device(
@@ -56,19 +72,14 @@ def filter_undiscovery_device(
     return return_data
 
 
-def filter_discovery_device(list_IP_available: List[str]) -> List[str]:
-    return_data = list_IP_available
+def filter_discovery_device(list_IP_available: Iterable[str]) -> Iterator[str]:
     _known_device_dict = device_database.get_known_device()
 
-    _known_device_host_list = [
+    _known_device_host_list = set(
         _known_device_dict[x]["host"] for x in list(_known_device_dict.keys())
-    ]
-
-    for x in _known_device_host_list:
-        if x in return_data:
-            return_data.remove(x)
+    )
 
-    return return_data
+    return (x for x in list_IP_available if x not in _known_device_host_list)
 
 
 def run_check(total_device: int, minimum_requirement: float = 0.95) -> int:
@@ -103,49 +114,122 @@ def scan_non_standlone_TCP_device(
     port: int = 502,
 ) -> Tuple[Dict[str, str], int]:
     device_count = 0
-    for slave_device_type in list_slave_device_type:
-        master_device_type = support_device[slave_device_type]["master_device_name"]
-        range_clientID = [
-            support_device[master_device_type]["min_range_slave"],
-            support_device[master_device_type]["max_range_slave"],
-        ]
-        device_type = support_device[master_device_type]["device_type"]
+    return_data: Dict[str, str] = {}
+    found = threading.Event()
+
+    def _probe(client_ID: int, path_relative_driver_file: str, slave_device_type):
+        if found.is_set():
+            return {}
+        try:
+            result = read_TCP_device(
+                host=current_IP,
+                port=port,
+                client_ID=client_ID,
+                path_driver_file=path_relative_driver_file,
+                max_in_flight=MAX_PROBES_PER_GATEWAY,
+            )
+        except Exception as e:
+            return {}
+        if result[0]["Md"][0] in slave_device_type:
+            return mapping.mapping_SN(
+                device_SN=result[0]["SN"][0],
+                device_type=result[0]["Md"][0],
+                client_ID=client_ID,
+                host=current_IP,
+                port=port,
+                site_config_data=site_info,
+                master_device_SN=master_device_SN,
+            )
+        return {}
+
+    # Slave IDs behind the gateway are probed together, bounded for each gateway
+    with ThreadPoolExecutor(
+        max_workers=MAX_PROBES_PER_GATEWAY, thread_name_prefix="Scan " + current_IP
+    ) as executor:
+        for slave_device_type in list_slave_device_type:
+            master_device_type = support_device[slave_device_type][
+                "master_device_name"
+            ]
+            range_clientID = [
+                support_device[master_device_type]["min_range_slave"],
+                support_device[master_device_type]["max_range_slave"],
+            ]
+            device_type = support_device[master_device_type]["device_type"]
+            path_relative_driver_file = support_device[device_type][
+                "path_relative_driver_file"
+            ]
+
+            probes = [
+                executor.submit(
+                    _probe, client_ID, path_relative_driver_file, slave_device_type
+                )
+                for client_ID in range(range_clientID[0], range_clientID[1], 1)
+            ]
+            for probe in as_completed(probes):
+                result_mapping = probe.result()
+                return_data.update(result_mapping)
+                if len(result_mapping) > 0:
+                    device_count += 1
+                    if device_count == total_device:
+                        found.set()
+                        return return_data, device_count
+
+    return return_data, device_count
+
+
+def probe_TCP_device(
+    current_IP: str,
+    list_type_device: List[str],
+    support_device: Dict[str, Any],
+    port: int = 502,
+) -> Union[Tuple[Tuple[Dict[str, Any], Dict[str, Any]], str, int], None]:
+    """
+    @brief      Identify device at IP with default client ID of each device type
+    @param      current_IP          IP of device
+    @param      list_type_device    device types in site
+    @param      support_device      support device in default config
+    @param      port                modbus port
+    @retval     (SN and model, device type, client ID), None if device is not supported
+    """
+
+    for device_type in list_type_device:
         path_relative_driver_file = support_device[device_type][
             "path_relative_driver_file"
         ]
-        return_data: Dict[str, str] = {}
 
-        for client_ID in range(range_clientID[0], range_clientID[1], 1):
-            try:
-                result = read_TCP_device(
-                    host=current_IP,
-                    port=port,
-                    client_ID=client_ID,
-                    path_driver_file=path_relative_driver_file,
-                )
-                if result[0]["Md"][0] in slave_device_type:
-                    result_mapping = mapping.mapping_SN(
-                        device_SN=result[0]["SN"][0],
-                        device_type=result[0]["Md"][0],
-                        client_ID=client_ID,
-                        host=current_IP,
-                        port=port,
-                        site_config_data=site_info,
-                        master_device_SN=master_device_SN,
-                    )
-                    return_data.update(result_mapping)
-                    if len(result_mapping) > 0:
-                        device_count += 1
-                        if device_count == total_device:
-                            return return_data, device_count
-            except Exception as e:
-                pass
+        client_ID = support_device[device_type]["device_id_default"]
 
-    return return_data, device_count
+        try:
+            result = read_TCP_device(
+                host=current_IP,
+                port=port,
+                client_ID=client_ID,
+                path_driver_file=path_relative_driver_file,
+            )
+
+            if result[0]["Md"][0] in list(support_device.keys()):
+                return result, device_type, client_ID
+
+        except ModbusError as e:
+            verbose(
+                "SYSTEM - Scan thread",
+                "Error at " + current_IP + " Error code: " + str(e),
+                "ERROR",
+            )
+            continue
+        except Exception as e:
+            # Host does not answer, other device types are not probed
+            verbose(
+                "SYSTEM - Scan thread",
+                "Error at " + current_IP + " Error code: " + str(e),
+                "ERROR",
+            )
+            return None
+    return None
 
 
 def scan_standlone_TCP_device(
-    list_IP_available: List[str],
+    list_IP_available: Iterable[str],
     total_device: int,
     driver_default_config: Dict[str, Any],
     site_config_data: Dict[str, Any],
@@ -157,101 +241,114 @@ def scan_standlone_TCP_device(
 
     _support_device = driver_default_config["support_device"]
 
-    for current_IP in list_IP_available:
-        try:
-            confirm_device: bool = False
-            for device_type in list_type_device:
-                path_relative_driver_file = _support_device[device_type][
-                    "path_relative_driver_file"
-                ]
-
-                client_ID = _support_device[device_type]["device_id_default"]
-
-                try:
-                    result = read_TCP_device(
-                        host=current_IP,
-                        port=port,
-                        client_ID=client_ID,
-                        path_driver_file=path_relative_driver_file,
-                    )
-
-                    if result[0]["Md"][0] in list(_support_device.keys()):
-                        confirm_device = True
-                        break
-
-                except ModbusError as e:
-                    verbose(
-                        "SYSTEM - Scan thread",
-                        "Error at " + current_IP + " Error code: " + str(e),
-                        "ERROR",
-                    )
-                    continue
-                except Exception as e:
-                    verbose(
-                        "SYSTEM - Scan thread",
-                        "Error at " + current_IP + " Error code: " + str(e),
-                        "ERROR",
-                    )
-                    raise e
-
-            if confirm_device == False:
-                raise
+    def _scan_IP(current_IP: str) -> Tuple[Dict[str, str], int]:
+        if found.is_set():
+            return {}, 0
+        probe = probe_TCP_device(current_IP, list_type_device, _support_device, port)
+        if probe is None:
+            return {}, 0
+        result, device_type, client_ID = probe
+
+        result_mapping = mapping.mapping_SN(
+            device_SN=result[0]["SN"][0],
+            device_type=result[0]["Md"][0],
+            client_ID=client_ID,
+            host=current_IP,
+            port=port,
+            site_config_data=site_config_data,
+        )
+        if len(result_mapping) == 0:
+            return {}, 0
+
+        found_data = dict(result_mapping)
+        found_count = 1
+        if _support_device[device_type]["master_device"] == "TRUE":
+            slave_device_type = [
+                x
+                for x in list(_support_device.keys())
+                if _support_device[x]["slave_device"] == "TRUE"
+            ]
 
-            result_mapping = mapping.mapping_SN(
-                device_SN=result[0]["SN"][0],
-                device_type=result[0]["Md"][0],
-                client_ID=client_ID,
-                host=current_IP,
-                port=port,
-                site_config_data=site_config_data,
+            total_device_in_site = len(
+                [
+                    x
+                    for x in list(site_config_data.keys())
+                    if result[0]["SN"][0]
+                    == site_config_data[x].get("master_device_SN")
+                ]
             )
-            return_data.update(result_mapping)
-            if len(result_mapping) > 0:
-                device_count += 1
-                _master_device = _support_device[device_type]["master_device"]
-
-                if _master_device == "TRUE":
-                    slave_device_type = [
-                        x
-                        for x in list(_support_device.keys())
-                        if _support_device[x]["slave_device"] == "TRUE"
-                    ]
-
-                    total_device_in_site = len(
-                        [
-                            x
-                            for x in list(site_config_data.keys())
-                            if result[0]["SN"][0]
-                            == site_config_data[x]["master_device_SN"]
-                        ]
-                    )
 
-                    if set(slave_device_type) & set(list_type_device):
-                        data, slave_device_count = scan_non_standlone_TCP_device(
-                            current_IP=current_IP,
-                            total_device=total_device_in_site - 1,
-                            list_slave_device_type=slave_device_type,
-                            support_device=_support_device,
-                            master_device_SN=result[0]["SN"][0],
-                            site_info=site_config_data,
-                        )
-                        device_count += slave_device_count
-                    return_data.update(data)
-                if device_count == total_device:
-                    verbose("SYSTEM - Scan thread", "Scan TCP - Full", "INFO")
-                    return return_data
-        except Exception as e:
-            # print(e)
-            pass
+            if set(slave_device_type) & set(list_type_device):
+                data, slave_device_count = scan_non_standlone_TCP_device(
+                    current_IP=current_IP,
+                    total_device=total_device_in_site - 1,
+                    list_slave_device_type=slave_device_type,
+                    support_device=_support_device,
+                    master_device_SN=result[0]["SN"][0],
+                    site_info=site_config_data,
+                )
+                found_data.update(data)
+                found_count += slave_device_count
+        return found_data, found_count
+
+    def _collect(probe: Future) -> None:
+        # Results are combined by calling thread only (not by done callback, which
+        # may run after as_completed returns)
+        nonlocal device_count
+        if probe.cancelled() or probe.exception() is not None:
+            return
+        found_data, found_count = probe.result()
+        with lock:
+            return_data.update(found_data)
+            device_count += found_count
+            if device_count >= total_device:
+                found.set()
+
+    # IPs are probed as soon as they are found, bounded for each subnet (/24)
+    lock = threading.Lock()
+    found = threading.Event()
+    executors: Dict[str, ThreadPoolExecutor] = {}
+    probes: List[Future] = []
+    try:
+        for current_IP in list_IP_available:
+            # Probes done while network is swept are combined at once
+            for probe in [x for x in probes if x.done()]:
+                probes.remove(probe)
+                _collect(probe)
+            if found.is_set():
+                break
+            subnet = current_IP.rsplit(".", 1)[0]
+            if subnet not in executors:
+                executors[subnet] = ThreadPoolExecutor(
+                    max_workers=MAX_PROBES_PER_SUBNET,
+                    thread_name_prefix="Scan " + subnet,
+                )
+            probes.append(executors[subnet].submit(_scan_IP, current_IP))
+
+        if not found.is_set():
+            for probe in as_completed(probes):
+                _collect(probe)
+                if found.is_set():
+                    break
+    finally:
+        # Stop probing and network sweep when every device is found
+        if isinstance(list_IP_available, Generator):
+            list_IP_available.close()
+        for executor in executors.values():
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    if found.is_set():
+        verbose("SYSTEM - Scan thread", "Scan TCP - Full", "INFO")
+        with lock:
+            return dict(return_data)
 
     undiscovery_device_list = filter_undiscovery_device(
         device_doctrine_dict=site_config_data, device_discoveryed_dict=return_data
     )
 
-    _device_found = device_count + len(device_database.get_known_device())
     verbose(
         "SYSTEM - Scan thread",
-        "Scan TCP - Missing (" + str(_device_found) + "/" + str(total_device) + ")",
+        "Scan TCP - Missing (" + str(device_count) + "/" + str(total_device) + ")",
         "INFO",
     )
     verbose(
@@ -263,19 +360,143 @@ def scan_standlone_TCP_device(
     return return_data
 
 
+def get_probe_register(path_driver_file: str) -> int:
+    """
+    @brief      Get input register read by probe (SN register of driver)
+    @param      path_driver_file    driver of device
+    @retval     starting address of register
+    """
+
+    driver = driver_registry.get(path_driver_file)
+    points = driver.json_file["points"].get("input_registers", {})
+    point = points.get("SN", next(iter(points.values()), None))
+    if point is None:
+        return 0
+    return int(point["registerAddr"]) - driver.offset
+
+
+def get_probe_timeout_RTU(baudrate: int) -> float:
+    """
+    @brief      Get time to wait for response of probe on serial port
+    @param      baudrate            baudrate of port
+    @retval     transfer time of probe frames (11 bits a character) and turnaround
+    """
+
+    return PROBE_FRAME_BYTES_RTU * 11 / baudrate + PROBE_TURNAROUND_RTU
+
+
+def probe_RTU_address(
+    connection: Union[mbrtu.RtuMaster, RtuBusConnection],
+    client_ID: int,
+    starting_address: int,
+    timeout: float,
+) -> bool:
+    """
+    @brief      Read 1 register to find out slave answers, exception response is an answer
+    @param      connection          RTU connection or bus of port
+    @param      client_ID           client ID of slave (not broadcast)
+    @param      starting_address    register to read
+    @param      timeout             time to wait for response (get_probe_timeout_RTU)
+    @retval     True if slave answers
+    """
+
+    time_out_rtu = connection.get_timeout()
+    connection.set_timeout(timeout)
+    try:
+        # Port is used by one scan thread only (or owner thread of bus)
+        connection.execute(
+            client_ID,
+            mbdefines.READ_INPUT_REGISTERS,
+            starting_address,
+            1,
+            threadsafe=False,
+        )
+        return True
+    except ModbusError:
+        return True
+    except Exception:
+        return False
+    finally:
+        connection.set_timeout(time_out_rtu)
+
+
+def get_RTU_probe_order(
+    range_clientID: List[int],
+    list_type_device: List[str],
+    site_config_data: Dict[str, Any],
+    support_device: Dict[str, Any],
+) -> List[int]:
+    """
+    @brief      Order client IDs to scan: client ID in site config, default client ID
+                of device types, then other client IDs in range
+    @param      range_clientID      client ID range [first, last + 1]
+    @param      list_type_device    device types to scan
+    @param      site_config_data    devices to scan
+    @param      support_device      support device in default config
+    @retval     client IDs
+    """
+
+    likely_client_ID = [
+        site_config_data[x]["client_ID"]
+        for x in list(site_config_data.keys())
+        if "client_ID" in site_config_data[x]
+    ] + [support_device[x]["device_id_default"] for x in list_type_device]
+    likely_client_ID = list(
+        dict.fromkeys(
+            int(x)
+            for x in likely_client_ID
+            if range_clientID[0] <= int(x) < range_clientID[1]
+        )
+    )
+    return likely_client_ID + [
+        x
+        for x in range(range_clientID[0], range_clientID[1], 1)
+        if x not in likely_client_ID
+    ]
+
+
 def scan_standlone_RTU_device(
-    connection: mbrtu,
+    connection: Union[mbrtu.RtuMaster, RtuBusConnection],
     range_clientID: List[int],
     total_device: int,
     list_type_device: List[str],
     site_config_data: Dict[str, Any],
     driver_default_config: Dict[str, Any],
+    serial_port: str = "",
+    probe_timeout: float = None,
+    skip_client_ID: Iterable[int] = (),
 ) -> Dict[str, str]:
     return_data: Dict[str, str] = {}
     global device_count
 
     _support_device = driver_default_config["support_device"]
-    for client_ID in range(range_clientID[0], range_clientID[1], 1):
+    probe_register = get_probe_register(
+        _support_device[list_type_device[0]]["path_relative_driver_file"]
+    )
+    if probe_timeout is None:
+        probe_timeout = get_probe_timeout_RTU(get_serial_settings({})["baudrate"])
+    # Client IDs in site config are read in full even if probe gets no response
+    # (slave slower than probe timeout)
+    configured_client_ID = {
+        int(site_config_data[x]["client_ID"])
+        for x in list(site_config_data.keys())
+        if "client_ID" in site_config_data[x]
+    }
+    skip_client_ID = set(skip_client_ID)
+    for client_ID in get_RTU_probe_order(
+        range_clientID, list_type_device, site_config_data, _support_device
+    ):
+        # Every device is found (also on other ports)
+        if device_count >= total_device:
+            break
+        # Client ID of device which is polled or found already
+        if client_ID in skip_client_ID:
+            continue
+        # Full read only at client ID which answers
+        if client_ID not in configured_client_ID and not probe_RTU_address(
+            connection, client_ID, probe_register, probe_timeout
+        ):
+            continue
         try:
             for device_type in list_type_device:
                 path_relative_driver_file = _support_device[device_type][
@@ -294,25 +515,32 @@ def scan_standlone_RTU_device(
                 device_type=result[0]["Md"][0],
                 client_ID=client_ID,
                 site_config_data=site_config_data,
+                serial_port=serial_port,
             )
             return_data.update(result_mapping)
             if len(result_mapping) > 0:
-                device_count += 1
-                if device_count == total_device:
-                    verbose("SYSTEM - Scan thread", "Scan RTU - Full", "INFO")
-                    return return_data
+                with device_count_lock:
+                    device_count += 1
         except Exception as e:
             # print(e)
             pass
 
+    if device_count >= total_device:
+        verbose("SYSTEM - Scan thread", "Scan RTU - Full", "INFO")
+        return return_data
+
     undiscovery_device_list = filter_undiscovery_device(
         device_doctrine_dict=site_config_data, device_discoveryed_dict=return_data
     )
 
-    _device_found = device_count + len(device_database.get_known_device())
     verbose(
         "SYSTEM - Scan thread",
-        "Scan TCP - Missing (" + str(_device_found) + "/" + str(total_device) + ")",
+        "Scan RTU - Missing ("
+        + str(device_count)
+        + "/"
+        + str(total_device)
+        + ") on "
+        + serial_port,
         "INFO",
     )
     verbose(
@@ -323,6 +551,114 @@ def scan_standlone_RTU_device(
     return return_data
 
 
+def verify_discovery_cache(
+    driver_default_config: Dict[str, Any],
+    site_config_data: Dict[str, Any],
+    RTU_connections: Dict[str, Union[mbrtu.RtuMaster, RtuBusConnection]],
+) -> Dict[str, str]:
+    """
+    @brief      Read SN of devices in discovery cache at their last address (one read for
+                each device). Device not at its address anymore is removed from cache.
+    @param      driver_default_config   default config
+    @param      site_config_data        devices to scan
+    @param      RTU_connections         connection (or bus) of each RS485 port
+    @retval     mapping of devices still at their address
+    """
+
+    return_data: Dict[str, str] = {}
+    _support_device = driver_default_config["support_device"]
+
+    def _verify(SN: str, entry: Dict[str, Any]) -> Dict[str, str]:
+        device_type = _support_device[entry["device_type"]]
+        # Slave is read with driver of its master (same as scanner)
+        if device_type["slave_device"] == "TRUE":
+            device_type = _support_device[
+                _support_device[device_type["master_device_name"]]["device_type"]
+            ]
+        start_time = monotonic()
+        try:
+            if entry["protocol"] == "TCP":
+                result = read_TCP_device(
+                    host=entry["host"],
+                    port=entry["port"],
+                    client_ID=entry["client_ID"],
+                    path_driver_file=device_type["path_relative_driver_file"],
+                )
+            else:
+                result = read_RTU_device(
+                    connection=RTU_connections[entry["serial_port"]],
+                    client_ID=entry["client_ID"],
+                    path_driver_file=device_type["path_relative_driver_file"],
+                )
+        except Exception as e:
+            result = None
+        if result is None or result[0]["SN"][0] != SN:
+            verbose(
+                "SYSTEM - Scan thread",
+                "Device " + SN + " is not at " + discovery_database.address(entry),
+                "INFO",
+            )
+            discovery_database.remove(SN)
+            return {}
+
+        result_mapping = mapping.mapping_SN(
+            device_SN=SN,
+            device_type=result[0]["Md"][0],
+            client_ID=entry["client_ID"],
+            site_config_data=site_config_data,
+            master_device_SN=entry.get("master_device_SN", ""),
+            host=entry.get("host", ""),
+            port=entry.get("port", 0),
+            serial_port=entry.get("serial_port", ""),
+        )
+        if len(result_mapping) > 0:
+            discovery_database.add(SN, result_mapping[SN], monotonic() - start_time)
+        return result_mapping
+
+    _known_device_dict = device_database.get_known_device()
+    list_cached_device = [
+        (x, discovery_database.get(x))
+        for x in list(site_config_data.keys())
+        if x not in _known_device_dict
+    ]
+    list_cached_device = [
+        (SN, entry)
+        for SN, entry in list_cached_device
+        if entry is not None
+        and entry["device_type"] in _support_device
+        and entry["protocol"] == site_config_data[SN]["protocol"]
+        and (entry["protocol"] == "TCP" or entry.get("serial_port") in RTU_connections)
+    ]
+    if len(list_cached_device) == 0:
+        return return_data
+
+    # TCP devices are read together, RTU devices one by one (shared bus)
+    with ThreadPoolExecutor(
+        max_workers=MAX_PROBES_PER_SUBNET, thread_name_prefix="Verify"
+    ) as executor:
+        probes = [
+            executor.submit(_verify, SN, entry)
+            for SN, entry in list_cached_device
+            if entry["protocol"] == "TCP"
+        ]
+        for SN, entry in list_cached_device:
+            if entry["protocol"] == "RTU":
+                return_data.update(_verify(SN, entry))
+        for probe in as_completed(probes):
+            return_data.update(probe.result())
+
+    verbose(
+        "SYSTEM - Scan thread",
+        "Discovery cache - Verified ("
+        + str(len(return_data))
+        + "/"
+        + str(len(list_cached_device))
+        + ")",
+        "INFO",
+    )
+    return return_data
+
+
 def scan_device_non_loop(
     driver_default_config: Dict[str, Any],
     site_config_data: Dict[str, Any],
@@ -336,9 +672,50 @@ def scan_device_non_loop(
     list_IP_available: List[str] = []
     list_TCP_device: Dict[str, Any] = {}
     list_RTU_device: Dict[str, Any] = {}
+    RTU_connections: Dict[str, Union[mbrtu.RtuMaster, RtuBusConnection]] = {}
 
     # Get data from default config
     _support_device = driver_default_config["support_device"]
+    for device_info in list(site_config_data.keys()):
+        if site_config_data[device_info]["Md"] not in list(_support_device.keys()):
+            raise DeviceNotSupported(site_config_data[device_info]["Md"])
+
+    if any(x["protocol"] == "RTU" for x in site_config_data.values()):
+        # Every RS485 adapter is scanned, port of device is kept in mapping
+        rs485_ports = next(
+            x.get("rs485_ports", {})
+            for x in site_config_data.values()
+            if x["protocol"] == "RTU"
+        )
+        for USB_port_RS485 in get_ports_RS485():
+            rtu_bus = rtu_bus_registry.get(USB_port_RS485)
+            if rtu_bus is None:
+                RTU_connections[USB_port_RS485] = connect_serial(
+                    USB_port_RS485, 0.5, **rs485_ports.get(USB_port_RS485, {})
+                )
+            else:
+                # Port is owned by poller, scan requests wait in queue of its bus
+                RTU_connections[USB_port_RS485] = RtuBusConnection(
+                    rtu_bus, 0.5, probe=True
+                )
+
+    # Devices in discovery cache are checked at their last address first,
+    # only devices which are not there are scanned
+    mapping.get_list_device_SN(list_device_SN=list(site_config_data.keys()))
+    list_verified_device = verify_discovery_cache(
+        driver_default_config=driver_default_config,
+        site_config_data=site_config_data,
+        RTU_connections=RTU_connections,
+    )
+    return_data.update(list_verified_device)
+
+    _known_device_dict = device_database.get_known_device()
+    site_config_data = {
+        x: site_config_data[x]
+        for x in list(site_config_data.keys())
+        if x not in list_verified_device and x not in _known_device_dict
+    }
+
     list_device_SN = list(site_config_data.keys())
     list_TCP_type_device = list(
         dict.fromkeys(
@@ -367,23 +744,8 @@ def scan_device_non_loop(
     mapping.get_list_device_SN(list_device_SN=list_device_SN)
     device_count = 0
 
-    # check connect protocol
-    if "TCP" in list_type_protocol:
-        gateway_IP = get_host_default_gateway(
-            user=os.getenv("USER"), pwds=os.getenv("UserPwds")
-        )
-        list_IP_available = get_all_device_in_network(gateway=gateway_IP, mode=2)
-        list_IP_after_filter = filter_discovery_device(
-            list_IP_available=list_IP_available
-        )
-    if "RTU" in list_type_protocol:
-        USB_port_RS485 = get_port_RS485()
-        RTU_connection = connect_serial(USB_port_RS485, 0.5)
-
     # Separate TCP list and RTU list if it in same site
     for device_info in list(site_config_data.keys()):
-        if site_config_data[device_info]["Md"] not in list(_support_device.keys()):
-            raise DeviceNotSupported(site_config_data[device_info]["Md"])
         if site_config_data[device_info]["protocol"] == "TCP":
             list_TCP_device.update({device_info: site_config_data[device_info]})
         elif site_config_data[device_info]["protocol"] == "RTU":
@@ -391,29 +753,96 @@ def scan_device_non_loop(
 
     # start scanning and mapping device
     if "TCP" in list_type_protocol:
-        verbose("SYSTEM - Scan thread", "Scan TCP - Start", "INFO")
-        return_data.update(
-            scan_standlone_TCP_device(
-                list_IP_available=list_IP_after_filter,
-                total_device=len(list_TCP_device),
-                list_type_device=list_TCP_type_device,
-                driver_default_config=driver_default_config,
-                site_config_data=list_TCP_device,
+        # Gateway in site config is used without SSH to host
+        gateway_IP = next(
+            (
+                x["default_gateway"]
+                for x in list_TCP_device.values()
+                if x.get("default_gateway", "") != ""
+            ),
+            "",
+        )
+        if gateway_IP == "":
+            gateway_IP = get_host_default_gateway(
+                user=os.getenv("USER"), pwds=os.getenv("UserPwds")
             )
+        # Devices are probed while network is swept
+        list_IP_available = stream_device_in_network(gateway=gateway_IP)
+        list_IP_after_filter = filter_discovery_device(
+            list_IP_available=list_IP_available
         )
+
+        verbose("SYSTEM - Scan thread", "Scan TCP - Start", "INFO")
+        list_TCP_found_device = scan_standlone_TCP_device(
+            list_IP_available=list_IP_after_filter,
+            total_device=len(list_TCP_device),
+            list_type_device=list_TCP_type_device,
+            driver_default_config=driver_default_config,
+            site_config_data=list_TCP_device,
+        )
+        # Network of host may be changed
+        if len(list_TCP_found_device) == 0:
+            invalidate_host_default_gateway()
+        return_data.update(list_TCP_found_device)
         verbose("SYSTEM - Scan thread", "Scan TCP - Done", "INFO")
     if "RTU" in list_type_protocol:
         verbose("SYSTEM - Scan thread", "Scan RTU - Start", "INFO")
-        return_data.update(
-            scan_standlone_RTU_device(
-                connection=RTU_connection,
-                range_clientID=range_device_id_RTU,
-                total_device=len(list_RTU_device),
-                list_type_device=list_RTU_type_device,
-                driver_default_config=driver_default_config,
-                site_config_data=list_RTU_device,
-            )
-        )
+        total_device = device_count + len(list_RTU_device)
+        # RS485 adapters are scanned in parallel
+        with ThreadPoolExecutor(
+            max_workers=max(1, len(RTU_connections)), thread_name_prefix="Scan RTU"
+        ) as executor:
+            scans = []
+            for USB_port_RS485, RTU_connection in RTU_connections.items():
+                # Client ID range of port in site config (first, last)
+                client_ID_range = rs485_ports.get(USB_port_RS485, {}).get(
+                    "client_ID", []
+                )
+                if len(client_ID_range) == 2:
+                    range_clientID = [client_ID_range[0], client_ID_range[1] + 1]
+                else:
+                    range_clientID = range_device_id_RTU
+                if isinstance(RTU_connection, RtuBusConnection):
+                    # Bus adds transfer time of frames to timeout of request
+                    probe_timeout = PROBE_TURNAROUND_RTU
+                else:
+                    probe_timeout = get_probe_timeout_RTU(
+                        get_serial_settings(rs485_ports.get(USB_port_RS485, {}))[
+                            "baudrate"
+                        ]
+                    )
+                # Devices on port which are polled or verified are not probed
+                skip_client_ID = [
+                    int(x["client_ID"])
+                    for x in list(_known_device_dict.values())
+                    + list(list_verified_device.values())
+                    if x.get("protocol") == "RTU"
+                    and "client_ID" in x
+                    and x.get("serial_port", USB_port_RS485) == USB_port_RS485
+                ]
+                scans.append(
+                    executor.submit(
+                        scan_standlone_RTU_device,
+                        connection=RTU_connection,
+                        range_clientID=range_clientID,
+                        total_device=total_device,
+                        list_type_device=list_RTU_type_device,
+                        driver_default_config=driver_default_config,
+                        site_config_data=list_RTU_device,
+                        serial_port=USB_port_RS485,
+                        probe_timeout=probe_timeout,
+                        skip_client_ID=skip_client_ID,
+                    )
+                )
+            for scan in as_completed(scans):
+                return_data.update(scan.result())
         verbose("SYSTEM - Scan thread", "Scan RTU - Done", "INFO")
+    for RTU_connection in RTU_connections.values():
+        RTU_connection.close()
+
+    # Address of new devices is kept, probe latency is measured when it is verified
+    for device_SN in list(return_data.keys()):
+        if device_SN not in list_verified_device:
+            discovery_database.add(device_SN, return_data[device_SN])
 
     return return_data
@@ -18,7 +18,11 @@ from rpi_modbus import *
 from rpi_system import *
 from rpi_FileIO import dict2json, json2dict
 from rpi_verbose import verbose
-from rpi_database import MAPPING_FILE_NAME
+from rpi_database import (
+    MAPPING_FILE_NAME,
+    DISCOVERY_CACHE_FILE_NAME,
+    discovery_database,
+)
 
 
 def seperate_static_dynamic(site_config_data: Dict[str, Any]) -> List[Dict[str, Any]]:
@@ -54,6 +58,9 @@ def identify_device_non_loop(
         dict2json(site_mapping_direct, site_mapping_data)
         site_mapping_data = json2dict(site_mapping_direct)
     driver_default_config_file = json2dict(driver_default_config_file_direct)
+    discovery_database.load(
+        os.path.join(os.path.dirname(site_mapping_direct), DISCOVERY_CACHE_FILE_NAME)
+    )
     # Scan and mapping
     verbose("SYSTEM - Scan thread", "Start scanning device", "INFO")
 
@@ -64,6 +71,7 @@ def identify_device_non_loop(
             driver_default_config=driver_default_config_file,
             site_config_data=dynamic_dict,
         )
+        discovery_database.save()
 
     site_mapping_data["keepDataAfterPowerLoss"] = "TRUE"
     site_mapping_data["mapping_SN_IP"].update(data)
@@ -0,0 +1,383 @@
+from typing import *
+
+import numpy as np
+
+from rpi_modbuslib_exceptions import UnimplementedRegister
+from rpi_driver import (
+    PointDescriptor,
+    ENUM,
+    BITFIELD,
+    STRING,
+    INTEGER,
+    FLOAT,
+    SCALE_FACTOR,
+)
+
+_SHIFT = np.uint64(16)
+_MAX_EXPONENT = 22  # 10 ** 22 is the largest power of ten exact in float64
+
+
+class PointGroup:
+    """
+    Points in one block sharing kind, data type, count, byte order and word order
+    """
+
+    def __init__(
+        self,
+        kind: int,
+        data_type: str,
+        count: int,
+        words: int,
+        byte_little: bool,
+        word_little: bool,
+        unimplement: int,
+    ) -> None:
+        self.kind = kind
+        self.data_type = data_type
+        self.count = count
+        self.words = words
+        self.byte_little = byte_little
+        self.word_little = word_little
+        self.unimplement = np.uint64(unimplement)
+        self.names: List[str] = []
+        self.offsets: Union[List[int], np.ndarray] = []
+        self.scale_factors: List[Union[str, int]] = []
+        self.constants: List[Dict[str, str]] = []
+        self.index: np.ndarray = np.zeros((0, count), dtype=np.intp)
+
+    def add(
+        self,
+        name: str,
+        offset: int,
+        scale_factor: Union[str, int] = 0,
+        constants: Dict[str, str] = None,
+    ) -> None:
+        self.names.append(name)
+        self.offsets.append(offset)
+        self.scale_factors.append(scale_factor)
+        self.constants.append(constants)
+
+    def freeze(self) -> None:
+        """
+        @brief      Build gather index of every register of every point in group
+        @retval     None
+        """
+
+        self.offsets = np.asarray(self.offsets, dtype=np.intp)
+        self.index = self.offsets[:, None] + np.arange(self.count, dtype=np.intp)
+
+    def combine(self, block: np.ndarray) -> np.ndarray:
+        """
+        @brief      Convert registers of every point to single raw value (Big Endian)
+        @param      block           raw registers of block
+        @retval     raw value of every point as uint64
+        """
+
+        registers = block[self.index]
+        if self.byte_little:
+            registers = registers.byteswap()
+        if self.word_little:
+            registers = registers[:, ::-1]
+        registers = registers[:, : self.words].astype(np.uint64)
+
+        return_data = registers[:, 0].copy()
+        for x in range(1, self.words):
+            return_data = (return_data << _SHIFT) | registers[:, x]
+        return return_data
+
+
+class BlockLayout:
+    """
+    Compiled layout of points in one register block
+    """
+
+    def __init__(
+        self,
+        descriptors: Dict[str, PointDescriptor],
+        length: int,
+        block_points: Tuple[Tuple[str, int, int], ...],
+    ) -> None:
+        """
+        @brief      Group points of block for vectorized decoder
+        @param      descriptors             compiled driver points of one register type
+        @param      length                  number of registers of block
+        @param      block_points            (name, offset, count) of points in block
+        @retval     None
+        """
+
+        self.length = length
+        self.offsets: Dict[str, Tuple[int, int]] = {}
+        self.groups: List[PointGroup] = []
+        self.scale_factor_groups: List[PointGroup] = []
+        # Points can not decode in batch, decode one by one
+        self.fallback: List[str] = []
+        self.scale_factor_fallback: List[str] = []
+
+        groups: Dict[Tuple[Any, ...], PointGroup] = {}
+        scale_factor_groups: Dict[Tuple[Any, ...], PointGroup] = {}
+
+        for point_name, offset, reg_len in block_points:
+            self.offsets[point_name] = (offset, reg_len)
+            descriptor = descriptors[point_name]
+
+            if "SF" in point_name:
+                if not self._add(
+                    scale_factor_groups, SCALE_FACTOR, descriptor, offset, reg_len
+                ):
+                    self.scale_factor_fallback.append(point_name)
+
+            if descriptor.kind == STRING or not self._add(
+                groups, descriptor.kind, descriptor, offset, reg_len
+            ):
+                self.fallback.append(point_name)
+
+        self.groups = list(groups.values())
+        self.scale_factor_groups = list(scale_factor_groups.values())
+        for group in self.groups + self.scale_factor_groups:
+            group.freeze()
+
+    @staticmethod
+    def _add(
+        groups: Dict[Tuple[Any, ...], PointGroup],
+        kind: int,
+        descriptor: PointDescriptor,
+        offset: int,
+        reg_len: int,
+    ) -> bool:
+        """
+        @brief      Add point to group
+        @retval     False if point need decode one by one
+        """
+
+        words = descriptor.words
+        unimplement = descriptor.unimplement
+        if (
+            descriptor.error_type is not None
+            or words is None
+            or words > reg_len
+            or not isinstance(unimplement, int)
+            or unimplement < 0
+            or unimplement > 18446744073709551615
+        ):
+            return False
+        if kind == SCALE_FACTOR and words > 2:
+            return False
+
+        key = (
+            kind,
+            descriptor.data_type,
+            reg_len,
+            words,
+            descriptor.byte_little,
+            descriptor.word_little,
+        )
+        if key not in groups:
+            groups[key] = PointGroup(
+                kind,
+                descriptor.data_type,
+                reg_len,
+                words,
+                descriptor.byte_little,
+                descriptor.word_little,
+                unimplement,
+            )
+        groups[key].add(
+            descriptor.name, offset, descriptor.scale_factor, descriptor.constants
+        )
+        return True
+
+
+class BatchDecoder:
+    """
+    Vectorized decoder for whole register block, same result as DefaultDecoder/DatabaseDecoder
+    """
+
+    def __init__(self, human_readable: bool) -> None:
+        """
+        @brief      Define type of result
+        @param      human_readable      True: enum/bitfield as label (DefaultDecoder),
+                                        False: enum/bitfield as number (DatabaseDecoder)
+        @retval     None
+        """
+
+        self.human_readable = human_readable
+
+    @staticmethod
+    def to_array(raw_block: Sequence[int], layout: BlockLayout) -> np.ndarray:
+        """
+        @brief      Convert raw block to uint16 array, missing registers is filled by 0
+        @param      raw_block           raw registers of block
+        @param      layout              layout of block
+        @retval     uint16 array of block
+        """
+
+        return_data = np.zeros(max(layout.length, len(raw_block)), dtype=np.uint16)
+        return_data[: len(raw_block)] = np.asarray(raw_block, dtype=np.uint16)
+        return return_data
+
+    @staticmethod
+    def _valid(group: PointGroup, received: int) -> np.ndarray:
+        return group.offsets + group.count <= received
+
+    def decode_scale_factors(
+        self, block: np.ndarray, received: int, layout: BlockLayout
+    ) -> Tuple[Dict[str, int], Dict[str, Exception]]:
+        """
+        @brief      Decode every scale factor point in block
+        @param      block               uint16 array of block
+        @param      received            number of registers device returned
+        @param      layout              layout of block
+        @retval     scale factor values and errors
+        """
+
+        return_data: Dict[str, int] = {}
+        return_error: Dict[str, Exception] = {}
+
+        for group in layout.scale_factor_groups:
+            raw_value = group.combine(block)
+            value = raw_value.astype(np.int64)
+            value = np.where(raw_value > 32767, value - 65536, value)
+            unimplemented = raw_value == group.unimplement
+            valid = self._valid(group, received)
+
+            for name, x, is_unimplemented, is_valid in zip(
+                group.names, value.tolist(), unimplemented.tolist(), valid.tolist()
+            ):
+                if not is_valid:
+                    continue
+                if is_unimplemented:
+                    return_error[name] = UnimplementedRegister(name)
+                else:
+                    return_data[name] = x
+
+        return return_data, return_error
+
+    def decode_block(
+        self,
+        block: np.ndarray,
+        received: int,
+        layout: BlockLayout,
+        scale_factor: Dict[str, int],
+    ) -> Tuple[Dict[str, Any], Dict[str, Exception]]:
+        """
+        @brief      Decode every point of block in one vectorized pass
+        @param      block               uint16 array of block
+        @param      received            number of registers device returned
+        @param      layout              layout of block
+        @param      scale_factor        scale factor values of device
+        @retval     values and errors of points
+        """
+
+        return_data: Dict[str, Any] = {}
+        return_error: Dict[str, Exception] = {}
+
+        for group in layout.groups:
+            raw_value = group.combine(block)
+            unimplemented = (raw_value == group.unimplement).tolist()
+            valid = self._valid(group, received).tolist()
+
+            if group.kind == INTEGER or group.kind == FLOAT:
+                values = self._decode_number(group, raw_value, scale_factor)
+            elif self.human_readable and group.kind == ENUM:
+                values = [
+                    self._convert_enum(x, convert_dict)
+                    for x, convert_dict in zip(raw_value.tolist(), group.constants)
+                ]
+            elif self.human_readable and group.kind == BITFIELD:
+                values = [
+                    self._convert_bitfield(x, convert_dict)
+                    for x, convert_dict in zip(raw_value.tolist(), group.constants)
+                ]
+            elif group.kind == SCALE_FACTOR:
+                value = raw_value.astype(np.int64)
+                values = np.where(raw_value > 32767, value - 65536, value).tolist()
+            else:
+                values = raw_value.tolist()
+
+            for name, x, is_unimplemented, is_valid in zip(
+                group.names, values, unimplemented, valid
+            ):
+                if not is_valid:
+                    continue
+                if is_unimplemented:
+                    return_error[name] = UnimplementedRegister(name)
+                elif isinstance(x, Exception):
+                    return_error[name] = x
+                else:
+                    return_data[name] = x
+
+        return return_data, return_error
+
+    @staticmethod
+    def _decode_number(
+        group: PointGroup, raw_value: np.ndarray, scale_factor: Dict[str, int]
+    ) -> List[Union[int, float]]:
+        """
+        @brief      Convert raw values to signed number/float and apply scale factor
+        @param      group               group of points
+        @param      raw_value           raw value of every point as uint64
+        @param      scale_factor        scale factor values of device
+        @retval     human readable value as numbers
+        """
+
+        exponent = np.asarray(
+            [
+                scale_factor.get(x, 0) if isinstance(x, str) else x
+                for x in group.scale_factors
+            ],
+            dtype=np.int64,
+        )
+        # 10.0 ** exponent is same as python in this range, other is decoded one by one
+        in_range = np.abs(exponent) <= _MAX_EXPONENT
+        scale = np.power(10.0, np.where(in_range, exponent, 0))
+
+        if group.kind == FLOAT:
+            # Signaling NaN become quiet NaN like struct.unpack
+            with np.errstate(invalid="ignore"):
+                value = raw_value.astype(np.uint32).view(np.float32).astype(np.float64)
+        # if it sign number change to int ctype
+        elif group.data_type == "int16" or group.data_type == "sunssf":
+            value = raw_value.astype(np.uint16).view(np.int16).astype(np.int64)
+        elif group.data_type == "int32":
+            value = raw_value.astype(np.uint32).view(np.int32).astype(np.int64)
+        elif group.data_type == "int64":
+            value = raw_value.view(np.int64)
+        else:
+            value = raw_value
+
+        scaled = (value.astype(np.float64) * scale).tolist()
+        return_data: List[Union[int, float, Exception]] = []
+        for x, x_scaled, e, is_in_range in zip(
+            value.tolist(), scaled, exponent.tolist(), in_range.tolist()
+        ):
+            if not is_in_range:
+                try:
+                    return_data.append(round(x * 10 ** e, 5))
+                except Exception as error:
+                    return_data.append(error)
+            # Float value or negative scale factor give float, other give int
+            elif group.kind == FLOAT or e < 0:
+                return_data.append(round(x_scaled, 5))
+            else:
+                return_data.append(x * 10 ** e)
+        return return_data
+
+    @staticmethod
+    def _convert_enum(value: int, convert_dict: Dict[str, str]) -> Union[str, Exception]:
+        try:
+            return convert_dict[str(value)]
+        except Exception as error:
+            return error
+
+    @staticmethod
+    def _convert_bitfield(
+        value: int, convert_dict: Dict[str, str]
+    ) -> Union[List[str], Exception]:
+        try:
+            return [
+                convert_dict[str(x)]
+                for x in convert_dict.keys()
+                if value & int(x) == int(x)
+            ]
+        except Exception as error:
+            return error
@@ -0,0 +1,157 @@
+from typing import *
+
+import snappy
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Payload of codec other than snappy starts with marker and ID of codec. Snappy data
+# never starts with 0x00 followed by more bytes (0x00 is empty data), payload
+# without marker is snappy (same as before codecs).
+CODEC_MARKER: bytes = b"\x00"
+CODEC_ID: Dict[str, int] = {"snappy": 1, "zstd": 2}
+
+ZSTD_LEVEL: int = 3
+DICTIONARY_SIZE: int = 16 * 1024
+
+
+def codec_name(data: bytes) -> str:
+    """
+    @brief      Get codec of payload (content type marker)
+    @param      data            compressed payload
+    @retval     name of codec
+    """
+
+    if len(data) > 1 and data[:1] == CODEC_MARKER:
+        for name, codec_id in CODEC_ID.items():
+            if data[1] == codec_id:
+                return name
+        raise ValueError("Unknown codec ID: " + str(data[1]))
+    return "snappy"
+
+
+def load_dictionary(path: str) -> "zstandard.ZstdCompressionDict":
+    """
+    @brief      Read zstd dictionary file (train_dictionary)
+    @param      path            dictionary file
+    @retval     dictionary
+    """
+
+    if zstandard is None:
+        raise ImportError("zstd codec needs zstandard package")
+    with open(path, "rb") as f:
+        return zstandard.ZstdCompressionDict(f.read())
+
+
+def train_dictionary(
+    samples: List[bytes], dict_size: int = DICTIONARY_SIZE
+) -> bytes:
+    """
+    @brief      Train zstd dictionary from typical payloads (uncompressed
+                MetricSubmission) of driver
+    @param      samples         uncompressed payloads
+    @param      dict_size       max size of dictionary
+    @retval     dictionary file data
+    """
+
+    if zstandard is None:
+        raise ImportError("zstd codec needs zstandard package")
+    return zstandard.train_dictionary(dict_size, samples).as_bytes()
+
+
+class SnappyCodec:
+    """
+    Snappy over serialized MetricSubmission, payload has no marker
+    """
+
+    name: str = "snappy"
+
+    def __init__(
+        self, dictionaries: Dict[int, "zstandard.ZstdCompressionDict"] = None
+    ) -> None:
+        """
+        @param      dictionaries        zstd dictionaries by ID, to decompress zstd
+                                        payload of queue
+        """
+
+        self.dictionaries = {} if dictionaries is None else dictionaries
+
+    def compress(self, data: bytes) -> bytes:
+        return snappy.compress(data)
+
+    def decompress(self, data: bytes) -> bytes:
+        """
+        @brief      Decompress payload of any codec
+        @param      data            compressed payload
+        @retval     bytes
+        """
+
+        name = codec_name(data)
+        if name == "snappy":
+            if data[:1] == CODEC_MARKER and len(data) > 1:
+                data = data[2:]
+            return snappy.decompress(data)
+
+        if zstandard is None:
+            raise ImportError("zstd codec needs zstandard package")
+        frame = data[2:]
+        dict_id = zstandard.get_frame_parameters(frame).dict_id
+        if dict_id != 0 and dict_id not in self.dictionaries:
+            raise ValueError("Missing zstd dictionary: " + str(dict_id))
+        return zstandard.ZstdDecompressor(
+            dict_data=self.dictionaries.get(dict_id)
+        ).decompress(frame)
+
+
+class ZstdCodec(SnappyCodec):
+    """
+    zstd over serialized MetricSubmission, with dictionary trained from payloads of
+    driver. Frame has ID of dictionary, consumer needs same dictionary file.
+    """
+
+    name: str = "zstd"
+
+    def __init__(self, dictionary_path: str = "", level: int = ZSTD_LEVEL) -> None:
+        """
+        @param      dictionary_path     dictionary file (train_dictionary), "" is
+                                        no dictionary
+        @param      level               compression level
+        """
+
+        if zstandard is None:
+            raise ImportError("zstd codec needs zstandard package")
+        self.dictionary = None
+        dictionaries = {}
+        if dictionary_path != "":
+            self.dictionary = load_dictionary(dictionary_path)
+            dictionaries[self.dictionary.dict_id()] = self.dictionary
+        super().__init__(dictionaries)
+        # Compressor is reused, codec must be used by one thread
+        self.compressor = zstandard.ZstdCompressor(
+            level=level, dict_data=self.dictionary
+        )
+        self.header = CODEC_MARKER + bytes((CODEC_ID[self.name],))
+
+    def compress(self, data: bytes) -> bytes:
+        return self.header + self.compressor.compress(data)
+
+
+def get_codec(name: str = "snappy", dictionary_path: str = "") -> SnappyCodec:
+    """
+    @brief      Create codec of payload
+    @param      name                "snappy" or "zstd"
+    @param      dictionary_path     zstd dictionary file, "" is no dictionary
+    @retval     codec
+    """
+
+    if name == "snappy":
+        if dictionary_path != "" and zstandard is not None:
+            # Payloads of queue may be compressed with zstd before
+            dictionary = load_dictionary(dictionary_path)
+            return SnappyCodec({dictionary.dict_id(): dictionary})
+        return SnappyCodec()
+    elif name == "zstd":
+        return ZstdCodec(dictionary_path)
+    raise ValueError("Unknown codec: " + str(name))
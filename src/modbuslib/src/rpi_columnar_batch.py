@@ -0,0 +1,392 @@
+import struct
+from typing import *
+
+import rpi_natsio_schema_pb2
+
+from rpi_metric_encoder import (
+    WIRE_FIXED32,
+    WIRE_LENGTH_DELIMITED,
+    WIRE_VARINT,
+    encode_varint,
+)
+
+# Columnar batch of MetricSubmission (site of queue), after magic bytes:
+#
+#     varint      number of strings, each string: varint length, utf-8 bytes
+#     varint      tenant, location (index of string)
+#     varint      number of series (device)
+#     series:
+#         varint      model, manufacturer, serial_number, driver_version, device_id
+#         varint      number of rows (metric group) n
+#         zigzag      n timestamps (delta of delta)
+#         varint      number of columns
+#         column:
+#             varint      name, unit (index of string), value field of Metric
+#                         (3 - 12, 0 is no value)
+#             bytes       presence of rows, bit i % 8 of byte i // 8 is row i
+#             values of rows which have column:
+#                 integer     zigzag, delta of delta (64 bits wrap around)
+#                 float       varint, float32 bits XOR bits of previous value
+#                 string      varint, index of string
+#
+# Metric which appears more than once in a metric group is one column for each time
+# it appears.
+
+MAGIC: bytes = b"CTS1"
+
+WIRE_FIXED64: int = 1
+
+UINT64: int = 1 << 64
+INT64_MIN: int = -(1 << 63)
+
+FLOAT_VALUE_FIELD: int = 7
+STR_VALUE_FIELD: int = 12
+SIGNED_VALUE_FIELD: Tuple[int, ...] = (3, 5)
+
+DEVICE_INFO_FIELDS: Tuple[str, ...] = (
+    "model",
+    "manufacturer",
+    "serial_number",
+    "driver_version",
+    "device_id",
+)
+
+
+def is_columnar_batch(data: bytes) -> bool:
+    """
+    @brief      Check data (uncompressed) is columnar batch, MetricSubmission never
+                starts with magic bytes
+    @param      data            uncompressed data
+    @retval     bool
+    """
+
+    return data[: len(MAGIC)] == MAGIC
+
+
+def encode_zigzag(value: int) -> bytes:
+    return encode_varint((value << 1) ^ (value >> 63))
+
+
+def decode_varint(data: bytes, position: int) -> Tuple[int, int]:
+    """
+    @brief      Decode protobuf varint
+    @param      data            bytes
+    @param      position        position of varint
+    @retval     (value, position after varint)
+    """
+
+    value = 0
+    shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, position
+        shift += 7
+
+
+def decode_zigzag(data: bytes, position: int) -> Tuple[int, int]:
+    value, position = decode_varint(data, position)
+    return (value >> 1) ^ -(value & 1), position
+
+
+def wrap_int64(value: int) -> int:
+    return (value - INT64_MIN) % UINT64 + INT64_MIN
+
+
+def encode_delta_of_delta(values: Iterable[int]) -> bytes:
+    """
+    @brief      Encode integers as first value, first delta, then delta of delta
+    @param      values          integers (64 bits)
+    @retval     bytes
+    """
+
+    return_data = []
+    previous = 0
+    previous_delta = 0
+    for index, value in enumerate(values):
+        value %= UINT64
+        delta = wrap_int64(value - previous)
+        return_data.append(encode_zigzag(wrap_int64(delta - previous_delta)))
+        previous = value
+        previous_delta = delta if index > 0 else 0
+    return b"".join(return_data)
+
+
+def decode_delta_of_delta(
+    data: bytes, position: int, count: int, signed: bool = True
+) -> Tuple[List[int], int]:
+    """
+    @brief      Decode integers of encode_delta_of_delta
+    @param      data            bytes
+    @param      position        position of first integer
+    @param      count           number of integers
+    @param      signed          integers are signed (64 bits)
+    @retval     (integers, position after integers)
+    """
+
+    return_data = []
+    previous = 0
+    previous_delta = 0
+    for index in range(count):
+        delta_of_delta, position = decode_zigzag(data, position)
+        delta = wrap_int64(delta_of_delta + previous_delta)
+        previous = (previous + delta) % UINT64
+        previous_delta = delta if index > 0 else 0
+        return_data.append(wrap_int64(previous) if signed else previous)
+    return return_data, position
+
+
+class StringTable:
+    """
+    Dictionary of strings (name, unit, device info, string value) of one batch
+    """
+
+    def __init__(self) -> None:
+        self.index: Dict[str, int] = {}
+
+    def add(self, value: str) -> int:
+        index = self.index.get(value)
+        if index is None:
+            index = len(self.index)
+            self.index[value] = index
+        return index
+
+    def encode(self) -> bytes:
+        return_data = [encode_varint(len(self.index))]
+        for value in self.index:
+            value_bytes = value.encode()
+            return_data.append(encode_varint(len(value_bytes)))
+            return_data.append(value_bytes)
+        return b"".join(return_data)
+
+
+def read_fields(
+    data: bytes, position: int, end: int
+) -> Iterator[Tuple[int, int, int, int]]:
+    """
+    @brief      Read protobuf fields of message
+    @param      data            bytes
+    @param      position        start of message
+    @param      end             end of message
+    @retval     (field number, wire type, value, end of field), value of length
+                delimited field is its start
+    """
+
+    while position < end:
+        tag, position = decode_varint(data, position)
+        wire_type = tag & 7
+        if wire_type == WIRE_VARINT:
+            value, position = decode_varint(data, position)
+            yield tag >> 3, wire_type, value, position
+        elif wire_type == WIRE_LENGTH_DELIMITED:
+            length, position = decode_varint(data, position)
+            yield tag >> 3, wire_type, position, position + length
+            position += length
+        elif wire_type == WIRE_FIXED32:
+            value = int.from_bytes(data[position : position + 4], "little")
+            position += 4
+            yield tag >> 3, wire_type, value, position
+        elif wire_type == WIRE_FIXED64:
+            value = int.from_bytes(data[position : position + 8], "little")
+            position += 8
+            yield tag >> 3, wire_type, value, position
+        else:
+            raise ValueError("Unsupported wire type: {0}".format(wire_type))
+
+
+def encode_columnar_batch(
+    data: Union[bytes, bytearray, rpi_natsio_schema_pb2.MetricSubmission]
+) -> bytes:
+    """
+    @brief      Convert MetricSubmission (or concatenated serialized submissions of
+                one site) to columnar batch: metric groups of each device share one
+                timestamp array, name and unit of metrics are in dictionary of batch.
+                Serialized data is read without protobuf objects.
+    @param      data            MetricSubmission or serialized MetricSubmission
+    @retval     bytes (uncompressed)
+    """
+
+    if isinstance(data, memoryview):
+        data = bytes(data)
+    elif not isinstance(data, (bytes, bytearray)):
+        data = data.SerializeToString()
+
+    strings = StringTable()
+    site_info = ["", ""]
+
+    # device info -> (timestamps, columns)
+    # column: (name, unit, value field, occurrence) -> {row: value}, float value is
+    # float32 bits, string value is index of string
+    series: Dict[
+        Tuple[int, ...],
+        Tuple[List[int], Dict[Tuple[int, int, int, int], Dict[int, int]]],
+    ] = {}
+    for field_number, wire_type, start, end in read_fields(data, 0, len(data)):
+        if wire_type != WIRE_LENGTH_DELIMITED:
+            continue
+        if field_number == 1:
+            # Site info of concatenated submissions is merged
+            for field, _, value_start, value_end in read_fields(data, start, end):
+                if 1 <= field <= 2:
+                    site_info[field - 1] = data[value_start:value_end].decode()
+        elif field_number == 2:
+            timestamp = 0
+            device_info = ["", "", "", "", ""]
+            metrics = []
+            for field, field_wire_type, value, value_end in read_fields(
+                data, start, end
+            ):
+                if field == 1 and field_wire_type == WIRE_VARINT:
+                    timestamp = wrap_int64(value)
+                elif field == 2 and field_wire_type == WIRE_LENGTH_DELIMITED:
+                    for info_field, _, info_start, info_end in read_fields(
+                        data, value, value_end
+                    ):
+                        if 1 <= info_field <= len(DEVICE_INFO_FIELDS):
+                            device_info[info_field - 1] = data[
+                                info_start:info_end
+                            ].decode()
+                elif field == 3 and field_wire_type == WIRE_LENGTH_DELIMITED:
+                    metrics.append((value, value_end))
+
+            timestamps, columns = series.setdefault(
+                tuple(strings.add(x) for x in device_info), ([], {})
+            )
+            row = len(timestamps)
+            timestamps.append(timestamp)
+            occurrences: Dict[Tuple[int, int, int], int] = {}
+            for metric_start, metric_end in metrics:
+                name = ""
+                unit = ""
+                value_field = 0
+                metric_value = 0
+                for field, _, value, value_end in read_fields(
+                    data, metric_start, metric_end
+                ):
+                    if field == 1:
+                        name = data[value:value_end].decode()
+                    elif field == 2:
+                        unit = data[value:value_end].decode()
+                    elif field == STR_VALUE_FIELD:
+                        value_field = field
+                        metric_value = strings.add(data[value:value_end].decode())
+                    elif 3 <= field < STR_VALUE_FIELD:
+                        value_field = field
+                        metric_value = value
+                key = (strings.add(name), strings.add(unit), value_field)
+                occurrence = occurrences.get(key, 0)
+                occurrences[key] = occurrence + 1
+                columns.setdefault(key + (occurrence,), {})[row] = metric_value
+    site_info = [strings.add(x) for x in site_info]
+
+    return_data = [MAGIC, strings.encode()]
+    return_data.extend(encode_varint(x) for x in site_info)
+    return_data.append(encode_varint(len(series)))
+    for device_info, (timestamps, columns) in series.items():
+        return_data.extend(encode_varint(x) for x in device_info)
+        return_data.append(encode_varint(len(timestamps)))
+        return_data.append(encode_delta_of_delta(timestamps))
+        return_data.append(encode_varint(len(columns)))
+        for (name, unit, field_number, _), values in columns.items():
+            return_data.append(encode_varint(name))
+            return_data.append(encode_varint(unit))
+            return_data.append(encode_varint(field_number))
+            presence = bytearray((len(timestamps) + 7) // 8)
+            for row in values:
+                presence[row // 8] |= 1 << (row % 8)
+            return_data.append(bytes(presence))
+            column_values = [values[x] for x in sorted(values)]
+            if field_number == 0:
+                continue
+            elif field_number == FLOAT_VALUE_FIELD:
+                previous = 0
+                for value in column_values:
+                    return_data.append(encode_varint(value ^ previous))
+                    previous = value
+            elif field_number == STR_VALUE_FIELD:
+                return_data.extend(encode_varint(x) for x in column_values)
+            else:
+                return_data.append(encode_delta_of_delta(column_values))
+    return b"".join(return_data)
+
+
+def decode_columnar_batch(data: bytes) -> rpi_natsio_schema_pb2.MetricSubmission:
+    """
+    @brief      Convert columnar batch to MetricSubmission, metric groups are in order
+                of device then time, metrics of group are in order of columns
+    @param      data            columnar batch (uncompressed)
+    @retval     MetricSubmission
+    """
+
+    if not is_columnar_batch(data):
+        raise ValueError("Data is not columnar batch")
+    position = len(MAGIC)
+
+    count, position = decode_varint(data, position)
+    strings = []
+    for _ in range(count):
+        length, position = decode_varint(data, position)
+        strings.append(data[position : position + length].decode())
+        position += length
+
+    submission = rpi_natsio_schema_pb2.MetricSubmission()
+    tenant, position = decode_varint(data, position)
+    location, position = decode_varint(data, position)
+    submission.site_info.tenant = strings[tenant]
+    submission.site_info.location = strings[location]
+
+    value_fields = rpi_natsio_schema_pb2.Metric.DESCRIPTOR.fields_by_number
+    series_count, position = decode_varint(data, position)
+    for _ in range(series_count):
+        device_info = []
+        for _ in DEVICE_INFO_FIELDS:
+            index, position = decode_varint(data, position)
+            device_info.append(strings[index])
+        row_count, position = decode_varint(data, position)
+        timestamps, position = decode_delta_of_delta(data, position, row_count)
+
+        metric_groups = []
+        for timestamp in timestamps:
+            metric_group = submission.metric_groups.add(timestamp=timestamp)
+            metric_group.device_info.SetInParent()
+            for field, value in zip(DEVICE_INFO_FIELDS, device_info):
+                setattr(metric_group.device_info, field, value)
+            metric_groups.append(metric_group)
+
+        column_count, position = decode_varint(data, position)
+        for _ in range(column_count):
+            name, position = decode_varint(data, position)
+            unit, position = decode_varint(data, position)
+            field_number, position = decode_varint(data, position)
+            presence = data[position : position + (row_count + 7) // 8]
+            position += len(presence)
+            rows = [x for x in range(row_count) if presence[x // 8] >> (x % 8) & 1]
+
+            if field_number == 0:
+                values = [None] * len(rows)
+            elif field_number == FLOAT_VALUE_FIELD:
+                values = []
+                previous = 0
+                for _ in rows:
+                    bits, position = decode_varint(data, position)
+                    previous ^= bits
+                    values.append(struct.unpack("<f", struct.pack("<I", previous))[0])
+            elif field_number == STR_VALUE_FIELD:
+                values = []
+                for _ in rows:
+                    index, position = decode_varint(data, position)
+                    values.append(strings[index])
+            else:
+                values, position = decode_delta_of_delta(
+                    data, position, len(rows), field_number in SIGNED_VALUE_FIELD
+                )
+
+            for row, value in zip(rows, values):
+                metric = metric_groups[row].metrics.add(
+                    name=strings[name], unit=strings[unit]
+                )
+                if field_number != 0:
+                    setattr(metric, value_fields[field_number].name, value)
+    return submission
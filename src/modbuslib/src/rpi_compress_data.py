@@ -4,7 +4,8 @@ import time
 import snappy
 import rpi_natsio_schema_pb2
 
-from rpi_modbus import PointContainer
+from rpi_codec import SnappyCodec
+from rpi_modbus import PointContainer, PointTable
 
 
 class CompressData:
@@ -59,7 +60,9 @@ class CompressData:
     @staticmethod
     def add_metric_data(
         metric_group: rpi_natsio_schema_pb2.MetricGroup,
-        block_data: Tuple[Dict[str, PointContainer], Dict[str, Exception]],
+        block_data: Tuple[
+            Union[PointTable, Dict[str, PointContainer]], Dict[str, Exception]
+        ],
     ) -> None:
         """
         @brief      Add data to protobuf data block
@@ -68,15 +71,17 @@ class CompressData:
         @retval     None
         """
 
-        for readable_value in block_data[0].items():
+        point_table = block_data[0]
+        if not isinstance(point_table, PointTable):
+            point_table = PointTable(point_table)
+
+        for name, result, data_type_json, unit in point_table.rows():
             data = metric_group.metrics.add()
 
-            data.name = readable_value[0]
-            data.unit = readable_value[1].unit
-            result = readable_value[1].value
+            data.name = name
+            data.unit = unit
 
             data_type = ""
-            data_type_json = readable_value[1].data_type
 
             if type(result) is float:
                 data_type = "float"
@@ -122,16 +127,26 @@ class CompressData:
 
     @staticmethod
     def compress_data(
-        metric_submission: rpi_natsio_schema_pb2.MetricSubmission,
+        metric_submission: Union[
+            rpi_natsio_schema_pb2.MetricSubmission, bytes, bytearray, memoryview
+        ],
+        codec: SnappyCodec = None,
     ) -> bytes:
         """
         @brief      Compress data
-        @param      metric_submission        protobuf metric group data
+        @param      metric_submission        protobuf metric group data, or serialized
+                                             MetricSubmission (rpi_metric_encoder),
+                                             serialized data is not copied
+        @param      codec                    codec of payload (rpi_codec), None is
+                                             snappy
         @retval     block_data as bytes
         """
 
-        return_data = snappy.compress(metric_submission.SerializeToString())
-        return return_data
+        if not isinstance(metric_submission, (bytes, bytearray, memoryview)):
+            metric_submission = metric_submission.SerializeToString()
+        if codec is None:
+            return snappy.compress(metric_submission)
+        return codec.compress(metric_submission)
 
     @staticmethod
     def remove_all_metric_data(
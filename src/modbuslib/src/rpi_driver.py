@@ -0,0 +1,297 @@
+import json, os
+import threading
+from functools import lru_cache
+from types import MappingProxyType
+from typing import *
+
+from rpi_modbuslib_exceptions import UnknownDataType
+
+# Kind of decoder used by a point, index of ModbusDevice.decoder_table
+ENUM = 0
+BITFIELD = 1
+STRING = 2
+INTEGER = 3
+FLOAT = 4
+SCALE_FACTOR = 5
+
+
+def decoder_kind(data_type: str) -> Union[int, None]:
+    """
+    @brief      Get kind of decoder for data type
+    @param      data_type       data_type of variable
+    @retval     kind of decoder, None if data type is unknown
+    """
+
+    if "enum" in data_type:
+        return ENUM
+    elif "bitfield" in data_type:
+        return BITFIELD
+    elif data_type == "string" or data_type == "UTF-8":
+        return STRING
+    elif "int" in data_type or "uint" in data_type or "acc" in data_type:
+        return INTEGER
+    elif data_type == "float":
+        return FLOAT
+    elif data_type == "sunssf":
+        return SCALE_FACTOR
+    return None
+
+
+def register_words(data_type: str) -> Union[int, None]:
+    """
+    @brief      Get number of registers make up a value, same as PreProcessDecoder.process_registers
+    @param      data_type       data_type of variable
+    @retval     number of registers, None if data type is unknown
+    """
+
+    if "16" in data_type or "sunssf" in data_type:
+        return 1
+    elif "32" in data_type or "float" in data_type:
+        return 2
+    elif "64" in data_type:
+        return 4
+    return None
+
+
+_SPEC_CHARACTER = str.maketrans(
+    {"(": None, ")": None, " ": "_", "%": "per_", "-": "_", "/": "_"}
+)
+
+
+@lru_cache(maxsize=4096)
+def replace_spec_character(input: str) -> str:
+    """
+    @brief      Sanitize name/unit for server, result is cached
+    @param      input           name or unit
+    @retval     sanitized string
+    """
+
+    return input.translate(_SPEC_CHARACTER)
+
+
+class PointDescriptor:
+    """
+    Driver point resolved once at load time
+    """
+
+    __slots__ = (
+        "name",
+        "label",
+        "unit",
+        "data_type",
+        "byte_order",
+        "word_order",
+        "byte_little",
+        "word_little",
+        "address",
+        "count",
+        "kind",
+        "words",
+        "unimplement",
+        "scale_factor",
+        "constants",
+        "error_type",
+        "error_args",
+    )
+
+    def __init__(
+        self, name: str, points_featured: Dict[str, Any], json_file: Dict[str, Any]
+    ) -> None:
+        """
+        @brief      Resolve decoder, byte/word order, unimplemented value, scale factor,
+                    sanitized name and unit of point. Class and arguments of error of
+                    driver point are kept, new error is raised when point is decoded
+        @param      name                name of point
+        @param      points_featured     driver info of point
+        @param      json_file           driver file
+        @retval     None
+        """
+
+        self.name = name
+        self.label = replace_spec_character(name)
+        self.unit = replace_spec_character(str(points_featured.get("unit", "")))
+        self.data_type: str = points_featured.get("datatype", "")
+        self.byte_order: str = points_featured.get("byteOrder", "")
+        self.word_order: str = points_featured.get("wordOrder", "")
+        self.byte_little = self.byte_order == "Little_Endian"
+        self.word_little = self.word_order == "Little_Endian"
+        self.address: int = points_featured.get("registerAddr", 0)
+        self.count: int = points_featured.get("count", 0)
+        self.kind: Union[int, None] = None
+        self.words: Union[int, None] = None
+        self.unimplement: Any = None
+        self.scale_factor: Union[str, int] = 0
+        self.constants: Union[Dict[str, str], None] = None
+        # Descriptor is shared by every device and thread, error is not kept as instance
+        self.error_type: Union[Type[Exception], None] = None
+        self.error_args: Tuple[Any, ...] = ()
+
+        try:
+            data_type = points_featured["datatype"]
+            points_featured["byteOrder"]
+            points_featured["wordOrder"]
+
+            self.kind = decoder_kind(data_type)
+            self.words = register_words(data_type)
+            if self.kind is None:
+                raise UnknownDataType(name, data_type)
+
+            if self.kind == INTEGER or self.kind == FLOAT:
+                points_SF = points_featured.get("scaleFactor", 0)
+                if isinstance(points_SF, (str, int)):
+                    self.scale_factor = points_SF
+
+            if self.kind == ENUM or self.kind == BITFIELD:
+                self.constants = json_file["constants"][data_type][name]
+
+            self.unimplement = json_file["unimplemented"][data_type]
+        except Exception as error:
+            self.error_type = type(error)
+            self.error_args = error.args
+
+    def new_error(self) -> Exception:
+        """
+        @brief      Create error of driver point, each decode gets its own instance
+        @retval     error
+        """
+
+        return self.error_type(*self.error_args)
+
+
+def compile_points(json_file: Dict[str, Any]) -> Dict[str, Dict[str, PointDescriptor]]:
+    """
+    @brief      Resolve every driver point to descriptor
+    @param      json_file           driver file
+    @retval     descriptors of points for each register type
+    """
+
+    return {
+        name_type_register: {
+            name: PointDescriptor(name, points_featured, json_file)
+            for name, points_featured in register_points.items()
+        }
+        for name_type_register, register_points in json_file["points"].items()
+    }
+
+
+def freeze(value: Any) -> Any:
+    """
+    @brief      Get read-only view of parsed JSON, objects are MappingProxyType and
+                arrays are tuples
+    @param      value           parsed JSON
+    @retval     read-only value
+    """
+
+    if isinstance(value, dict):
+        return MappingProxyType({key: freeze(x) for key, x in value.items()})
+    elif isinstance(value, list):
+        return tuple(freeze(x) for x in value)
+    return value
+
+
+class CompiledDriver:
+    """
+    Driver file parsed and compiled once, shared by every device use it.
+    Driver file and descriptors are read-only, read plans and block layouts are
+    built once through get_read_plan and get_block_layouts.
+    """
+
+    def __init__(self, json_file: Dict[str, Any], mtime: int) -> None:
+        """
+        @brief      Compile driver points
+        @param      json_file           driver file
+        @param      mtime               modify time of driver file (ns)
+        @retval     None
+        """
+
+        self.json_file: Mapping[str, Any] = freeze(json_file)
+        self.mtime = mtime
+        self.offset: int = json_file["offset"]
+        self.point_descriptors: Mapping[
+            str, Mapping[str, PointDescriptor]
+        ] = MappingProxyType(
+            {
+                name_type_register: MappingProxyType(descriptors)
+                for name_type_register, descriptors in compile_points(
+                    json_file
+                ).items()
+            }
+        )
+        # Read plan and block layout of (register type, points), built on demand
+        self._read_plans: Dict[Tuple[str, Tuple[str, ...]], Any] = {}
+        self._block_layouts: Dict[Tuple[str, Tuple[str, ...]], Any] = {}
+        self._lock = threading.Lock()
+
+    def _get_cached(
+        self,
+        cache: Dict[Tuple[str, Tuple[str, ...]], Any],
+        key: Tuple[str, Tuple[str, ...]],
+        build: Callable[[], Any],
+    ) -> Any:
+        value = cache.get(key)
+        if value is None:
+            value = build()
+            # Devices of other threads may build same key, first one is kept
+            with self._lock:
+                value = cache.setdefault(key, value)
+        return value
+
+    def get_read_plan(
+        self, key: Tuple[str, Tuple[str, ...]], build: Callable[[], Any]
+    ) -> Any:
+        """
+        @brief      Get read plan shared by every device, build it in first call
+        @param      key                 (register type, points)
+        @param      build               function build read plan
+        @retval     Read plan
+        """
+
+        return self._get_cached(self._read_plans, key, build)
+
+    def get_block_layouts(
+        self, key: Tuple[str, Tuple[str, ...]], build: Callable[[], Any]
+    ) -> Any:
+        """
+        @brief      Get block layouts shared by every device, build them in first call
+        @param      key                 (register type, points of read plan)
+        @param      build               function build block layouts
+        @retval     Layout of every block
+        """
+
+        return self._get_cached(self._block_layouts, key, build)
+
+
+class DriverRegistry:
+    """
+    Process-wide cache of compiled driver, reload driver when file is modified
+    """
+
+    def __init__(self) -> None:
+        self.drivers: Dict[str, CompiledDriver] = {}
+        self.lock = threading.Lock()
+
+    def get(self, json_file_direct: str) -> CompiledDriver:
+        """
+        @brief      Get compiled driver, parse driver file in first call or when it is modified
+        @param      json_file_direct    driver file directory
+        @retval     Compiled driver
+        """
+
+        path = os.path.abspath(json_file_direct)
+        mtime = os.stat(path).st_mtime_ns
+
+        with self.lock:
+            driver = self.drivers.get(path)
+            if driver is None or driver.mtime != mtime:
+                with open(path, "r") as f:
+                    json_file = json.load(f)
+                driver = CompiledDriver(json_file, mtime)
+                self.drivers[path] = driver
+        return driver
+
+    def clear(self) -> None:
+        with self.lock:
+            self.drivers.clear()
+
+
+driver_registry = DriverRegistry()
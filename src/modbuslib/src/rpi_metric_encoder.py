@@ -0,0 +1,324 @@
+import operator
+import struct
+import time
+from functools import lru_cache
+from typing import *
+
+import rpi_natsio_schema_pb2
+
+from rpi_modbus import PointContainer, PointTable
+
+# Wire type of protobuf field
+WIRE_VARINT: int = 0
+WIRE_LENGTH_DELIMITED: int = 2
+WIRE_FIXED32: int = 5
+
+# Field number of value of Metric (natsio_schema.proto) by data type of driver,
+# with range of value
+METRIC_VALUE_FIELD: Dict[str, Tuple[int, int, int]] = {
+    "int16": (3, -(2**31), 2**31 - 1),
+    "int32": (3, -(2**31), 2**31 - 1),
+    "uint16": (4, 0, 2**32 - 1),
+    "uint32": (4, 0, 2**32 - 1),
+    "acc32": (4, 0, 2**32 - 1),
+    "int64": (5, -(2**63), 2**63 - 1),
+    "uint64": (6, 0, 2**64 - 1),
+    "acc64": (6, 0, 2**64 - 1),
+    "enum16": (8, 0, 2**32 - 1),
+    "enum32": (9, 0, 2**32 - 1),
+    "bitfield16": (10, 0, 2**32 - 1),
+    "bitfield32": (11, 0, 2**32 - 1),
+}
+FLOAT_VALUE_FIELD: int = 7
+STR_VALUE_FIELD: int = 12
+FLOAT_STRUCT = struct.Struct("<f")
+
+
+def encode_varint(value: int) -> bytes:
+    """
+    @brief      Encode protobuf varint, negative value is 64 bits two's complement
+    @param      value           integer
+    @retval     bytes
+    """
+
+    if value < 0:
+        value += 1 << 64
+    if value < 0x80:
+        return bytes((value,))
+    return_data = bytearray()
+    while value >= 0x80:
+        return_data.append((value & 0x7F) | 0x80)
+        value >>= 7
+    return_data.append(value)
+    return bytes(return_data)
+
+
+def encode_tag(field_number: int, wire_type: int) -> bytes:
+    return encode_varint((field_number << 3) | wire_type)
+
+
+def encode_length_delimited(field_number: int, data: bytes) -> bytes:
+    return (
+        encode_tag(field_number, WIRE_LENGTH_DELIMITED)
+        + encode_varint(len(data))
+        + data
+    )
+
+
+def encode_float(value: float) -> bytes:
+    """
+    @brief      Encode float (32 bits) same as protobuf, value out of range is infinity
+    @param      value           float
+    @retval     bytes
+    """
+
+    try:
+        return FLOAT_STRUCT.pack(value)
+    except OverflowError:
+        return FLOAT_STRUCT.pack(float("inf") if value > 0 else float("-inf"))
+
+
+METRIC_GROUP_TAG: bytes = encode_tag(2, WIRE_LENGTH_DELIMITED)
+METRIC_TAG: bytes = encode_tag(3, WIRE_LENGTH_DELIMITED)
+TIMESTAMP_TAG: bytes = encode_tag(1, WIRE_VARINT)
+FLOAT_VALUE_TAG: bytes = encode_tag(FLOAT_VALUE_FIELD, WIRE_FIXED32)
+
+
+@lru_cache(maxsize=64)
+def encode_site_info(tenant: str, location: str) -> bytes:
+    """
+    @brief      Get serialized site info field of MetricSubmission
+    @param      tenant          name of owner
+    @param      location        location of site
+    @retval     bytes
+    """
+
+    site_info = rpi_natsio_schema_pb2.SiteInfo(tenant=tenant, location=location)
+    return encode_length_delimited(1, site_info.SerializeToString())
+
+
+def encode_metric_submission(
+    tenant: str, location: str, metric_groups: Iterable[bytes]
+) -> bytes:
+    """
+    @brief      Serialize MetricSubmission from serialized metric groups,
+                same bytes as MetricSubmission.SerializeToString()
+    @param      tenant          name of owner
+    @param      location        location of site
+    @param      metric_groups   metric groups from MetricGroupEncoder.encode
+    @retval     bytes
+    """
+
+    return_data = [encode_site_info(tenant, location)]
+    for metric_group in metric_groups:
+        return_data.append(METRIC_GROUP_TAG)
+        return_data.append(encode_varint(len(metric_group)))
+        return_data.append(metric_group)
+    return b"".join(return_data)
+
+
+class MetricGroupEncoder:
+    """
+    Encoding plan of one device: device info is serialized once, name/unit and
+    value field of each point are serialized in first poll. Each poll only encodes
+    timestamp and values. Result is same as CompressData.add_new_metrics_group and
+    CompressData.add_metric_data.
+    Report by exception (snapshot_interval > 1): only points which are changed
+    (float: over deadband) since last sent value are encoded, every point is
+    encoded each snapshot_interval polls.
+    """
+
+    def __init__(
+        self,
+        model: str,
+        manufacturer: str,
+        serial_number: str,
+        driver_version: str,
+        device_id: str,
+        snapshot_interval: int = 1,
+        deadband: float = 0.0,
+    ) -> None:
+        """
+        @param      model                   device model
+        @param      manufacturer            device manufacturer
+        @param      serial_number           device serial number
+        @param      driver_version          device version
+        @param      device_id               device ID
+        @param      snapshot_interval       every point is sent each N polls,
+                                            1 is every point in every poll
+        @param      deadband                change of float point (part of last sent
+                                            value) which is sent
+        """
+
+        device_info = rpi_natsio_schema_pb2.DeviceInfo(
+            model=model,
+            manufacturer=manufacturer,
+            serial_number=serial_number,
+            driver_version=driver_version,
+            device_id=str(device_id),
+        )
+        self.device_info = encode_length_delimited(2, device_info.SerializeToString())
+        # (name, data type, unit) -> (name and unit, value tag, min, max, header of
+        # float metric)
+        self.points: Dict[
+            Tuple[str, str, str], Tuple[bytes, Union[bytes, None], int, int, bytes]
+        ] = {}
+        self.snapshot_interval = max(1, snapshot_interval)
+        self.deadband = deadband
+        self.cycle = 0
+        # Last sent value of each point (report by exception)
+        self.last_sent: Dict[Tuple[str, str, str], Any] = {}
+
+    def is_changed(self, key: Tuple[str, str, str], result: Any) -> bool:
+        """
+        @brief      Check value of point must be sent (report by exception)
+        @param      key             (name, data type, unit) of point
+        @param      result          value of point
+        @retval     True if value is changed since last sent value
+        """
+
+        if key not in self.last_sent:
+            return True
+        last_result = self.last_sent[key]
+        if (
+            type(result) is float
+            and type(last_result) is float
+            and self.deadband > 0
+            and result == result
+        ):
+            return abs(result - last_result) > self.deadband * abs(last_result)
+        return type(result) is not type(last_result) or result != last_result
+
+    def _get_point(
+        self, name: str, data_type_json: str, unit: str
+    ) -> Tuple[bytes, Union[bytes, None], int, int, bytes]:
+        key = (name, data_type_json, unit)
+        point = self.points.get(key)
+        if point is None:
+            prefix = b""
+            if name != "":
+                prefix += encode_length_delimited(1, name.encode())
+            if unit != "":
+                prefix += encode_length_delimited(2, unit.encode())
+            # Tag, length, name and unit, value tag of metric with float value
+            float_header = (
+                METRIC_TAG
+                + encode_varint(len(prefix) + len(FLOAT_VALUE_TAG) + FLOAT_STRUCT.size)
+                + prefix
+                + FLOAT_VALUE_TAG
+            )
+            field = METRIC_VALUE_FIELD.get(data_type_json)
+            if field is None:
+                point = (prefix, None, 0, 0, float_header)
+            else:
+                value_tag = encode_tag(field[0], WIRE_VARINT)
+                point = (prefix, value_tag, field[1], field[2], float_header)
+            self.points[key] = point
+        return point
+
+    def encode(
+        self,
+        block_data: Tuple[
+            Union[PointTable, Dict[str, PointContainer]], Dict[str, Exception]
+        ],
+        timestamp: int = None,
+    ) -> bytes:
+        """
+        @brief      Serialize metric group of one poll
+        @param      block_data          block data ready for push to server
+        @param      timestamp           time (ms), None is now
+        @retval     MetricGroup bytes
+        """
+
+        return bytes(self._encode(block_data, timestamp))
+
+    def encode_into(
+        self,
+        buffer: bytearray,
+        block_data: Tuple[
+            Union[PointTable, Dict[str, PointContainer]], Dict[str, Exception]
+        ],
+        timestamp: int = None,
+    ) -> int:
+        """
+        @brief      Serialize metric group of one poll as metric_groups field of
+                    MetricSubmission at end of buffer, without bytes object of
+                    metric group. Buffer is not changed if value of point is invalid.
+        @param      buffer              serialized MetricSubmission (site info first)
+        @param      block_data          block data ready for push to server
+        @param      timestamp           time (ms), None is now
+        @retval     number of bytes written
+        """
+
+        metric_group = self._encode(block_data, timestamp)
+        size = len(buffer)
+        buffer += METRIC_GROUP_TAG
+        buffer += encode_varint(len(metric_group))
+        buffer += metric_group
+        return len(buffer) - size
+
+    def _encode(
+        self,
+        block_data: Tuple[
+            Union[PointTable, Dict[str, PointContainer]], Dict[str, Exception]
+        ],
+        timestamp: int = None,
+    ) -> bytearray:
+        """
+        @brief      Serialize metric group of one poll, parts are appended to one
+                    bytearray
+        @param      block_data          block data ready for push to server
+        @param      timestamp           time (ms), None is now
+        @retval     MetricGroup
+        """
+
+        if timestamp is None:
+            timestamp = round(time.time() * 1000)
+        point_table = block_data[0]
+        if not isinstance(point_table, PointTable):
+            point_table = PointTable(point_table)
+
+        return_data = bytearray()
+        if timestamp != 0:
+            return_data += TIMESTAMP_TAG
+            return_data += encode_varint(timestamp)
+        return_data += self.device_info
+
+        report_by_exception = self.snapshot_interval > 1
+        snapshot = self.cycle % self.snapshot_interval == 0
+        # Applied when every point is encoded, group with invalid point is not sent
+        sent: Dict[Tuple[str, str, str], Any] = {}
+
+        for name, result, data_type_json, unit in point_table.rows():
+            if report_by_exception:
+                key = (name, data_type_json, unit)
+                if not snapshot and not self.is_changed(key, result):
+                    continue
+                sent[key] = result
+            prefix, value_tag, minimum, maximum, float_header = self._get_point(
+                name, data_type_json, unit
+            )
+            if type(result) is float:
+                return_data += float_header
+                return_data += encode_float(result)
+                continue
+            elif type(result) is str:
+                metric = prefix + encode_length_delimited(
+                    STR_VALUE_FIELD, result.encode()
+                )
+            elif value_tag is not None:
+                value = operator.index(result)
+                if not minimum <= value <= maximum:
+                    raise ValueError(
+                        "Value out of range of {0}: {1}".format(data_type_json, value)
+                    )
+                metric = prefix + value_tag + encode_varint(value)
+            else:
+                metric = prefix
+            return_data += METRIC_TAG
+            return_data += encode_varint(len(metric))
+            return_data += metric
+
+        self.cycle += 1
+        self.last_sent.update(sent)
+        return return_data
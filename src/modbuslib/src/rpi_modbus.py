@@ -1,4 +1,4 @@
-import json, sys
+import sys
 import re
 from enum import Enum
 import struct
@@ -16,6 +16,15 @@ from rpi_modbuslib_exceptions import (
     MissingInput,
 )
 from rpi_mapping_alt import MappingAlt
+from rpi_read_plan import ReadPlan, MAX_BLOCK_LENGTH, MAX_GAP
+from rpi_batch_decoder import BatchDecoder, BlockLayout
+from rpi_modbus_async import AsyncTcpMaster
+from rpi_driver import (
+    PointDescriptor,
+    CompiledDriver,
+    driver_registry,
+    replace_spec_character,
+)
 
 from rpi_verbose import verbose
 
@@ -42,21 +51,100 @@ T = TypeVar("T")  # Generic input type for PointContainer
 
 
 class PointContainer(tuple, Generic[T]):
-    value: T
-    data_type: str
-    unit: str
+    __slots__ = ()
 
     def __new__(cls, value: T, data_type: str, unit: str):
-        self = tuple.__new__(cls, (value, data_type, unit))
-        self.value = value
-        self.data_type = data_type
-        self.unit = unit
-        return self
+        return tuple.__new__(cls, (value, data_type, unit))
+
+    @property
+    def value(self) -> T:
+        return self[0]
+
+    @property
+    def data_type(self) -> str:
+        return self[1]
+
+    @property
+    def unit(self) -> str:
+        return self[2]
 
     def __repr__(self) -> str:
         return f"Containers(value={self.value}, data_type={self.data_type}, unit={self.unit})"
 
 
+class PointTable(Mapping[str, PointContainer[T]]):
+    """
+    Columnar result of one device read, parallel lists of name, value, data type
+    and unit. Data type and unit are shared from compiled driver. Mapping view
+    give PointContainer of point for existing callers.
+    """
+
+    __slots__ = ("names", "values", "data_types", "units", "index")
+
+    def __init__(self, data: Mapping[str, PointContainer[T]] = None) -> None:
+        self.names: List[str] = []
+        self.values: List[T] = []
+        self.data_types: List[str] = []
+        self.units: List[str] = []
+        self.index: Dict[str, int] = {}
+        if data is not None:
+            self.update(data)
+
+    def append(self, name: str, value: T, data_type: str, unit: str) -> None:
+        """
+        @brief      Add value of point, replace old value if point is already in table
+        @param      name            sanitized name of point
+        @param      value           value of point
+        @param      data_type       data type of point
+        @param      unit            sanitized unit of point
+        @retval     None
+        """
+
+        x = self.index.get(name)
+        if x is None:
+            self.index[name] = len(self.names)
+            self.names.append(name)
+            self.values.append(value)
+            self.data_types.append(data_type)
+            self.units.append(unit)
+        else:
+            self.values[x] = value
+            self.data_types[x] = data_type
+            self.units[x] = unit
+
+    def update(self, data: Mapping[str, PointContainer[T]]) -> None:
+        if isinstance(data, PointTable):
+            for row in data.rows():
+                self.append(*row)
+        else:
+            for name, container in data.items():
+                self.append(name, *container)
+
+    def rows(self) -> Iterator[Tuple[str, T, str, str]]:
+        """
+        @brief      Iterate (name, value, data type, unit) without create PointContainer
+        @retval     Rows of table
+        """
+
+        return zip(self.names, self.values, self.data_types, self.units)
+
+    def __getitem__(self, name: str) -> PointContainer[T]:
+        x = self.index[name]
+        return PointContainer(self.values[x], self.data_types[x], self.units[x])
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.names)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __contains__(self, name: object) -> bool:
+        return name in self.index
+
+    def __repr__(self) -> str:
+        return repr(dict(self.items()))
+
+
 class ModbusDecoder(Generic[S, I, F, SF, E, B]):
 
     """
@@ -83,6 +171,7 @@ class ModbusDecoder(Generic[S, I, F, SF, E, B]):
         bitfield_decoder_func_pointer: Callable[
             [str, Tuple[int, ...], str, str, str, Dict[str, str], int], B
         ],
+        batch_decoder: BatchDecoder = None,
     ) -> None:
         """
         @brief      Define decoder function with generic
@@ -92,6 +181,8 @@ class ModbusDecoder(Generic[S, I, F, SF, E, B]):
         @param      sf_decoder_func_pointer                 scale factor decoder function
         @param      enum_decoder_func_pointer               enum decoder function
         @param      bitfield_decoder_func_pointer           bitfield decoder function
+        @param      batch_decoder                           vectorized decoder give same
+                                                            result, None if not supported
         @retval     None
         """
         self.string_decoder_func = string_decoder_func_pointer
@@ -100,9 +191,112 @@ class ModbusDecoder(Generic[S, I, F, SF, E, B]):
         self.sf_decoder_func = sf_decoder_func_pointer
         self.enum_decoder_func = enum_decoder_func_pointer
         self.bitfield_decoder_func = bitfield_decoder_func_pointer
+        self.batch_decoder = batch_decoder
+
+        # Index by kind of decoder of PointDescriptor
+        self.decoder_table: Tuple[
+            Callable[[PointDescriptor, Tuple[int, ...], Union[SF, int]], Any], ...
+        ] = (
+            self.decode_enum,
+            self.decode_bitfield,
+            self.decode_string,
+            self.decode_integer,
+            self.decode_float,
+            self.decode_scale_factor,
+        )
 
         super().__init__()
 
+    def decode(
+        self,
+        descriptor: PointDescriptor,
+        raw_value: Tuple[int, ...],
+        scale_factor: Union[SF, int] = 0,
+    ) -> Union[S, I, F, SF, E, B]:
+        """
+        @brief      Decode point with decoder of its descriptor
+        @param      descriptor          compiled driver point
+        @param      raw_value           raw values of point
+        @param      scale_factor        scale factor for convert to real value
+        @retval     Value of point
+        """
+
+        if descriptor.error_type is not None:
+            raise descriptor.new_error()
+        return self.decoder_table[descriptor.kind](descriptor, raw_value, scale_factor)
+
+    def decode_enum(
+        self, d: PointDescriptor, raw_value: Tuple[int, ...], scale_factor: Any
+    ) -> E:
+        return self.enum_decoder_func(
+            d.name,
+            raw_value,
+            d.data_type,
+            d.byte_order,
+            d.word_order,
+            d.constants,
+            d.unimplement,
+        )
+
+    def decode_bitfield(
+        self, d: PointDescriptor, raw_value: Tuple[int, ...], scale_factor: Any
+    ) -> B:
+        return self.bitfield_decoder_func(
+            d.name,
+            raw_value,
+            d.data_type,
+            d.byte_order,
+            d.word_order,
+            d.constants,
+            d.unimplement,
+        )
+
+    def decode_string(
+        self, d: PointDescriptor, raw_value: Tuple[int, ...], scale_factor: Any
+    ) -> S:
+        return self.string_decoder_func(
+            d.name, raw_value, d.data_type, d.byte_order, d.word_order, d.unimplement
+        )
+
+    def decode_integer(
+        self,
+        d: PointDescriptor,
+        raw_value: Tuple[int, ...],
+        scale_factor: Union[SF, int],
+    ) -> I:
+        return self.int_decoder_func(
+            d.name,
+            raw_value,
+            d.data_type,
+            d.byte_order,
+            d.word_order,
+            scale_factor,
+            d.unimplement,
+        )
+
+    def decode_float(
+        self,
+        d: PointDescriptor,
+        raw_value: Tuple[int, ...],
+        scale_factor: Union[SF, int],
+    ) -> F:
+        return self.float_decoder_func(
+            d.name,
+            raw_value,
+            d.data_type,
+            d.byte_order,
+            d.word_order,
+            scale_factor,
+            d.unimplement,
+        )
+
+    def decode_scale_factor(
+        self, d: PointDescriptor, raw_value: Tuple[int, ...], scale_factor: Any
+    ) -> SF:
+        return self.sf_decoder_func(
+            d.name, raw_value, d.data_type, d.byte_order, d.word_order, d.unimplement
+        )
+
     def string_decoder(
         self,
         point: str,
@@ -312,6 +506,7 @@ class DatabaseDecoder(ModbusDecoder[str, int, float, int, int, int]):
             DefaultDecoder.scale_factor_decoder,
             DatabaseDecoder.enum_decoder,
             DatabaseDecoder.bitfield_decoder,
+            BatchDecoder(human_readable=False),
         )
 
     @staticmethod
@@ -398,6 +593,7 @@ class DefaultDecoder(ModbusDecoder[str, int, float, int, str, List[str]]):
             DefaultDecoder.scale_factor_decoder,
             DefaultDecoder.enum_decoder,
             DefaultDecoder.bitfield_decoder,
+            BatchDecoder(human_readable=True),
         )
 
     @staticmethod
@@ -684,7 +880,7 @@ class ModbusDevice(Generic[S, I, F, SF, E, B]):
 
     def __init__(
         self,
-        connection: Union[mbtcp.TcpMaster, mbrtu.RtuMaster],
+        connection: Union[mbtcp.TcpMaster, mbrtu.RtuMaster, AsyncTcpMaster],
         client_ID: int,
         decoder: ModbusDecoder[S, I, F, SF, E, B],
         json_file_direct: str,
@@ -697,23 +893,29 @@ class ModbusDevice(Generic[S, I, F, SF, E, B]):
         self.decoder = decoder
         self.scale_factor: Dict[str, SF] = {}
 
-        with open(json_file_direct, "r") as f:
-            self.json_file = json.load(f)
-        f.close()
-        self.offset = self.json_file["offset"]
+        # Driver is shared with every device use same driver file (read-only)
+        self.driver: CompiledDriver = driver_registry.get(json_file_direct)
+        self.json_file = self.driver.json_file
+        self.offset = self.driver.offset
+        self.point_descriptors = self.driver.point_descriptors
 
     """
     Wrap data to valid block data
     """
 
     def replace_spec_character(self, input: str) -> str:
-        input = input.replace("(", "")
-        input = input.replace(")", "")
-        input = input.replace(" ", "_")
-        input = input.replace("%", "per_")
-        input = input.replace("-", "_")
-        input = input.replace("/", "_")
-        return input
+        return replace_spec_character(input)
+
+    def get_point_label(self, point: str, name_type_register: str) -> Tuple[str, str]:
+        """
+        @brief      Get sanitized name and unit of point, computed when driver is loaded
+        @param      point               name of point
+        @param      name_type_register  where is point locate
+        @retval     (sanitized name, sanitized unit)
+        """
+
+        descriptor = self.point_descriptors[name_type_register][point]
+        return (descriptor.label, descriptor.unit)
 
     def wrap_return_data(
         self, point: str, result: T, name_type_register: str
@@ -725,21 +927,14 @@ class ModbusDevice(Generic[S, I, F, SF, E, B]):
         @retval     Return value in specific type
         """
 
-        data_type_json = self.json_file["points"][name_type_register][point]["datatype"]
-
-        try:
-            unit = self.json_file["points"][name_type_register][point]["unit"]
-        except:
-            unit = ""
-
-        # Replace everything in here
+        descriptor = self.point_descriptors[name_type_register][point]
 
         # place data in right place
         return_data_value: PointContainer[T] = PointContainer(
-            result, data_type_json, self.replace_spec_character(unit)
+            result, descriptor.data_type, descriptor.unit
         )
 
-        return_data = {self.replace_spec_character(point): return_data_value}
+        return_data = {descriptor.label: return_data_value}
 
         return return_data
 
@@ -752,9 +947,7 @@ class ModbusDevice(Generic[S, I, F, SF, E, B]):
         point: List[str],
         raw_values: Dict[str, Tuple[int, ...]],
         name_type_register: str,
-    ) -> Tuple[
-        Dict[str, PointContainer[Union[S, I, F, SF, E, B]]], Dict[str, Exception]
-    ]:
+    ) -> Tuple[PointTable[Union[S, I, F, SF, E, B]], Dict[str, Exception]]:
         """
         @brief      Process multi point data to human readable data
         @param      point               name of point
@@ -763,7 +956,7 @@ class ModbusDevice(Generic[S, I, F, SF, E, B]):
         """
 
         scale_factor: Dict[str, SF] = {}
-        return_data = {}
+        return_data: PointTable[Union[S, I, F, SF, E, B]] = PointTable()
         return_error = {}
 
         SF_matches = [x for x in raw_values.keys() if "SF" in x]
@@ -772,23 +965,10 @@ class ModbusDevice(Generic[S, I, F, SF, E, B]):
         if len(SF_matches) > 0:
             for scale_factor_name in SF_matches:
                 try:
-                    scale_factor_int = self.decoder.scale_factor_decoder(
+                    scale_factor_int = self.decode_scale_factor(
                         scale_factor_name,
                         raw_values[scale_factor_name],
-                        self.json_file["points"][name_type_register][scale_factor_name][
-                            "datatype"
-                        ],
-                        self.json_file["points"][name_type_register][scale_factor_name][
-                            "byteOrder"
-                        ],
-                        self.json_file["points"][name_type_register][scale_factor_name][
-                            "wordOrder"
-                        ],
-                        self.json_file["unimplemented"][
-                            self.json_file["points"][name_type_register][
-                                scale_factor_name
-                            ]["datatype"]
-                        ],
+                        name_type_register,
                     )
                     scale_factor = {scale_factor_name: scale_factor_int}
                     self.scale_factor.update(scale_factor)
@@ -796,11 +976,114 @@ class ModbusDevice(Generic[S, I, F, SF, E, B]):
                     self.scale_factor.update(scale_factor)
 
         # process data
+        descriptors = self.point_descriptors[name_type_register]
         for name_register in point:
             transmit_data: Tuple[int, ...] = raw_values[name_register]
             try:
-                return_data.update(
-                    self.process_data(name_register, transmit_data, name_type_register)
+                descriptor = descriptors[name_register]
+                return_data.append(
+                    descriptor.label,
+                    self.decode_point(descriptor, transmit_data),
+                    descriptor.data_type,
+                    descriptor.unit,
+                )
+            except Exception as error:
+                return_error.update({name_register: error})
+
+        return (return_data, return_error)
+
+    def decode_scale_factor(
+        self, point: str, raw_values: Tuple[int, ...], name_type_register: str
+    ) -> SF:
+        """
+        @brief      Process scale factor register data to scale factor value
+        @param      point           name of point
+        @param      raw_values      raw values of point
+        @retval     Scale factor value
+        """
+
+        descriptor = self.point_descriptors[name_type_register][point]
+        if descriptor.error_type is not None:
+            raise descriptor.new_error()
+        return self.decoder.decode_scale_factor(descriptor, raw_values, 0)
+
+    def process_block_data(
+        self,
+        point: Tuple[str, ...],
+        read_plan: ReadPlan,
+        raw_blocks: List[Sequence[int]],
+        name_type_register: str,
+    ) -> Tuple[PointTable[Union[S, I, F, SF, E, B]], Dict[str, Exception]]:
+        """
+        @brief      Process whole register blocks to human readable data with batch decoder
+        @param      point               name of point
+        @param      read_plan           read plan of points
+        @param      raw_blocks          raw values of every block in read plan
+        @retval     Multi human readable value
+        """
+
+        batch_decoder: BatchDecoder = self.decoder.batch_decoder
+        block_layouts = self.get_block_layouts(read_plan, name_type_register)
+        blocks = [
+            batch_decoder.to_array(raw_block, layout)
+            for raw_block, layout in zip(raw_blocks, block_layouts)
+        ]
+        values: Dict[str, Any] = {}
+        errors: Dict[str, Exception] = {}
+        raw_values: Dict[str, Tuple[int, ...]] = {}
+        descriptors = self.point_descriptors[name_type_register]
+        return_data: PointTable[Union[S, I, F, SF, E, B]] = PointTable()
+        return_error = {}
+
+        # get scale factor value
+        for raw_block, block, layout in zip(raw_blocks, blocks, block_layouts):
+            scale_factor, _ = batch_decoder.decode_scale_factors(
+                block, len(raw_block), layout
+            )
+            self.scale_factor.update(scale_factor)
+            for scale_factor_name in layout.scale_factor_fallback:
+                offset, reg_len = layout.offsets[scale_factor_name]
+                try:
+                    self.scale_factor[scale_factor_name] = self.decode_scale_factor(
+                        scale_factor_name,
+                        tuple(raw_block[offset : offset + reg_len]),
+                        name_type_register,
+                    )
+                except Exception as error:
+                    pass
+
+        # process data
+        for raw_block, block, layout in zip(raw_blocks, blocks, block_layouts):
+            block_values, block_errors = batch_decoder.decode_block(
+                block, len(raw_block), layout, self.scale_factor
+            )
+            values.update(block_values)
+            errors.update(block_errors)
+            for name_register in layout.fallback:
+                offset, reg_len = layout.offsets[name_register]
+                if offset + reg_len <= len(raw_block):
+                    raw_values[name_register] = tuple(
+                        raw_block[offset : offset + reg_len]
+                    )
+
+        for name_register in point:
+            if (
+                name_register not in values
+                and name_register not in errors
+                and name_register not in raw_values
+            ):
+                raise KeyError(name_register)
+            try:
+                descriptor = descriptors[name_register]
+                if name_register in values:
+                    value = values[name_register]
+                elif name_register in errors:
+                    return_error.update({name_register: errors[name_register]})
+                    continue
+                else:
+                    value = self.decode_point(descriptor, raw_values[name_register])
+                return_data.append(
+                    descriptor.label, value, descriptor.data_type, descriptor.unit
                 )
             except Exception as error:
                 return_error.update({name_register: error})
@@ -817,93 +1100,32 @@ class ModbusDevice(Generic[S, I, F, SF, E, B]):
         @retval     Single human readable value
         """
 
-        points_featured = self.json_file["points"][name_type_register][point]
-        data_type = points_featured["datatype"]
-        byteOrder = points_featured["byteOrder"]
-        wordOrder = points_featured["wordOrder"]
-        scale_factor: Union[SF, int] = 0
-
-        # Check that pointer need scalefactor, if no it will skip
-        try:
-            if "int" in data_type or "float" in data_type or "acc" in data_type:
-                points_SF = points_featured["scaleFactor"]
-                if isinstance(points_SF, str):
-                    scale_factor = self.scale_factor[points_SF]
-                elif isinstance(points_SF, int):
-                    scale_factor = points_SF
-        except:
-            scale_factor = 0
-
-        if "enum" in data_type:  # if data is enum
-            dict = self.json_file["constants"][data_type][point]
-            data_enum = self.decoder.enum_decoder(
-                point,
-                raw_values,
-                data_type,
-                byteOrder,
-                wordOrder,
-                dict,
-                self.json_file["unimplemented"][data_type],
-            )
-            return self.wrap_return_data(point, data_enum, name_type_register)
-        elif "bitfield" in data_type:  # if data is bitfield
-            dict = self.json_file["constants"][data_type][point]
-            data_bitfield = self.decoder.bitfield_decoder(
-                point,
-                raw_values,
-                data_type,
-                byteOrder,
-                wordOrder,
-                dict,
-                self.json_file["unimplemented"][data_type],
-            )
-            return self.wrap_return_data(point, data_bitfield, name_type_register)
-        elif data_type == "string" or data_type == "UTF-8":  # if data is string
-            data_string = self.decoder.string_decoder(
-                point,
-                raw_values,
-                data_type,
-                byteOrder,
-                wordOrder,
-                self.json_file["unimplemented"][data_type],
-            )
-            return self.wrap_return_data(point, data_string, name_type_register)
-        elif (
-            "int" in data_type or "uint" in data_type or "acc" in data_type
-        ):  # if data is int16/uint16/acc16/int32/uint32/acc32/int64/acc64
-            data_int = self.decoder.integer_decoder(
-                point,
-                raw_values,
-                data_type,
-                byteOrder,
-                wordOrder,
-                scale_factor,
-                self.json_file["unimplemented"][data_type],
-            )
-            return self.wrap_return_data(point, data_int, name_type_register)
-        elif data_type == "float":
-            data_float = self.decoder.float_decoder(
-                point,
-                raw_values,
-                data_type,
-                byteOrder,
-                wordOrder,
-                scale_factor,
-                self.json_file["unimplemented"][data_type],
-            )
-            return self.wrap_return_data(point, data_float, name_type_register)
-        elif data_type == "sunssf":
-            data_ssf = self.decoder.scale_factor_decoder(
-                point,
-                raw_values,
-                data_type,
-                byteOrder,
-                wordOrder,
-                self.json_file["unimplemented"][data_type],
+        descriptor = self.point_descriptors[name_type_register][point]
+
+        return {
+            descriptor.label: PointContainer(
+                self.decode_point(descriptor, raw_values),
+                descriptor.data_type,
+                descriptor.unit,
             )
-            return self.wrap_return_data(point, data_ssf, name_type_register)
-        else:
-            raise UnknownDataType(point, data_type)
+        }
+
+    def decode_point(
+        self, descriptor: PointDescriptor, raw_values: Tuple[int, ...]
+    ) -> Union[S, I, F, SF, E, B]:
+        """
+        @brief      Decode raw data of point with its compiled descriptor
+        @param      descriptor      compiled driver point
+        @param      raw_values      raw values of point
+        @retval     Value of point
+        """
+
+        # Scale factor point is not read or not valid, use 0
+        scale_factor: Union[SF, int] = descriptor.scale_factor
+        if isinstance(scale_factor, str):
+            scale_factor = self.scale_factor.get(scale_factor, 0)
+
+        return self.decoder.decode(descriptor, raw_values, scale_factor)
 
     """
     Utility
@@ -916,6 +1138,46 @@ class ModbusDevice(Generic[S, I, F, SF, E, B]):
     Read value from device fuction
     """
 
+    def get_read_plan(
+        self, points_input: Tuple[str, ...], name_type_register: str
+    ) -> ReadPlan:
+        """
+        @brief      Get compiled read plan, build it in first call
+        @param      points_input        multi name of points
+        @param      name_type_register  where is points locate
+        @retval     Read plan of points
+        """
+
+        return self.driver.get_read_plan(
+            (name_type_register, tuple(points_input)),
+            lambda: ReadPlan(
+                self.json_file["points"][name_type_register],
+                tuple(points_input),
+                self.json_file.get("max_registers_per_request", MAX_BLOCK_LENGTH),
+                self.json_file.get("max_register_gap", MAX_GAP),
+            ),
+        )
+
+    def get_block_layouts(
+        self, read_plan: ReadPlan, name_type_register: str
+    ) -> List[BlockLayout]:
+        """
+        @brief      Get compiled layout of every block in read plan, build it in first call
+        @param      read_plan           read plan of points
+        @param      name_type_register  where is points locate
+        @retval     Layout of every block
+        """
+
+        return self.driver.get_block_layouts(
+            (name_type_register, read_plan.points),
+            lambda: [
+                BlockLayout(
+                    self.point_descriptors[name_type_register], length, block_points
+                )
+                for _, length, block_points in read_plan.blocks
+            ],
+        )
+
     def read_raw_values(
         self, points_input: Tuple[str, ...], type_function: mbdefines
     ) -> Dict[str, Tuple[int, ...]]:
@@ -926,112 +1188,14 @@ class ModbusDevice(Generic[S, I, F, SF, E, B]):
         @retval     Multi name of points and multi raw value of points
         """
 
-        length_data_preprocess = []
-        start_point_preprocess = []
-        result: Tuple[int, ...] = ()
-        register_name_list = []
-        return_data: Dict[str, Tuple[int, ...]] = {}
-
-        counter = 0
-        cache = 0
-        start_register = 0
-
-        # Make points immutable list
-        points: List[str] = list(points_input)
-
         name_type_register = self.get_name_function(type_function)
+        read_plan = self.get_read_plan(points_input, name_type_register)
 
-        for point_name in points_input:
-            if "SF" in point_name:
-                continue
-            try:
-                points_SF = self.json_file["points"][name_type_register][point_name][
-                    "scaleFactor"
-                ]
-                if isinstance(points_SF, str):
-                    if not points_SF in points:
-                        points.append(points_SF)
-                elif isinstance(points_SF, int):
-                    pass
-            except Exception as e:
-                # verbose("MODBUS - " + self.device_SN, str(e), "ERROR")
-                pass
-
-        # Divide multi register to multi block of 120 register or less
-        for point_name in (self.json_file["points"][name_type_register]).items():
-            if point_name[0] in points:
-                if counter == 0:
-                    start_register = self.json_file["points"][name_type_register][
-                        point_name[0]
-                    ]["registerAddr"]
-                    start_register_cache = start_register
-                    counter = 1
-                else:
-                    counter += 1
-
-                if counter > 0:
-                    register_addr = self.json_file["points"][name_type_register][
-                        point_name[0]
-                    ]["registerAddr"]
-                    reg_len = self.json_file["points"][name_type_register][
-                        point_name[0]
-                    ]["count"]
-                    delta_length = register_addr - start_register_cache + reg_len
-                    if counter == len(points) and delta_length <= 120:
-                        length_data_preprocess.append(delta_length)
-                        start_point_preprocess.append(start_register_cache)
-                        register_name_list.append(point_name[0])
-                        break
-                    elif counter == len(points) and delta_length > 120:
-                        length_data_preprocess.append(cache)
-                        start_point_preprocess.append(start_register_cache)
-                        delta_length += start_register_cache
-                        delta_length -= register_addr
-                        length_data_preprocess.append(delta_length)
-                        start_point_preprocess.append(register_addr)
-                        register_name_list.append(point_name[0])
-                        break
-                    elif delta_length > 120:
-                        length_data_preprocess.append(cache)
-                        start_point_preprocess.append(start_register_cache)
-                        delta_length += start_register_cache
-                        start_register_cache = register_addr
-                        delta_length -= start_register_cache
-                        register_name_list.append(point_name[0])
-                        cache = delta_length
-                    else:
-                        cache = delta_length
-                        register_name_list.append(point_name[0])
-
-        # Get raw data from 120-registers block
-        for x in range(len(start_point_preprocess)):
-            process_value: Tuple[int, ...] = ()
-            result = self.read_raw_value(
-                start_point_preprocess[x], type_function, length_data_preprocess[x]
+        return read_plan.execute(
+            lambda start_register, length: self.read_raw_value(
+                start_register, type_function, length
             )
-
-            for point_name in register_name_list:
-                try:
-                    reg_address = self.json_file["points"][name_type_register][
-                        point_name
-                    ]["registerAddr"]
-                    reg_len = self.json_file["points"][name_type_register][point_name][
-                        "count"
-                    ]
-                    mapping_reg = reg_address - start_point_preprocess[x]
-                    process_value = tuple(
-                        list(result)[mapping_reg : mapping_reg + reg_len]
-                    )
-                    if mapping_reg + reg_len > len(result):
-                        raise
-
-                    return_data.update({point_name: process_value})
-                except:
-                    reg_index = register_name_list.index(point_name)
-                    del register_name_list[0:reg_index]
-                    break
-
-        return return_data
+        )
 
     def read_raw_value(
         self, register: Union[str, int], type_function: mbdefines, length: int = 0
@@ -1065,9 +1229,7 @@ class ModbusDevice(Generic[S, I, F, SF, E, B]):
 
     def read_values(
         self, registers: List[str], type_function: mbdefines
-    ) -> Tuple[
-        Dict[str, PointContainer[Union[S, I, F, SF, E, B]]], Dict[str, Exception]
-    ]:
+    ) -> Tuple[PointTable[Union[S, I, F, SF, E, B]], Dict[str, Exception]]:
         """
         @brief      Read value
         @param      registers       list name of points
@@ -1080,7 +1242,17 @@ class ModbusDevice(Generic[S, I, F, SF, E, B]):
 
         name_type_register = self.get_name_function(type_function)
 
-        if len(registers) > 0:
+        if len(registers) > 0 and self.decoder.batch_decoder is not None:
+            read_plan = self.get_read_plan(tuple(registers), name_type_register)
+            raw_blocks = read_plan.read_blocks(
+                lambda start_register, length: self.read_raw_value(
+                    start_register, type_function, length
+                )
+            )
+            return self.process_block_data(
+                tuple(registers), read_plan, raw_blocks, name_type_register
+            )
+        elif len(registers) > 0:
             value_dict = self.read_raw_values(tuple(registers), type_function)
             return_data = self.process_multi_data(
                 registers, value_dict, name_type_register
@@ -1089,6 +1261,59 @@ class ModbusDevice(Generic[S, I, F, SF, E, B]):
         else:
             raise MissingInput(self.read_values.__name__, "points")
 
+    """
+    Read value from device fuction (asyncio connection)
+    """
+
+    async def read_raw_value_async(
+        self, register: int, type_function: mbdefines, length: int
+    ) -> Tuple[int, ...]:
+        """
+        @brief      Read register with asyncio connection (AsyncTcpMaster)
+        @param      register        register address
+        @param      type_register   where is points locate
+        @param      length          how many register should be read
+        @retval     Raw value of multi register
+        """
+
+        return await self.modbus_client.execute(
+            slave=self.client_ID,
+            function_code=type_function,
+            starting_address=register - self.offset,
+            quantity_of_x=length,
+        )
+
+    async def read_values_async(
+        self, registers: List[str], type_function: mbdefines
+    ) -> Tuple[PointTable[Union[S, I, F, SF, E, B]], Dict[str, Exception]]:
+        """
+        @brief      Read value with asyncio connection (AsyncTcpMaster)
+        @param      registers       list name of points
+        @param      type_register   where is points locate
+        @retval     Block of data after process
+        """
+
+        if not isinstance(registers, list):
+            raise WrongInput(self.read_values_async.__name__, "points", "list")
+        if len(registers) == 0:
+            raise MissingInput(self.read_values_async.__name__, "points")
+
+        name_type_register = self.get_name_function(type_function)
+        read_plan = self.get_read_plan(tuple(registers), name_type_register)
+        raw_blocks = await read_plan.read_blocks_async(
+            lambda start_register, length: self.read_raw_value_async(
+                start_register, type_function, length
+            )
+        )
+
+        if self.decoder.batch_decoder is not None:
+            return self.process_block_data(
+                tuple(registers), read_plan, raw_blocks, name_type_register
+            )
+        return self.process_multi_data(
+            registers, read_plan.slice_blocks(raw_blocks), name_type_register
+        )
+
     """
     Write value to device fuction
     """
@@ -0,0 +1,369 @@
+import asyncio
+import errno
+import os
+import socket
+import struct
+from typing import *
+
+import modbus_tk.defines as mbdefines
+from modbus_tk.exceptions import (
+    ModbusError,
+    ModbusInvalidRequestError,
+    ModbusInvalidResponseError,
+)
+
+MBAP_LENGTH: int = 7  # transaction id, protocol id, length, unit id
+TIMEOUT_TCP: float = 5.0
+# Continuous timeouts of every unit before reconnect (half-open connection)
+MAX_TIMEOUTS: int = 3
+# Requests to unit which has just timed out fail without using connection
+BACKOFF_MIN: float = 5
+BACKOFF_MAX: float = 300
+
+
+class AsyncTcpMaster:
+    """
+    Modbus TCP master on asyncio, same execute arguments and result as modbus_tk TcpMaster
+    but execute is a coroutine. Errors keep text of modbus_tk/socket errors
+    ("timed out", "Connection refused", "Modbus Error", ...).
+    Up to max_in_flight requests are sent on connection without waiting for response,
+    responses are matched by transaction id. Share one master for every client ID
+    behind a gateway to pipeline requests to the gateway.
+    Timeouts are counted for each unit ID, requests to a unit which has just timed out
+    fail at once until its backoff time is over. Connection is closed only when no
+    unit on it answers.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 502,
+        timeout_in_sec: float = TIMEOUT_TCP,
+        max_in_flight: int = 1,
+    ) -> None:
+        self.host = host
+        self.port = port
+        self.timeout = timeout_in_sec
+        self.max_in_flight = max(1, max_in_flight)
+        self.reader: Union[asyncio.StreamReader, None] = None
+        self.writer: Union[asyncio.StreamWriter, None] = None
+        self.transaction_id = 0
+        # Continuous timeouts of each unit ID
+        self.timeouts: Dict[int, int] = {}
+        # Backoff of each unit ID: (continuous failures, event loop time of retry)
+        self.backoffs: Dict[int, Tuple[int, float]] = {}
+        self.last_used = 0.0  # event loop time of last request
+        # Requests wait for response, by transaction id
+        self.pending: Dict[int, asyncio.Future] = {}
+        self.read_task: Union[asyncio.Task, None] = None
+        # Created in event loop
+        self.open_lock: Union[asyncio.Lock, None] = None
+        self.semaphore: Union[asyncio.Semaphore, None] = None
+
+    def set_timeout(self, timeout_in_sec: float) -> None:
+        self.timeout = timeout_in_sec
+
+    def get_timeout(self) -> float:
+        return self.timeout
+
+    def raise_max_in_flight(self, max_in_flight: int) -> None:
+        """
+        @brief      Allow more requests wait for response on connection, smaller value
+                    is ignored. Run in event loop of master.
+        @param      max_in_flight       max requests wait for response
+        @retval     None
+        """
+
+        if max_in_flight <= self.max_in_flight:
+            return
+        if self.semaphore is not None:
+            for _ in range(max_in_flight - self.max_in_flight):
+                self.semaphore.release()
+        self.max_in_flight = max_in_flight
+
+    def is_connected(self) -> bool:
+        """
+        @brief      Check connection is opened and not closed by device
+        @retval     True if connection can be used
+        """
+
+        return (
+            self.writer is not None
+            and not self.writer.is_closing()
+            and not self.reader.at_eof()
+        )
+
+    async def open(self) -> None:
+        """
+        @brief      Connect to device if it is not connected
+        @retval     None
+        """
+
+        if self.writer is not None:
+            return
+        if self.open_lock is None:
+            self.open_lock = asyncio.Lock()
+        async with self.open_lock:
+            if self.writer is not None:
+                return
+            try:
+                self.reader, self.writer = await asyncio.wait_for(
+                    asyncio.open_connection(self.host, self.port), self.timeout
+                )
+            except asyncio.TimeoutError:
+                raise socket.timeout("timed out")
+            except OSError as error:
+                # asyncio hide text of error code ("Connect call failed")
+                if error.errno is not None:
+                    raise OSError(error.errno, os.strerror(error.errno))
+                raise
+            self.timeouts.clear()
+            self.read_task = asyncio.ensure_future(self._read_responses(self.reader))
+
+    def close(self, error: Exception = None) -> None:
+        """
+        @brief      Close connection, requests wait for response get error
+        @param      error           error of requests
+        @retval     None
+        """
+
+        if self.read_task is not None and not self._in_read_task():
+            self.read_task.cancel()
+        if self.writer is not None:
+            self.writer.close()
+        self.read_task = None
+        self.reader = None
+        self.writer = None
+
+        if error is None:
+            error = ConnectionResetError(errno.ECONNRESET, "Connection closed")
+        for future in self.pending.values():
+            if not future.done():
+                future.set_exception(error)
+        self.pending.clear()
+
+    def _in_read_task(self) -> bool:
+        try:
+            return asyncio.current_task() is self.read_task
+        except RuntimeError:
+            # Not in event loop
+            return False
+
+    async def _read_responses(self, reader: asyncio.StreamReader) -> None:
+        """
+        @brief      Read responses of connection and give them to requests by transaction id.
+                    Response of request which is timed out is dropped.
+        @param      reader          reader of connection
+        @retval     None
+        """
+
+        try:
+            while True:
+                header = await reader.readexactly(MBAP_LENGTH)
+                response_id, protocol_id, length, unit_id = struct.unpack(
+                    ">HHHB", header
+                )
+                response = await reader.readexactly(length - 1)
+                # Unit answers (also late response)
+                self.timeouts[unit_id] = 0
+                self.backoffs.pop(unit_id, None)
+                future = self.pending.pop(response_id, None)
+                if future is not None and not future.done():
+                    future.set_result((protocol_id, unit_id, response))
+        except asyncio.CancelledError:
+            raise
+        except Exception as error:
+            if isinstance(error, asyncio.IncompleteReadError):
+                error = ConnectionResetError(
+                    errno.ECONNRESET, os.strerror(errno.ECONNRESET)
+                )
+            # Connection may be reopened
+            if self.reader is reader:
+                self.close(error)
+
+    def _next_transaction_id(self) -> int:
+        self.transaction_id = (self.transaction_id + 1) & 0xFFFF
+        while self.transaction_id in self.pending:
+            self.transaction_id = (self.transaction_id + 1) & 0xFFFF
+        return self.transaction_id
+
+    @staticmethod
+    def build_pdu(
+        function_code: int,
+        starting_address: int,
+        quantity_of_x: int = 0,
+        output_value: Union[int, List[int]] = 0,
+    ) -> bytes:
+        """
+        @brief      Build request PDU
+        @param      function_code       modbus function code
+        @param      starting_address    first register
+        @param      quantity_of_x       number of registers (read)
+        @param      output_value        value(s) of registers (write)
+        @retval     PDU
+        """
+
+        if (
+            function_code == mbdefines.READ_HOLDING_REGISTERS
+            or function_code == mbdefines.READ_INPUT_REGISTERS
+        ):
+            return struct.pack(">BHH", function_code, starting_address, quantity_of_x)
+        elif function_code == mbdefines.WRITE_SINGLE_REGISTER:
+            fmt = ">BH" + ("H" if output_value >= 0 else "h")
+            return struct.pack(fmt, function_code, starting_address, output_value)
+        elif function_code == mbdefines.WRITE_MULTIPLE_REGISTERS:
+            return struct.pack(
+                ">BHHB" + "H" * len(output_value),
+                function_code,
+                starting_address,
+                len(output_value),
+                2 * len(output_value),
+                *output_value
+            )
+        raise ModbusInvalidRequestError(
+            "{0} function code is not supported".format(function_code)
+        )
+
+    @staticmethod
+    def parse_pdu(
+        function_code: int, quantity_of_x: int, pdu: bytes
+    ) -> Tuple[int, ...]:
+        """
+        @brief      Get data of response PDU
+        @param      function_code       modbus function code of request
+        @param      quantity_of_x       number of registers of request
+        @param      pdu                 response PDU
+        @retval     data of response
+        """
+
+        if len(pdu) < 2:
+            raise ModbusInvalidResponseError(
+                "Response length is only {0} bytes. ".format(len(pdu))
+            )
+        return_code = pdu[0]
+        if return_code > 0x80:
+            raise ModbusError(pdu[1])
+        if return_code != function_code:
+            raise ModbusInvalidResponseError(
+                "Invalid function code {0} in response".format(return_code)
+            )
+
+        if (
+            function_code == mbdefines.READ_HOLDING_REGISTERS
+            or function_code == mbdefines.READ_INPUT_REGISTERS
+        ):
+            byte_count = pdu[1]
+            if byte_count != 2 * quantity_of_x or len(pdu) != byte_count + 2:
+                raise ModbusInvalidResponseError(
+                    "Byte count is {0} while expected {1}".format(
+                        byte_count, 2 * quantity_of_x
+                    )
+                )
+            return struct.unpack(">" + "H" * quantity_of_x, pdu[2:])
+        if len(pdu) != 5:
+            raise ModbusInvalidResponseError(
+                "Response length is {0} bytes while expected 5".format(len(pdu))
+            )
+        return struct.unpack(">HH", pdu[1:])
+
+    async def _request(self, slave: int, pdu: bytes) -> bytes:
+        """
+        @brief      Send request and wait for response with same transaction id
+        @param      slave               client ID
+        @param      pdu                 request PDU
+        @retval     response PDU
+        """
+
+        await self.open()
+        transaction_id = self._next_transaction_id()
+        future = asyncio.get_event_loop().create_future()
+        self.pending[transaction_id] = future
+        try:
+            self.writer.write(
+                struct.pack(">HHHB", transaction_id, 0, len(pdu) + 1, slave) + pdu
+            )
+            await self.writer.drain()
+            protocol_id, unit_id, response = await future
+        finally:
+            self.pending.pop(transaction_id, None)
+
+        if protocol_id != 0 or unit_id != slave:
+            raise ModbusInvalidResponseError(
+                "Invalid MBAP (transaction {0}, protocol {1}, unit {2})".format(
+                    transaction_id, protocol_id, unit_id
+                )
+            )
+        return response
+
+    async def execute(
+        self,
+        slave: int,
+        function_code: int,
+        starting_address: int,
+        quantity_of_x: int = 0,
+        output_value: Union[int, List[int]] = 0,
+        timeout: float = None,
+        backoff: bool = True,
+    ) -> Tuple[int, ...]:
+        """
+        @brief      Execute modbus request, timeout starts when request can be sent
+                    (not while it waits for other requests in flight)
+        @param      slave               client ID
+        @param      function_code       modbus function code
+        @param      starting_address    first register
+        @param      quantity_of_x       number of registers (read)
+        @param      output_value        value(s) of registers (write)
+        @param      timeout             timeout of request, None is timeout of master
+        @param      backoff             False to skip backoff of unit (probe of scanner)
+        @retval     data of response
+        """
+
+        pdu = self.build_pdu(function_code, starting_address, quantity_of_x, output_value)
+        if timeout is None:
+            timeout = self.timeout
+
+        if backoff:
+            self._check_backoff(slave)
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.max_in_flight)
+        async with self.semaphore:
+            # Unit may time out while request waits for connection
+            if backoff:
+                self._check_backoff(slave)
+            self.last_used = asyncio.get_event_loop().time()
+            try:
+                response = await asyncio.wait_for(self._request(slave, pdu), timeout)
+            except asyncio.TimeoutError:
+                # Late response is dropped by transaction id, connection is kept
+                # unless no unit answers anything
+                self.timeouts[slave] = self.timeouts.get(slave, 0) + 1
+                if backoff:
+                    failures = self.backoffs.get(slave, (0, 0.0))[0] + 1
+                    self.backoffs[slave] = (
+                        failures,
+                        self.last_used
+                        + timeout
+                        + min(BACKOFF_MAX, BACKOFF_MIN * 2 ** (failures - 1)),
+                    )
+                if all(x >= MAX_TIMEOUTS for x in self.timeouts.values()):
+                    self.close(socket.timeout("timed out"))
+                raise socket.timeout("timed out")
+
+        return self.parse_pdu(function_code, quantity_of_x, response)
+
+    def _check_backoff(self, slave: int) -> None:
+        """
+        @brief      Fail request to unit which is in backoff, error has text of timeout
+        @param      slave               client ID
+        @retval     None
+        """
+
+        if slave not in self.backoffs:
+            return
+        remaining = self.backoffs[slave][1] - asyncio.get_event_loop().time()
+        if remaining > 0:
+            raise socket.timeout(
+                "timed out (unit {0} is not responding, retry in {1:.0f} s)".format(
+                    slave, remaining
+                )
+            )
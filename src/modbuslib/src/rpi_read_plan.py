@@ -0,0 +1,189 @@
+import asyncio
+from typing import *
+
+MAX_REGISTERS_PER_REQUEST: int = 125  # Modbus protocol limit of read registers
+MAX_BLOCK_LENGTH: int = 120  # Default max registers read in one request
+MAX_GAP: int = 20  # Default max unused registers read through in one request
+
+
+class ReadPlan:
+    """
+    Compiled read schedule for one point list of one register type.
+    Built once per (driver, point list, register type) and executed on every poll.
+    """
+
+    def __init__(
+        self,
+        register_points: Dict[str, Dict[str, Any]],
+        points: Tuple[str, ...],
+        max_block_length: int = MAX_BLOCK_LENGTH,
+        max_gap: int = MAX_GAP,
+    ) -> None:
+        """
+        @brief      Resolve scale factor dependencies and divide points to register blocks
+        @param      register_points         driver points of one register type
+        @param      points                  name of points need to read
+        @param      max_block_length        max registers read in one request
+        @param      max_gap                 max unused registers read through in one request
+        @retval     None
+        """
+
+        self.max_block_length = min(max_block_length, MAX_REGISTERS_PER_REQUEST)
+        self.max_gap = max_gap
+        self.points: Tuple[str, ...] = self.resolve_points(register_points, points)
+
+        # (name, address, count) sorted by register address
+        self.ranges: Tuple[Tuple[str, int, int], ...] = tuple(
+            sorted(
+                (
+                    (
+                        point,
+                        register_points[point]["registerAddr"],
+                        register_points[point]["count"],
+                    )
+                    for point in self.points
+                    if point in register_points
+                ),
+                key=lambda x: (x[1], x[2]),
+            )
+        )
+
+        # (start register, length, ((name, offset, count), ...))
+        self.blocks: Tuple[
+            Tuple[int, int, Tuple[Tuple[str, int, int], ...]], ...
+        ] = self.divide_blocks(self.ranges, self.max_block_length, self.max_gap)
+
+    @staticmethod
+    def resolve_points(
+        register_points: Dict[str, Dict[str, Any]], points: Tuple[str, ...]
+    ) -> Tuple[str, ...]:
+        """
+        @brief      Add scale factor points which are needed by input points
+        @param      register_points         driver points of one register type
+        @param      points                  name of points need to read
+        @retval     name of points with their scale factor points
+        """
+
+        return_data: List[str] = list(points)
+
+        for point_name in points:
+            if "SF" in point_name:
+                continue
+            try:
+                points_SF = register_points[point_name]["scaleFactor"]
+            except Exception:
+                continue
+            if isinstance(points_SF, str) and points_SF not in return_data:
+                return_data.append(points_SF)
+
+        return tuple(return_data)
+
+    @staticmethod
+    def divide_blocks(
+        ranges: Tuple[Tuple[str, int, int], ...],
+        max_block_length: int,
+        max_gap: int = MAX_GAP,
+    ) -> Tuple[Tuple[int, int, Tuple[Tuple[str, int, int], ...]], ...]:
+        """
+        @brief      Coalesce sorted points to blocks of max_block_length registers or less.
+                    Small holes between points are read through, a hole larger than
+                    max_gap starts a new block. Points are sorted so extend block
+                    greedily give the least number of requests.
+        @param      ranges                  (name, address, count) sorted by address
+        @param      max_block_length        max registers read in one request
+        @param      max_gap                 max unused registers read through in one request
+        @retval     (start register, length, ((name, offset, count), ...))
+        """
+
+        return_data = []
+        block_points: List[Tuple[str, int, int]] = []
+        start_register = 0
+        end_register = 0
+
+        for point_name, register_addr, reg_len in ranges:
+            if len(block_points) > 0 and (
+                register_addr - end_register > max_gap
+                or max(end_register, register_addr + reg_len) - start_register
+                > max_block_length
+            ):
+                return_data.append(
+                    (start_register, end_register - start_register, tuple(block_points))
+                )
+                block_points = []
+
+            if len(block_points) == 0:
+                start_register = register_addr
+                end_register = register_addr
+
+            block_points.append((point_name, register_addr - start_register, reg_len))
+            end_register = max(end_register, register_addr + reg_len)
+
+        if len(block_points) > 0:
+            return_data.append(
+                (start_register, end_register - start_register, tuple(block_points))
+            )
+
+        return tuple(return_data)
+
+    def read_blocks(
+        self, read_block: Callable[[int, int], Sequence[int]]
+    ) -> List[Sequence[int]]:
+        """
+        @brief      Read every block
+        @param      read_block          function read registers (start register, length)
+        @retval     Raw values of every block
+        """
+
+        return [
+            read_block(start_register, length)
+            for start_register, length, _ in self.blocks
+        ]
+
+    async def read_blocks_async(
+        self, read_block: Callable[[int, int], Awaitable[Sequence[int]]]
+    ) -> List[Sequence[int]]:
+        """
+        @brief      Read every block, requests are sent together
+        @param      read_block          coroutine read registers (start register, length)
+        @retval     Raw values of every block
+        """
+
+        return list(
+            await asyncio.gather(
+                *(
+                    read_block(start_register, length)
+                    for start_register, length, _ in self.blocks
+                )
+            )
+        )
+
+    def slice_blocks(
+        self, raw_blocks: List[Sequence[int]]
+    ) -> Dict[str, Tuple[int, ...]]:
+        """
+        @brief      Slice raw values of each point from raw values of blocks
+        @param      raw_blocks          raw values of every block
+        @retval     Multi name of points and multi raw value of points
+        """
+
+        return_data: Dict[str, Tuple[int, ...]] = {}
+
+        for result, (_, _, block_points) in zip(raw_blocks, self.blocks):
+            for point_name, offset, reg_len in block_points:
+                # Device return less register than request
+                if offset + reg_len > len(result):
+                    break
+                return_data[point_name] = tuple(result[offset : offset + reg_len])
+
+        return return_data
+
+    def execute(
+        self, read_block: Callable[[int, int], Sequence[int]]
+    ) -> Dict[str, Tuple[int, ...]]:
+        """
+        @brief      Read every block and slice raw values of each point
+        @param      read_block          function read registers (start register, length)
+        @retval     Multi name of points and multi raw value of points
+        """
+
+        return self.slice_blocks(self.read_blocks(read_block))
@@ -4,6 +4,7 @@ import time
 import socket
 import ssl
 import sys
+import threading
 from asyncio.events import AbstractEventLoop
 from asyncio.futures import Future
 from concurrent.futures import ThreadPoolExecutor
@@ -13,10 +14,8 @@ from pathlib import Path
 from typing import *
 from urllib import parse
 
-import persistqueue
 import psutil
 import pykka
-import snappy
 from nats.aio.client import Client as NATS
 from nats.aio.errors import ErrConnectionClosed, ErrNoServers, ErrTimeout
 from rx.core.typing import Disposable
@@ -31,15 +30,31 @@ sys.path.append(parent_dir_path + "/src/system/src")
 sys.path.append(parent_dir_path + "/src/database/src")
 sys.path.append(parent_dir_path + "/src/modbuslib/protobuf")
 
+from rpi_columnar_batch import (
+    decode_columnar_batch,
+    encode_columnar_batch,
+    is_columnar_batch,
+)
+from rpi_codec import SnappyCodec, get_codec
 from rpi_compress_data import CompressData
-from rpi_modbus import ModbusDevice, PointContainer
-from rpi_queue import clientQueue
+from rpi_metric_encoder import MetricGroupEncoder, encode_site_info
+from rpi_modbus import ModbusDevice, PointTable
+from rpi_segment_queue import SegmentQueue
 from rpi_verbose import verbose
 from rpi_watchdog import Watchdog
 import natsio_schema_pb2
 from rpi_database import thread_error_database
 
 loop_time: int = 15
+# Queued submissions are sent together in one message when queue has backlog
+BATCH_MAX_BYTES: int = 512 * 1024  # uncompressed
+BATCH_MAX_COUNT: int = 500
+REQUEST_TIMEOUT: float = 1
+BATCH_REQUEST_TIMEOUT: float = 5
+# Format of batch: MetricSubmission or columnar batch (rpi_columnar_batch.py)
+BATCH_FORMAT: Tuple[str, ...] = ("submission", "columnar")
+# Metric groups of every device of site are sent in one submission
+AGGREGATE_MAX_BYTES: int = 256 * 1024  # uncompressed
 time_out_rtu: int = 5
 _container_name: str = ""
 
@@ -47,23 +62,36 @@ _container_name: str = ""
 class NatsioSink(pykka.ThreadingActor):
     """
     Actor responsible for pushing information to server via natsio.
-    persistqueue.Queue is used to persist data to disk before sending.
+    SegmentQueue is used to persist data to disk before sending.
     """
 
     def __init__(
-        self, subject: str, queue: persistqueue.Queue, thread_name: str, nc: NATS = None
+        self,
+        subject: str,
+        queue: SegmentQueue,
+        thread_name: str,
+        nc: NATS = None,
+        batch_format: str = "submission",
+        codec: SnappyCodec = None,
     ) -> None:
         """
-        @param  nc        a NATS client instance
-        @param  subject   name of the natsio subject to push data to
-        @param  queue     persistent queue, to save data to disk before trying to send
+        @param  nc             a NATS client instance
+        @param  subject        name of the natsio subject to push data to
+        @param  queue          persistent queue, to save data to disk before trying to send
+        @param  batch_format   format of backlog batch, "submission" or "columnar"
+        @param  codec          codec of backlog batch (rpi_codec), None is snappy. It
+                               must not be shared with other actor
         """
         super().__init__()
+        self._codec: SnappyCodec = get_codec() if codec is None else codec
+        if batch_format not in BATCH_FORMAT:
+            raise ValueError("Unknown batch format: " + str(batch_format))
+        self._batch_format: str = batch_format
         self._nc: NATS = nc
         self._thread_name: str = thread_name
         self._subject: str = subject
         self._loop: AbstractEventLoop = asyncio.get_event_loop()
-        self._queue: clientQueue = queue
+        self._queue: SegmentQueue = queue
         self._scheduler: AsyncIOScheduler = AsyncIOScheduler(asyncio.get_event_loop())
         self._disposable: Union[None, Disposable] = None
 
@@ -96,9 +124,12 @@ class NatsioSink(pykka.ThreadingActor):
         """
 
         def __debug(msg_data: bytes) -> None:
-            snappy_msg = snappy.decompress(msg_data)
-            data = natsio_schema_pb2.MetricSubmission()
-            data.ParseFromString(snappy_msg)
+            snappy_msg = self._codec.decompress(msg_data)
+            if is_columnar_batch(snappy_msg):
+                data = decode_columnar_batch(snappy_msg)
+            else:
+                data = natsio_schema_pb2.MetricSubmission()
+                data.ParseFromString(snappy_msg)
             timestamp = data.metric_groups[0].timestamp
             if round(time.time() * 1000) - timestamp > 900:
                 verbose(
@@ -117,7 +148,7 @@ class NatsioSink(pykka.ThreadingActor):
             # dt_string = now.strftime("%d/%m/%Y %H:%M:%S")
             self._disposable = None
             if self._queue.qsize() > 0:
-                data = self._queue.get()
+                data, count = _get_batch()
                 if data != None:
                     if len(data) > 0 and self._queue.qsize() > 400:
                         verbose(
@@ -129,13 +160,50 @@ class NatsioSink(pykka.ThreadingActor):
                         __debug(data)
                 # print(dt_string + " -> Get data " + str(self._queue.qsize()))
                 # Try to push data to server
-                _try_push(data)
+                _try_push(data, count)
             else:
                 # If queue is empty, try again in 1 second
                 self._disposable = _do_again(1, lambda: _entry_point())
                 # print(dt_string + " -> Try again " + str(self._queue.qsize()))
 
-        def _next(fut: Future, data: bytes) -> None:
+        def _get_batch() -> Tuple[bytes, int]:
+            """
+            Get data from queue. When more data waits in queue (backlog), submissions
+            are merged into one MetricSubmission: serialized submissions of same site
+            are concatenated, metric groups are appended. Merged submission is
+            converted to columnar batch if batch format is "columnar".
+            @return    (data to send, number of queue items in data)
+            """
+
+            data = self._queue.get()
+            if data is None or self._queue.qsize() <= 1:
+                return data, 1
+
+            # Submissions are decompressed into one buffer, compressed without copy
+            batch = bytearray()
+            count = 0
+            while (
+                len(batch) < BATCH_MAX_BYTES
+                and count < BATCH_MAX_COUNT
+                and data is not None
+            ):
+                count += 1
+                try:
+                    batch += self._codec.decompress(data)
+                except Exception as e:
+                    # Broken item is dropped with the batch
+                    verbose("QUEUE - " + self._thread_name, str(e), "ERROR")
+                if self._queue.qsize() <= count:
+                    break
+                data = self._queue.get()
+            if self._batch_format == "columnar":
+                try:
+                    return self._codec.compress(encode_columnar_batch(batch)), count
+                except Exception as e:
+                    verbose("QUEUE - " + self._thread_name, str(e), "ERROR")
+            return self._codec.compress(batch), count
+
+        def _next(fut: Future, data: bytes, count: int = 1) -> None:
             """
             Check if previous attempt succeeded.
             If successful, continue with the next data point.
@@ -148,16 +216,24 @@ class NatsioSink(pykka.ThreadingActor):
             dt_string = now.strftime("%d/%m/%Y %H:%M:%S")
 
             if fut.exception() is None:
-                self._queue.task_done()
-
-                verbose("NATS - " + self._thread_name, "Send success", "INFO")
+                for _ in range(count):
+                    self._queue.task_done()
+
+                if count > 1:
+                    verbose(
+                        "NATS - " + self._thread_name,
+                        "Send success (" + str(count) + " submissions)",
+                        "INFO",
+                    )
+                else:
+                    verbose("NATS - " + self._thread_name, "Send success", "INFO")
 
                 # Start again with new data (if available)
                 # Call _do_again instead of calling _entry_point directly to avoid stackoverflow (trampoline)
                 self._disposable = _do_again(0, lambda: _entry_point())
                 thread_error_database.remove_from_list("NATS", self._thread_name)
             else:
-                self._disposable = _do_again(1, lambda: _try_push(data))
+                self._disposable = _do_again(1, lambda: _try_push(data, count))
                 verbose(
                     "NATS - " + self._thread_name,
                     "Send error. Error code: " + str(fut.exception()),
@@ -165,18 +241,23 @@ class NatsioSink(pykka.ThreadingActor):
                 )
                 thread_error_database.add("NATS", self._thread_name)
 
-        def _try_push(data: bytes) -> None:
+        def _try_push(data: bytes, count: int = 1) -> None:
             """
             Try to push the given data to server.
             @param data    data to be sent
+            @param count   number of queue items in data
             """
             fut = self._loop.create_task(
                 # Wait for acknowledgement from server.
                 # For now, we don't care about the content of the message.
                 # We only need to know that the message has been sent successfully.
-                self._nc.request(self._subject, data, timeout=1)
+                self._nc.request(
+                    self._subject,
+                    data,
+                    timeout=REQUEST_TIMEOUT if count == 1 else BATCH_REQUEST_TIMEOUT,
+                )
             )
-            fut.add_done_callback(lambda _: _next(fut, data))
+            fut.add_done_callback(lambda _: _next(fut, data, count))
 
         def _do_again(delay: float, f: Callable[[], None]) -> Disposable:
             """
@@ -202,19 +283,53 @@ class NatsioSink(pykka.ThreadingActor):
 class ProcessorActor(pykka.ThreadingActor):
     """
     Actor responsible for process data from device to server via protobuf.
+    Metric groups of devices in a poll window are sent in one submission, it is
+    flushed when window is over, when size limit is reached or when a device of
+    the submission is polled again.
     """
 
     def __init__(
         self,
         sink: NatsioSink,
+        window: float = None,
+        max_bytes: int = AGGREGATE_MAX_BYTES,
+        snapshot_interval: int = 1,
+        deadband: float = 0.0,
+        codec: SnappyCodec = None,
     ) -> None:
+        """
+        @param sink        the ActorProxy of the actor responsible for sending data
+        @param window      max time (s) metric group waits for other devices,
+                           None is poll time, 0 is one submission for each poll
+        @param max_bytes   max size of metric groups of one submission
+        @param snapshot_interval
+                           report by exception, every point is sent each N polls,
+                           1 is every point in every poll
+        @param deadband    report by exception, change of float point (part of
+                           last sent value) which is sent
+        @param codec       codec of submission (rpi_codec), None is snappy. It must
+                           not be shared with other actor
+        """
         super().__init__()
         self.sink = sink
+        self.window = loop_time if window is None else window
+        self.max_bytes = max_bytes
+        self.snapshot_interval = snapshot_interval
+        self.deadband = deadband
+        self.codec = get_codec() if codec is None else codec
+        # Encoding plan of each device, by device info
+        self.encoders: Dict[Tuple[str, ...], MetricGroupEncoder] = {}
+        # Serialized submission of metric groups wait for submission, by
+        # (tenant, location). Metric groups are encoded into it, it is compressed
+        # without copy
+        self.pending: Dict[Tuple[str, str], bytearray] = {}
+        self.pending_devices: Dict[Tuple[str, str], Set[str]] = {}
+        self.timers: Dict[Tuple[str, str], threading.Timer] = {}
 
     def fileter(
-        self, data: Tuple[Dict[str, PointContainer], Dict[str, Exception]]
-    ) -> Union[None, Tuple[Dict[str, PointContainer], Dict[str, Exception]]]:
-        return_data: Union[None, Tuple[Dict[str, PointContainer], Dict[str, Exception]]]
+        self, data: Tuple[PointTable, Dict[str, Exception]]
+    ) -> Union[None, Tuple[PointTable, Dict[str, Exception]]]:
+        return_data: Union[None, Tuple[PointTable, Dict[str, Exception]]]
 
         if len(data[0]) > 0:
             return_data = data
@@ -227,43 +342,87 @@ class ProcessorActor(pykka.ThreadingActor):
         self,
         metric_submission_init_data: Dict[str, str],
         metric_gr_init_data: Dict[str, Any],
-        data_recieve: Tuple[Dict[str, PointContainer], Dict[str, Exception]],
+        data_recieve: Tuple[PointTable, Dict[str, Exception]],
     ):
         data_after_filter = self.fileter(data=data_recieve)
         if data_after_filter == None:
             return
 
-        self._create_new_block(metric_submission_init_data)
+        # Device info and point names are serialized once for each device
+        encoder = self._get_encoder(metric_gr_init_data)
+
+        key = (
+            metric_submission_init_data["tenant"],
+            metric_submission_init_data["location"],
+        )
+        serial_number = metric_gr_init_data["serial_number"]
+        # Device is polled again, poll window is over
+        if serial_number in self.pending_devices.get(key, ()):
+            self.flush(key)
+
+        submission = self.pending.get(key)
+        if submission is None:
+            submission = bytearray(encode_site_info(key[0], key[1]))
+        encoder.encode_into(submission, data_after_filter)
+        self.pending[key] = submission
+        self.pending_devices.setdefault(key, set()).add(serial_number)
+
+        if len(submission) >= self.max_bytes or self.window <= 0:
+            self.flush(key)
+        elif key not in self.timers:
+            self.timers[key] = threading.Timer(self.window, self._flush_later, (key,))
+            self.timers[key].daemon = True
+            self.timers[key].start()
+
+    def _flush_later(self, key: Tuple[str, str]) -> None:
+        try:
+            self.actor_ref.proxy().flush(key)
+        except pykka.ActorDeadError:
+            # Pending data is flushed when actor is stopped
+            pass
+
+    def flush(self, key: Tuple[str, str] = None) -> None:
+        """
+        Send metric groups wait for submission as one submission.
+        @param key   (tenant, location) of submission, None is every submission
+        """
 
-        # Create new device group data
-        metric_gr = CompressData().add_new_metrics_group(
-            self.protobuf_block,
+        for _key in list(self.pending.keys()) if key is None else [key]:
+            timer = self.timers.pop(_key, None)
+            if timer is not None:
+                timer.cancel()
+            submission = self.pending.pop(_key, None)
+            self.pending_devices.pop(_key, None)
+            if submission is None:
+                continue
+            self.sink.submit(CompressData().compress_data(submission, self.codec))
+
+    def _get_encoder(self, metric_gr_init_data: Dict[str, Any]) -> MetricGroupEncoder:
+        key = (
             metric_gr_init_data["model"],
             metric_gr_init_data["manufacturer"],
             metric_gr_init_data["serial_number"],
             metric_gr_init_data["version"],
-            metric_gr_init_data["device_id"],
+            str(metric_gr_init_data["device_id"]),
         )
+        encoder = self.encoders.get(key)
+        if encoder is None:
+            encoder = MetricGroupEncoder(
+                *key, snapshot_interval=self.snapshot_interval, deadband=self.deadband
+            )
+            self.encoders[key] = encoder
+        return encoder
 
-        CompressData().add_metric_data(metric_gr, data_recieve)
-        self.sink.submit(CompressData().compress_data(self.protobuf_block))
-
-    def _create_new_block(self, metric_submission_init_data) -> None:
-        self.protobuf_block = CompressData().create_new_metric_submission(
-            metric_submission_init_data["tenant"],
-            metric_submission_init_data["location"],
-        )
+    def on_stop(self) -> None:
+        self.flush()
 
 
-class Source(pykka.ThreadingActor):
-    """Each inverter should have its own actor.
-    More experiments needed to see if this is safe when multiple inverters share the same ip address.
-    If it's not safe, each actor should be responsible for just one ip address.
-    To separate out data reading and data preparation, we should have an extra actor in between source
-    and sink:
-    Source Actor -> Processing Actor -> Sink Actor,
-    where processing actor takes in the data from Source Actor (which comes from modbuslib) and convert it to
-    the data defined by natsio schema.
+class AsyncSource:
+    """Poll one device on the event loop with asyncio producer (AsyncTcpMaster or
+    RtuBusClient). It does not own a thread, many devices can wait for network at
+    the same time in one event loop.
+    Source -> Processing Actor -> Sink Actor, where processing actor converts data
+    from modbuslib to the data defined by natsio schema.
     """
 
     def __init__(
@@ -278,7 +437,7 @@ class Source(pykka.ThreadingActor):
                 Optional[List[str]],
                 Optional[str],
             ],
-            Tuple[Dict[str, PointContainer], Dict[str, Exception]],
+            Awaitable[Tuple[PointTable, Dict[str, Exception]]],
         ],
         device: ModbusDevice,
         metric_submission_init_data: Dict[str, Any],
@@ -289,41 +448,56 @@ class Source(pykka.ThreadingActor):
     ):
         """
         @param process   the ActorProxy of the actor responsible for sending data
-        @param producer  function responsible for producing data.
-                         For example, in the case of modbus, this is where modbus
-                         read can be performed.
+        @param producer  coroutine function responsible for producing data.
         """
-        super().__init__()
-        scheduler = AsyncIOScheduler(asyncio.get_event_loop())
         self.serial_number = serial_number
+        self.process = process
+        self.producer = producer
+        self.device = device
         self.metric_submission_init_data = metric_submission_init_data
-        self._disposable = scheduler.schedule_periodic(
-            loop_time,
-            lambda _: process.submit(
-                metric_submission_init_data,
-                metric_gr_init_data,
-                producer(
-                    serial_number, device, input_registers, holding_registers, protocol
-                ),
-            ),
-        )
+        self.metric_gr_init_data = metric_gr_init_data
+        self.protocol = protocol
+        self.input_registers = input_registers
+        self.holding_registers = holding_registers
+        self.loop = asyncio.get_event_loop()
+        self._task: Union[asyncio.Task, None] = None
+
+    def start(self) -> "AsyncSource":
+        self._task = self.loop.create_task(self._poll())
+        return self
+
+    async def _poll(self) -> None:
+        while True:
+            start_time = self.loop.time()
+            data_recieve = await self.producer(
+                self.serial_number,
+                self.device,
+                self.input_registers,
+                self.holding_registers,
+                self.protocol,
+            )
+            try:
+                self.process.submit(
+                    self.metric_submission_init_data,
+                    self.metric_gr_init_data,
+                    data_recieve,
+                )
+            except Exception as error:
+                verbose("SYSTEM - " + self.serial_number, str(error), "ERROR")
+            await asyncio.sleep(max(0, loop_time - (self.loop.time() - start_time)))
 
-    def on_stop(self):
+    def stop(self) -> None:
         verbose(
             "SYSTEM - " + self.metric_submission_init_data["location"],
             "Removing device " + self.serial_number,
             "INFO",
         )
-        try:
-            self._disposable.dispose()
-            verbose(
-                "SYSTEM - " + self.metric_submission_init_data["location"],
-                "Remove completed",
-                "INFO",
-            )
-        except:
-            verbose(
-                "SYSTEM - " + self.metric_submission_init_data["location"],
-                "Error while remove device " + self.serial_number,
-                "INFO",
-            )
+        if self._task is not None:
+            self.loop.call_soon_threadsafe(self._task.cancel)
+        # Give pooled connection back, it is kept for other devices behind same gateway
+        self.loop.call_soon_threadsafe(self.device.close_modbus)
+        verbose(
+            "SYSTEM - " + self.metric_submission_init_data["location"],
+            "Remove completed",
+            "INFO",
+        )
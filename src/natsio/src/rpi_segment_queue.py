@@ -0,0 +1,428 @@
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+import zlib
+from collections import deque
+from typing import *
+from pathlib import Path
+
+parent_dir_path = str(Path(__file__).resolve().parents[3])
+sys.path.append(parent_dir_path + "/src/system/src")
+
+from rpi_verbose import verbose
+
+RECORD_HEADER = struct.Struct(">II")  # length of payload, crc32 of payload
+# Segment, offset and index of first record not acknowledged
+CURSOR = struct.Struct(">QQQ")
+SEGMENT_SUFFIX: str = ".seg"
+CURSOR_FILE_NAME: str = "cursor"
+COUNT_FILE_NAME: str = "counts.json"
+
+SEGMENT_SIZE: int = 4 * 1024 * 1024
+MAX_BYTES: int = 256 * 1024 * 1024  # records on disk, oldest records are dropped
+FSYNC_POLICY: Tuple[str, ...] = ("always", "interval", "never")
+FSYNC_INTERVAL: float = 5
+
+
+class SegmentQueue:
+    """
+    Store-and-forward queue of payloads (bytes) in append-only segment files.
+    Each record is length, crc32 and payload. Records are read with mmap and kept
+    until task_done(), records not acknowledged are sent again after restart.
+    Size of records on disk is at most max_bytes, oldest records are dropped.
+    Same interface as clientQueue (put, get, task_done, qsize).
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_bytes: int = MAX_BYTES,
+        segment_size: int = SEGMENT_SIZE,
+        fsync: str = "interval",
+        fsync_interval: float = FSYNC_INTERVAL,
+    ) -> None:
+        """
+        @param  path            folder of segment files
+        @param  max_bytes       max size of records on disk (header included)
+        @param  segment_size    size of segment file before new segment is started
+        @param  fsync           "always": fsync every put/ack, "interval": fsync at most
+                                every fsync_interval, "never": let OS write to disk
+        @param  fsync_interval  time (s) between fsync of "interval" policy
+        """
+
+        if fsync not in FSYNC_POLICY:
+            raise ValueError("fsync policy must be one of " + ", ".join(FSYNC_POLICY))
+
+        self.path = path
+        self.max_bytes = max_bytes
+        self.segment_size = segment_size
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.lock = threading.Lock()
+
+        # Records per segment, size and number of records not acknowledged
+        self.counts: Dict[int, int] = {}
+        self.size = 0
+        self.count = 0
+        # (segment, offset, index) of first record not acknowledged, next record to get
+        self.head: Tuple[int, int, int] = (0, 0, 0)
+        self.read: Tuple[int, int, int] = (0, 0, 0)
+        # Position after each record which is got but not acknowledged, and its size
+        self.in_flight: Deque[Tuple[Tuple[int, int, int], int]] = deque()
+        self.maps: Dict[int, mmap.mmap] = {}
+        self.dirty = False
+        self.last_sync = time.monotonic()
+
+        self._open()
+
+    """
+    Files
+    """
+
+    def _segment_path(self, segment: int) -> str:
+        return os.path.join(self.path, "{0:020d}{1}".format(segment, SEGMENT_SUFFIX))
+
+    def _open(self) -> None:
+        os.makedirs(self.path, exist_ok=True)
+        segments = sorted(
+            int(x[: -len(SEGMENT_SUFFIX)])
+            for x in os.listdir(self.path)
+            if x.endswith(SEGMENT_SUFFIX)
+        )
+        if len(segments) == 0:
+            segments = [0]
+            open(self._segment_path(0), "ab").close()
+        self.tail = segments[-1]
+
+        try:
+            with open(os.path.join(self.path, COUNT_FILE_NAME), "r") as f:
+                self.counts = {int(x): y for x, y in json.load(f).items()}
+        except (OSError, ValueError):
+            self.counts = {}
+        self.counts = {x: y for x, y in self.counts.items() if x in segments}
+        # Tail may be written partly before power loss, it is checked by crc
+        for segment in segments:
+            if segment not in self.counts or segment == self.tail:
+                self.counts[segment] = self._recover(segment)
+
+        cursor_path = os.path.join(self.path, CURSOR_FILE_NAME)
+        try:
+            with open(cursor_path, "rb") as f:
+                self.head = CURSOR.unpack(f.read(CURSOR.size))
+        except (OSError, struct.error):
+            self.head = (segments[0], 0, 0)
+        if self.head[0] not in self.counts:
+            self.head = (segments[0], 0, 0)
+        elif self.head[2] > self.counts[self.head[0]]:
+            # Records after cursor are cut by recovery
+            self.head = (
+                self.head[0],
+                os.path.getsize(self._segment_path(self.head[0])),
+                self.counts[self.head[0]],
+            )
+        for segment in [x for x in segments if x < self.head[0]]:
+            self._remove_segment(segment)
+
+        self.read = self.head
+        self.size = (
+            sum(
+                os.path.getsize(self._segment_path(x))
+                for x in self.counts
+                if x >= self.head[0]
+            )
+            - self.head[1]
+        )
+        self.count = (
+            sum(y for x, y in self.counts.items() if x >= self.head[0]) - self.head[2]
+        )
+
+        self.cursor_fd = os.open(cursor_path, os.O_RDWR | os.O_CREAT, 0o644)
+        self.writer = open(self._segment_path(self.tail), "ab")
+
+        if self.count > 0:
+            verbose(
+                "QUEUE",
+                "Load "
+                + str(self.count)
+                + " records ("
+                + str(self.size)
+                + " bytes) from disk",
+                "INFO",
+            )
+
+    def _recover(self, segment: int) -> int:
+        """
+        @brief      Count records of segment, cut broken record at the end of segment
+        @param      segment         segment id
+        @retval     number of records
+        """
+
+        count = 0
+        offset = 0
+        path = self._segment_path(segment)
+        with open(path, "rb") as f:
+            data = f.read()
+        while offset + RECORD_HEADER.size <= len(data):
+            length, crc = RECORD_HEADER.unpack_from(data, offset)
+            end = offset + RECORD_HEADER.size + length
+            if end > len(data):
+                break
+            if zlib.crc32(data[offset + RECORD_HEADER.size : end]) != crc:
+                break
+            offset = end
+            count += 1
+        if offset < len(data):
+            verbose(
+                "QUEUE",
+                "Drop broken record at end of segment " + str(segment),
+                "ERROR",
+            )
+            with open(path, "r+b") as f:
+                f.truncate(offset)
+        return count
+
+    def _save_counts(self) -> None:
+        path = os.path.join(self.path, COUNT_FILE_NAME)
+        with open(path + ".tmp", "w") as f:
+            json.dump({x: y for x, y in self.counts.items() if x != self.tail}, f)
+        os.replace(path + ".tmp", path)
+
+    def _remove_segment(self, segment: int) -> None:
+        mapped = self.maps.pop(segment, None)
+        if mapped is not None:
+            mapped.close()
+        self.counts.pop(segment, None)
+        try:
+            os.remove(self._segment_path(segment))
+        except OSError:
+            pass
+
+    def _roll(self) -> None:
+        """
+        @brief      Close tail segment and start new segment
+        @retval     None
+        """
+
+        self.writer.flush()
+        if self.fsync != "never":
+            os.fsync(self.writer.fileno())
+        self.writer.close()
+        self.tail += 1
+        self.counts[self.tail] = 0
+        self.writer = open(self._segment_path(self.tail), "ab")
+        self._save_counts()
+
+    def _sync(self) -> None:
+        self.dirty = True
+        if self.fsync == "never":
+            return
+        now = time.monotonic()
+        if self.fsync == "always" or now - self.last_sync >= self.fsync_interval:
+            os.fsync(self.writer.fileno())
+            os.fsync(self.cursor_fd)
+            self.last_sync = now
+            self.dirty = False
+
+    def _save_cursor(self) -> None:
+        os.pwrite(self.cursor_fd, CURSOR.pack(*self.head), 0)
+
+    """
+    Records
+    """
+
+    def _map(self, segment: int, end: int) -> mmap.mmap:
+        """
+        @brief      Get mmap of segment which contains bytes until end
+        @param      segment         segment id
+        @param      end             offset must be mapped
+        @retval     mmap of segment
+        """
+
+        mapped = self.maps.get(segment)
+        if mapped is None or len(mapped) < end:
+            if mapped is not None:
+                mapped.close()
+            with open(self._segment_path(segment), "rb") as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self.maps[segment] = mapped
+        return mapped
+
+    def _record(self, position: Tuple[int, int, int]) -> Tuple[int, int]:
+        """
+        @brief      Get payload of record at position
+        @param      position        (segment, offset, index) of record
+        @retval     (offset of payload, length of payload)
+        """
+
+        segment, offset, index = position
+        mapped = self._map(segment, offset + RECORD_HEADER.size)
+        length, crc = RECORD_HEADER.unpack_from(mapped, offset)
+        return offset + RECORD_HEADER.size, length
+
+    def _next(
+        self, position: Tuple[int, int, int], length: int
+    ) -> Tuple[int, int, int]:
+        """
+        @brief      Get position of record after record at position
+        @param      position        (segment, offset, index) of record
+        @param      length          length of payload of record
+        @retval     position of next record
+        """
+
+        segment, offset, index = position
+        return self._normalize(
+            (segment, offset + RECORD_HEADER.size + length, index + 1)
+        )
+
+    def _normalize(self, position: Tuple[int, int, int]) -> Tuple[int, int, int]:
+        """
+        @brief      Move position at end of closed segment to next segment
+        @param      position        (segment, offset, index)
+        @retval     position
+        """
+
+        segment, offset, index = position
+        while segment != self.tail and index >= self.counts.get(segment, 0):
+            segment, offset, index = segment + 1, 0, 0
+        return (segment, offset, index)
+
+    def _drop_oldest(self) -> None:
+        self.head = self._normalize(self.head)
+        _, length = self._record(self.head)
+        next_head = self._next(self.head, length)
+        if len(self.in_flight) > 0:
+            # Oldest record is sent now, its task_done is ignored
+            self.in_flight.popleft()
+        else:
+            self.read = next_head
+        self._advance(next_head, RECORD_HEADER.size + length)
+
+    def _advance(self, head: Tuple[int, int, int], size: int) -> None:
+        head = self._normalize(head)
+        for segment in range(self.head[0], head[0]):
+            self._remove_segment(segment)
+        self.head = head
+        self.size -= size
+        self.count -= 1
+        self._save_cursor()
+
+    def put(self, item: Union[bytes, bytearray, memoryview]) -> None:
+        """
+        Append item to queue, drop oldest items when size of queue is over max_bytes.
+        Header and item are written one after another, item is not copied.
+        @param item             item need put to queue
+        """
+
+        header = RECORD_HEADER.pack(len(item), zlib.crc32(item))
+        record_size = len(header) + len(item)
+        if record_size > self.max_bytes:
+            verbose("QUEUE", "Item is larger than queue, it is dropped", "ERROR")
+            return
+
+        with self.lock:
+            try:
+                dropped = 0
+                while self.size + record_size > self.max_bytes and self.count > 0:
+                    self._drop_oldest()
+                    dropped += 1
+                if dropped > 0:
+                    verbose(
+                        "QUEUE",
+                        "Queue is full, drop " + str(dropped) + " oldest items",
+                        "ERROR",
+                    )
+
+                if self.writer.tell() > 0 and (
+                    self.writer.tell() + record_size > self.segment_size
+                ):
+                    self._roll()
+                self.writer.write(header)
+                self.writer.write(item)
+                # Readers use mmap, data must be in page cache
+                self.writer.flush()
+                self.counts[self.tail] += 1
+                self.size += record_size
+                self.count += 1
+                self._sync()
+            except Exception as e:
+                verbose("QUEUE", str(e), "ERROR")
+
+    def get(self) -> Union[bytes, None]:
+        """
+        Get next item which is not got, None if there is no item.
+        Item is kept in queue until task_done().
+        """
+
+        with self.lock:
+            if self.count - len(self.in_flight) <= 0:
+                return None
+            try:
+                self.read = self._normalize(self.read)
+                offset, length = self._record(self.read)
+                mapped = self._map(self.read[0], offset + length)
+                return_data = mapped[offset : offset + length]
+                position = self._next(self.read, length)
+                self.in_flight.append((position, RECORD_HEADER.size + length))
+                self.read = position
+                return return_data
+            except Exception as e:
+                verbose("QUEUE", str(e), "ERROR")
+                return None
+
+    def task_done(self) -> None:
+        """
+        Acknowledge oldest item which is got, it is removed from queue.
+        """
+
+        with self.lock:
+            if len(self.in_flight) == 0:
+                return
+            position, size = self.in_flight.popleft()
+            self._advance(position, size)
+            self._sync()
+
+    def qsize(self) -> int:
+        """Number of items not acknowledged"""
+        return self.count
+
+    def nbytes(self) -> int:
+        """Size of items not acknowledged on disk (header included)"""
+        return self.size
+
+    def close(self) -> None:
+        with self.lock:
+            self.writer.flush()
+            if self.fsync != "never" or self.dirty:
+                os.fsync(self.writer.fileno())
+                os.fsync(self.cursor_fd)
+            self.writer.close()
+            os.close(self.cursor_fd)
+            for mapped in self.maps.values():
+                mapped.close()
+            self.maps.clear()
+
+
+def read_records(path: str) -> Iterator[bytes]:
+    """
+    @brief      Read payload of every record on disk (acknowledged or not) without
+                opening queue, used by tools (zstd dictionary training)
+    @param      path            directory of queue
+    @retval     payloads, oldest first
+    """
+
+    for name in sorted(x for x in os.listdir(path) if x.endswith(SEGMENT_SUFFIX)):
+        with open(os.path.join(path, name), "rb") as f:
+            data = f.read()
+        offset = 0
+        while offset + RECORD_HEADER.size <= len(data):
+            length, crc = RECORD_HEADER.unpack_from(data, offset)
+            end = offset + RECORD_HEADER.size + length
+            payload = data[offset + RECORD_HEADER.size : end]
+            if end > len(data) or zlib.crc32(payload) != crc:
+                break
+            yield payload
+            offset = end
@@ -0,0 +1,53 @@
+import argparse
+import sys
+from collections import deque
+from pathlib import Path
+from typing import *
+
+parent_dir_path = str(Path(__file__).resolve().parents[3])
+sys.path.append(parent_dir_path + "/src/modbuslib/src")
+sys.path.append(parent_dir_path + "/src/natsio/src")
+
+from rpi_codec import DICTIONARY_SIZE, SnappyCodec, train_dictionary
+from rpi_segment_queue import read_records
+
+DICTIONARY_SAMPLES: int = 2000  # newest payloads of queue
+
+
+def main(args=None) -> None:
+    """
+    Train zstd dictionary from payloads of message queue of a site running the
+    driver, dictionary file is used by codec "zstd" of device and consumer
+    """
+
+    parser = argparse.ArgumentParser(
+        description="Train zstd dictionary from payloads of message queue"
+    )
+    parser.add_argument("queue", help="directory of message queue (SegmentQueue)")
+    parser.add_argument("output", help="dictionary file")
+    parser.add_argument("--size", type=int, default=DICTIONARY_SIZE)
+    parser.add_argument("--samples", type=int, default=DICTIONARY_SAMPLES)
+    args = parser.parse_args(args)
+
+    codec = SnappyCodec()
+    samples: Deque[bytes] = deque(maxlen=args.samples)
+    for payload in read_records(args.queue):
+        try:
+            samples.append(codec.decompress(payload))
+        except Exception:
+            continue
+    if len(samples) == 0:
+        raise Exception("No payload in queue " + args.queue)
+
+    dictionary = train_dictionary(list(samples), args.size)
+    with open(args.output, "wb") as f:
+        f.write(dictionary)
+    print(
+        "Dictionary {0} ({1} bytes) from {2} payloads".format(
+            args.output, len(dictionary), len(samples)
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -59,8 +59,33 @@ class ConfigFile:
             self.__NATS_server = self.__read_site_config_file(key="Natsio_servers_addr")
             self.__message_buffer = self.__read_site_config_file(key="message_buffer")
             self.__buffer_length = self.__message_buffer["memory_length"]
+            # Optional, max size of queue on disk (0 is default) and fsync policy
+            self.__buffer_disk_length = self.__message_buffer.get("disk_length", 0)
+            self.__buffer_fsync = self.__message_buffer.get("fsync", "interval")
+            # Optional, format of backlog batch ("submission" or "columnar")
+            self.__buffer_batch_format = self.__message_buffer.get(
+                "batch_format", "submission"
+            )
+            # Optional, codec of messages ("snappy" or "zstd") and zstd dictionary
+            self.__buffer_compression = self.__message_buffer.get(
+                "compression", "snappy"
+            )
+            self.__buffer_zstd_dictionary = self.__message_buffer.get(
+                "zstd_dictionary", ""
+            )
             self.__time_out = self.__read_site_config_file(key="time_out")
             self.__topic = self.__read_site_config_file(key="topic")
+            # Optional, 1 is no pipelining
+            self.__tcp_max_in_flight = self.__site_config_file.get(
+                "tcp_max_in_flight", 1
+            )
+            # Optional, serial port of RTU devices by client ID range or SN
+            self.__rs485_ports = self.__site_config_file.get("rs485_ports", {})
+            # Optional, report by exception (snapshot_interval 1 is every point in
+            # every poll)
+            self.__report_by_exception = self.__site_config_file.get(
+                "report_by_exception", {}
+            )
         except Exception as err:
             print(err)
             raise Exception(
@@ -99,6 +124,14 @@ class ConfigFile:
                     ip_address = ""
                     port = 502
 
+                # Get serial port of RTU device, port found by scanner is used first
+                if protocol == mapping_define._RTU:
+                    serial_port = device_property.get(
+                        mapping_define._serial_port, ""
+                    ) or self.get_rs485_port(SN_number, device_id)
+                else:
+                    serial_port = ""
+
                 # Get list data nedd to get
                 if data_collect_path == "":
                     continue
@@ -157,6 +190,7 @@ class ConfigFile:
                 driver_location=driver_location,
                 points=points,
                 protocol=protocol,
+                serial_port=serial_port,
             )
             self.__DEVICE_LIST.append(inverter)
             self.__device_API.update({SN_number: copy.deepcopy(inverter)})
@@ -722,6 +756,89 @@ class ConfigFile:
         """
         return self.__buffer_length
 
+    def get_buffer_disk_length(self):
+        """get max size of message queue on disk
+        Returns:
+            int: max size (bytes), 0 is default size of queue
+        """
+        return self.__buffer_disk_length
+
+    def get_buffer_fsync(self):
+        """get fsync policy of message queue
+        Returns:
+            str: "always", "interval" or "never"
+        """
+        return self.__buffer_fsync
+
+    def get_buffer_batch_format(self):
+        """get format of batch of messages sent from queue backlog
+        Returns:
+            str: "submission" (MetricSubmission) or "columnar" (columnar batch)
+        """
+        return self.__buffer_batch_format
+
+    def get_buffer_compression(self):
+        """get codec of messages
+        Returns:
+            str: "snappy" or "zstd"
+        """
+        return self.__buffer_compression
+
+    def get_buffer_zstd_dictionary(self):
+        """get zstd dictionary file of messages, trained from payloads of driver
+        Returns:
+            str: path of dictionary file, "" is no dictionary
+        """
+        return self.__buffer_zstd_dictionary
+
+    def get_report_by_exception(self):
+        """get report by exception setting of metric groups
+        Returns:
+            Tuple[int, float]: snapshot interval (every point is sent each N polls,
+            1 is every point in every poll) and deadband of float points (part of
+            last sent value)
+        """
+        return (
+            self.__report_by_exception.get("snapshot_interval", 1),
+            self.__report_by_exception.get("deadband", 0.0),
+        )
+
+    def get_tcp_max_in_flight(self):
+        """get max Modbus TCP requests wait for response on one gateway connection
+        Returns:
+            int: max requests in flight, 1 is no pipelining
+        """
+        return self.__tcp_max_in_flight
+
+    def get_rs485_ports(self):
+        """get serial port mapping of RTU devices
+        Returns:
+            Dict[str, Dict[str, Any]]: "client_ID" range [first, last], "device_SN"
+            list and line parameters ("baudrate", "parity", "bytesize", "stopbits")
+            of each serial port
+        """
+        return self.__rs485_ports
+
+    def get_rs485_port(self, SN_number, client_ID):
+        """get serial port of RTU device from site config
+        Args:
+            SN_number (str): serial number of device
+            client_ID (int): client ID of device
+        Returns:
+            str: serial port, "" if device is not mapped
+        """
+        for serial_port, devices in self.__rs485_ports.items():
+            if SN_number in devices.get("device_SN", []):
+                return serial_port
+        for serial_port, devices in self.__rs485_ports.items():
+            client_ID_range = devices.get("client_ID", [])
+            if (
+                len(client_ID_range) == 2
+                and client_ID_range[0] <= int(client_ID) <= client_ID_range[1]
+            ):
+                return serial_port
+        return ""
+
 
 class Inverter:
     """
@@ -731,6 +848,7 @@ class Inverter:
         - IPv4 address
         - ID Modbus address
         - Port number
+        - Serial port (RTU)
         - SN number
         - Location of device's driver
         - Points to read from request from config file
@@ -747,6 +865,7 @@ class Inverter:
         protocol: str,
         IP: str = "",
         port: int = 502,
+        serial_port: str = "",
     ) -> None:
         self.__model = model
         self.__metrics_group = metrics_group
@@ -757,6 +876,7 @@ class Inverter:
         self.__driver_location = driver_location
         self.__points = points
         self.__protocol = protocol
+        self.__serial_port = serial_port
 
     def get_model(self):
         """
@@ -820,3 +940,10 @@ class Inverter:
         @retval: driver's protocol
         """
         return self.__protocol
+
+    def get_serial_port(self):
+        """
+        @brief: get serial port of RTU device
+        @retval: serial port of device, "" is first RS485 adapter
+        """
+        return self.__serial_port
@@ -10,28 +10,57 @@ import modbus_tk.modbus_rtu as mbrtu
 import serial
 import serial.tools.list_ports
 
+# Description of USB RS485 adapter
+RS485_DESCRIPTION: Tuple[str, ...] = ("UART", "RS485")
+# Line parameters of RS485 bus when they are not in site config
+SERIAL_SETTINGS_DEFAULT: Dict[str, Any] = {
+    "baudrate": 9600,
+    "bytesize": 8,
+    "parity": "N",
+    "stopbits": 1,
+}
 
-def connect_serial(COM: str, time_out_rtu: int) -> mbrtu.RtuMaster:
+
+def get_serial_settings(port_config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    @brief      Get line parameters of RS485 bus
+    @param      port_config     config of serial port in site config ("rs485_ports")
+    @retval     baudrate, bytesize, parity and stopbits of bus
+    """
+
+    return {
+        key: port_config.get(key, value)
+        for key, value in SERIAL_SETTINGS_DEFAULT.items()
+    }
+
+
+def connect_serial(
+    COM: str, time_out_rtu: int, **serial_settings: Any
+) -> mbrtu.RtuMaster:
     return_port = mbrtu.RtuMaster(
-        serial.Serial(
-            port=COM,
-            baudrate=9600,
-            bytesize=8,
-            parity="N",
-            stopbits=1,
-            xonxoff=0,
-        )
+        serial.Serial(port=COM, xonxoff=0, **get_serial_settings(serial_settings))
     )
     return_port.set_timeout(time_out_rtu)
     return_port.set_verbose(True)
     return return_port
 
 
-def get_port_RS485() -> Union[str, None]:
+def get_ports_RS485() -> List[str]:
+    """
+    @brief      Get every RS485 adapter connected
+    @retval     serial ports of adapters, sorted by name
+    """
+
     allports = [tuple(p) for p in list(serial.tools.list_ports.comports())]
-    for currentport in allports:
-        if "UART" in currentport[1]:
-            return currentport[0]
-        else:
-            return None
+    return sorted(
+        currentport[0]
+        for currentport in allports
+        if any(x in currentport[1] for x in RS485_DESCRIPTION)
+    )
+
+
+def get_port_RS485() -> Union[str, None]:
+    ports = get_ports_RS485()
+    if len(ports) > 0:
+        return ports[0]
     return None
@@ -35,7 +35,7 @@ import serial.tools.list_ports
 from rpi_compress_data import *
 from rpi_IO import *
 from rpi_modbus import *
-from rpi_natsio_client import NatsioSink, ProcessorActor, Source
+from rpi_natsio_client import NatsioSink, ProcessorActor
 from rpi_identify_device import *
 from rpi_queue import clientQueue
 from rpi_read_config import ConfigFile, Inverter
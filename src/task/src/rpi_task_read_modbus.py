@@ -1,7 +1,8 @@
 import asyncio
-import threading
+import socket
 import sys
 import os
+import shutil
 from asyncio.events import AbstractEventLoop
 from asyncio.futures import Future
 from concurrent.futures import ThreadPoolExecutor
@@ -18,7 +19,6 @@ from nats.aio.client import Client as NATS
 from nats.aio.errors import ErrConnectionClosed, ErrNoServers, ErrTimeout
 from rx.core.typing import Disposable
 from rx.scheduler.eventloop import AsyncIOScheduler
-import modbus_tk.modbus_tcp as mbtcp
 import modbus_tk.modbus_rtu as mbrtu  # type:ignore
 import modbus_tk.defines as mbdefines
 
@@ -34,6 +34,7 @@ sys.path.append(parent_dir_path + "/src/connection/src")
 
 import serial
 import serial.tools.list_ports
+from rpi_codec import get_codec
 from rpi_compress_data import *
 from rpi_IO import *
 from rpi_FileIO import json2dict
@@ -47,11 +48,14 @@ from rpi_modbus import (
     SF,
     E,
     B,
-    PointContainer,
+    PointTable,
 )
-from rpi_natsio_client import NatsioSink, ProcessorActor, Source
+from rpi_modbus_pool import modbus_connection_pool
+from rpi_rtu_scheduler import RtuBusScheduler, RtuBusClient, rtu_bus_registry
+from rpi_natsio_client import NatsioSink, ProcessorActor, AsyncSource, loop_time
 from rpi_identify_device import *
 from rpi_queue import clientQueue
+from rpi_segment_queue import SegmentQueue, MAX_BYTES
 from rpi_read_config import ConfigFile
 from rpi_system import *
 from rpi_verbose import verbose
@@ -68,10 +72,10 @@ from rpi_natsio_connect import init_natsio
 # Default number
 LOOP_TIME: int = 5
 TIMEOUT_RTU: int = 5
+TIMEOUT_RTU_POLL: float = 60  # requests of device wait in queue of RTU bus
 MAX_ERROR: int = 10
 
 event_loop_read_modbus = asyncio.new_event_loop()
-lock = threading.Lock()
 
 
 def watchdog_timer_handle():
@@ -81,14 +85,58 @@ def watchdog_timer_handle():
 watchdog_Timer = Watchdog(300, watchdog_timer_handle)
 
 
-def producer(
+MODBUS_ERROR_LIST: List[str] = [
+    "No route to host",
+    "timed out",
+    "Host is unreachable",
+    "Connection refused",
+    "Network unreachable",
+    "Modbus Error",
+]
+
+
+def _time_now() -> float:
+    now = datetime.now()
+    time_now = int(now.strftime("%H")) + 7 + int(now.strftime("%M")) / 60
+    if time_now > 24:
+        time_now -= 24
+    return time_now
+
+
+def _kill_process_error_USB(error):
+    if "Input/output error" in str(error):
+        p = psutil.Process(psutil.Process().pid)
+        p.kill()
+
+
+def _read_error_process(serial_number: str, error: Exception, time_now: float) -> None:
+    """Count connection error of device in day time and log error
+
+    Args:
+        serial_number (str): serial number device
+        error (Exception): error while read device
+        time_now (float): hour in day
+    """
+    error_name = str(error)
+    for x in MODBUS_ERROR_LIST:
+        if x in error_name:
+            if time_now > 6.5 and time_now < 18:
+                actor_error_database.add(SN=serial_number)
+                break
+    verbose("MODB - Thread " + serial_number, error_name, "ERROR")
+    _kill_process_error_USB(error)
+
+
+async def producer_async(
     serial_number: str,
     device: ModbusDevice,
     input_registers: List[str],
     holding_registers: List[str],
     protocol: str,
-) -> Tuple[Dict[str, PointContainer[Union[S, I, F, SF, E, B]]], Dict[str, Exception]]:
-    """producer function get data from modbus fuction
+    timeout: float = None,
+) -> Tuple[PointTable[Union[S, I, F, SF, E, B]], Dict[str, Exception]]:
+    """producer function get data from modbus device on event loop
+    (AsyncTcpMaster or RtuBusClient)
 
     Args:
         serial_number (str): serial number device
@@ -96,94 +144,72 @@ def producer(
         input_registers (List[str]): data need to get in input register block
         holding_registers (List[str]): data need to get in holding register
         protocol (str): type of protocol to get data
+        timeout (float): max time to read one register block type of device,
+            None is TIMEOUT_RTU_POLL (RTU) or no limit (TCP, each request has its
+            own timeout which does not count time waiting for connection)
 
     Returns:
-        Tuple[Dict[str, PointContainer[Union[S, I, F, SF, E, B]]], Dict[str, Exception]]: Data get from modbus device
+        Tuple[PointTable[Union[S, I, F, SF, E, B]], Dict[str, Exception]]: Data get from modbus device
     """
-    global watchdog_Timer
-    modbus_error_list = [
-        "No route to host",
-        "timed out",
-        "Host is unreachable",
-        "Connection refused",
-        "Network unreachable",
-        "Modbus Error",
-    ]
 
-    def _kill_process_error_USB(error):
-        if "Input/output error" in str(error):
-            p = psutil.Process(psutil.Process().pid)
-            p.kill()
+    if timeout is None and protocol == "RTU":
+        timeout = TIMEOUT_RTU_POLL
 
-    def _read(_read_register, _read_type_register, serial_number):
-        if protocol == "RTU":
-            with lock:
-                data_recieve_holding = device.read_values(
-                    _read_register, _read_type_register
-                )
+    async def _read(_read_register, _read_type_register, serial_number):
+        nonlocal data_recieve_non_error
+        data_recieve_holding = await asyncio.wait_for(
+            device.read_values_async(_read_register, _read_type_register), timeout
+        )
+        if len(data_recieve_non_error) == 0:
+            # Table of first register block type is used without copy
+            data_recieve_non_error = data_recieve_holding[0]
         else:
-            data_recieve_holding = device.read_values(
-                _read_register, _read_type_register
-            )
-        data_recieve_non_error.update(data_recieve_holding[0])
+            data_recieve_non_error.update(data_recieve_holding[0])
         data_recieve_error.update(data_recieve_holding[1])
         if serial_number in actor_error_database.get_list():
             actor_error_database.remove_from_list(SN=serial_number)
 
-    def _error_process(error):
-        error_name = str(error)
-        for x in modbus_error_list:
-            if x in error_name:
-                if time_now > 6.5 and time_now < 18:
-                    actor_error_database.add(SN=serial_number)
-                    break
-        verbose("MODB - Thread " + serial_number, error_name, "ERROR")
-        _kill_process_error_USB(error)
-
-    data_recieve_non_error: Dict[str, Any] = {}
+    data_recieve_non_error: PointTable[Union[S, I, F, SF, E, B]] = PointTable()
     data_recieve_error: Dict[str, Any] = {}
 
-    now = datetime.now()
-    time_now = int(now.strftime("%H")) + 7 + int(now.strftime("%M")) / 60
-    if time_now > 24:
-        time_now -= 24
-
-    if len(input_registers) > 0:
-        try:
-            _read(input_registers, mbdefines.READ_INPUT_REGISTERS, serial_number)
-        except Exception as error:
-            _error_process(error=error)
+    time_now = _time_now()
 
-    if len(holding_registers) > 0:
-        try:
-            _read(holding_registers, mbdefines.READ_HOLDING_REGISTERS, serial_number)
-        except Exception as error:
-            _error_process(error=error)
+    for _read_register, _read_type_register in (
+        (input_registers, mbdefines.READ_INPUT_REGISTERS),
+        (holding_registers, mbdefines.READ_HOLDING_REGISTERS),
+    ):
+        if len(_read_register) > 0:
+            try:
+                await _read(_read_register, _read_type_register, serial_number)
+            except asyncio.TimeoutError:
+                _read_error_process(serial_number, socket.timeout("timed out"), time_now)
+            except Exception as error:
+                _read_error_process(serial_number, error, time_now)
 
-    # watchdog_Timer.reset()
     return (data_recieve_non_error, data_recieve_error)
 
 
-# Connect to RS485
-async def init_serial():
-    COM = get_port_RS485()
-    if COM != None:
+# Connect to every RS485 adapter, requests of devices on each bus go through its
+# scheduler, buses are polled in parallel
+async def init_serial(
+    rs485_ports: Dict[str, Dict[str, Any]] = {}
+) -> Dict[str, RtuBusScheduler]:
+    return_ports: Dict[str, RtuBusScheduler] = {}
+    for COM in get_ports_RS485():
+        # Baudrate and parity of bus from site config, default 9600 8N1
+        serial_settings = get_serial_settings(rs485_ports.get(COM, {}))
         return_port = mbrtu.RtuMaster(
-            serial.Serial(
-                port=COM,
-                baudrate=9600,
-                bytesize=8,
-                parity="N",
-                stopbits=1,
-                xonxoff=0,
-            )
+            serial.Serial(port=COM, xonxoff=0, **serial_settings)
         )
         return_port.set_timeout(TIMEOUT_RTU)
         return_port.set_verbose(True)
-    else:
-        return_port = None
+        return_ports[COM] = RtuBusScheduler(
+            return_port, COM, baudrate=serial_settings["baudrate"]
+        )
+        # Scanner reads this port through its scheduler
+        rtu_bus_registry.register(return_ports[COM])
 
-    return return_port
+    return return_ports
 
 
 async def nats_error_verify(location: str) -> bool:
@@ -201,6 +227,46 @@ async def nats_error_verify(location: str) -> bool:
     return False
 
 
+def migrate_client_queue(
+    path: str, temp_dir: str, maxsize_mem_ram: int, queue: SegmentQueue
+) -> None:
+    """
+    @brief      Move data left in old queue (clientQueue) to segment queue
+    @param      path                folder of old queue
+    @param      temp_dir            temp folder of old queue
+    @param      maxsize_mem_ram     max size of old queue in ram
+    @param      queue               segment queue
+    @retval     None
+    """
+
+    if not os.path.isdir(path):
+        return
+    try:
+        old_queue = clientQueue(
+            path=path, tempdir=temp_dir, maxsize_mem_ram=maxsize_mem_ram
+        )
+        empty_count = 0
+        # get() is None when a chunk is loaded from disk
+        while old_queue.qsize() > 0 and empty_count < 2:
+            data = old_queue.get()
+            if data is None:
+                empty_count += 1
+                continue
+            empty_count = 0
+            queue.put(data)
+            old_queue.task_done()
+        drained = old_queue.qsize() == 0
+    except Exception as e:
+        verbose("QUEUE", str(e), "ERROR")
+        drained = False
+    # Old queue is kept (moved again in next start) until every message is moved
+    if not drained:
+        verbose("QUEUE", "Old queue is not empty, keep " + path, "WARNING")
+        return
+    shutil.rmtree(path, ignore_errors=True)
+    verbose("QUEUE", "Move old queue to " + queue.path, "INFO")
+
+
 # Site subthread
 async def read_modbus_init(
     default_config_file_direct: str = "",
@@ -226,9 +292,12 @@ async def read_modbus_init(
     dir = str(parent_dir_path) + "/queue_store"
     _location: str = metric_submission_init_data["location"]
     loc_dir = _location.replace(" ", "_")
-    site_dir = (
+    old_site_dir = (
         dir + "/push_queue_" + metric_submission_init_data["tenant"] + "_" + loc_dir
     )
+    site_dir = (
+        dir + "/segment_queue_" + metric_submission_init_data["tenant"] + "_" + loc_dir
+    )
     temp_dir = dir + "/temp"
 
     if not os.path.isdir(dir):
@@ -242,13 +311,33 @@ async def read_modbus_init(
     nc = NATS()
 
     # Check USB RS485 Adapter connect
-    connection = await init_serial()
+    rtu_buses = await init_serial(system_config.get_rs485_ports())
 
-    queue = clientQueue(
-        path=site_dir, tempdir=temp_dir, maxsize_mem_ram=maxsize_mem_ram
+    queue = SegmentQueue(
+        path=site_dir,
+        max_bytes=system_config.get_buffer_disk_length() or MAX_BYTES,
+        fsync=system_config.get_buffer_fsync(),
     )
-    sink = NatsioSink.start(topic, queue, _location, nc).proxy()
-    process = ProcessorActor.start(sink).proxy()
+    migrate_client_queue(old_site_dir, temp_dir, maxsize_mem_ram, queue)
+
+    # Each actor has its own codec (compressor is not thread safe)
+    compression = system_config.get_buffer_compression()
+    zstd_dictionary = system_config.get_buffer_zstd_dictionary()
+    sink = NatsioSink.start(
+        topic,
+        queue,
+        _location,
+        nc,
+        batch_format=system_config.get_buffer_batch_format(),
+        codec=get_codec(compression, zstd_dictionary),
+    ).proxy()
+    snapshot_interval, deadband = system_config.get_report_by_exception()
+    process = ProcessorActor.start(
+        sink,
+        snapshot_interval=snapshot_interval,
+        deadband=deadband,
+        codec=get_codec(compression, zstd_dictionary),
+    ).proxy()
 
     while 1:
         # Get data from database
@@ -330,18 +419,26 @@ async def read_modbus_init(
                 input = device_API[i].get_points()
 
                 if device_API[i].get_protocol() == "TCP":
+                    # Devices behind same gateway (host, port) share pooled connection
+                    # to pipeline requests
                     device = ModbusDevice[str, int, float, int, int, int](
-                        connection=mbtcp.TcpMaster(
-                            device_API[i].get_IP(), device_API[i].get_port()
+                        connection=modbus_connection_pool.get(
+                            device_API[i].get_IP(),
+                            device_API[i].get_port(),
+                            max_in_flight=system_config.get_tcp_max_in_flight(),
                         ),
                         device_SN=device_API[i].get_SN(),
                         client_ID=device_API[i].get_ID(),
                         decoder=DatabaseDecoder(),
                         json_file_direct=path_driver_file,
                     )
-                elif device_API[i].get_protocol() == "RTU" and connection != None:
+                elif device_API[i].get_protocol() == "RTU" and len(rtu_buses) > 0:
+                    # Device is not mapped to a connected port use first adapter
+                    rtu_bus = rtu_buses.get(
+                        device_API[i].get_serial_port(), next(iter(rtu_buses.values()))
+                    )
                     device = ModbusDevice[str, int, float, int, int, int](
-                        connection=connection,
+                        connection=RtuBusClient(rtu_bus, period=loop_time),
                         device_SN=device_API[i].get_SN(),
                         client_ID=device_API[i].get_ID(),
                         decoder=DatabaseDecoder(),
@@ -351,19 +448,22 @@ async def read_modbus_init(
                     raise
 
                 # watchdog_Timer.start()
+                # Poll on event loop, no thread per device. Requests of RTU devices
+                # wait in queue of bus scheduler
+                source = AsyncSource(
+                    device_API[i].get_SN(),
+                    process,
+                    producer_async,
+                    device,
+                    metric_submission_init_data,
+                    device_API[i].get_metrics_group(),
+                    device_API[i].get_protocol(),
+                    list(input["input_registers"]),
+                    list(input["holding_registers"]),
+                ).start()
                 actor_database.add(
                     serial_number=device_API[i].get_SN(),
-                    source=Source.start(
-                        device_API[i].get_SN(),
-                        process,
-                        producer,
-                        device,
-                        metric_submission_init_data,
-                        device_API[i].get_metrics_group(),
-                        device_API[i].get_protocol(),
-                        list(input["input_registers"]),
-                        list(input["holding_registers"]),
-                    ).proxy(),
+                    source=source,
                 )
 
                 device_database.accept(device_API[i].get_SN())
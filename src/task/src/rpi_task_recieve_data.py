@@ -35,7 +35,7 @@ import serial.tools.list_ports
 from rpi_compress_data import *
 from rpi_IO import *
 from rpi_modbus import *
-from rpi_natsio_client import NatsioSink, ProcessorActor, Source
+from rpi_natsio_client import NatsioSink, ProcessorActor
 from rpi_identify_device import *
 from rpi_queue import clientQueue
 from rpi_read_config import ConfigFile, Inverter
@@ -44,6 +44,7 @@ from rpi_verbose import verbose
 from rpi_watchdog import Watchdog
 from rpi_database import *
 from rpi_natsio_connect import init_natsio
+from rpi_modbus_pool import modbus_connection_pool
 
 event_loop_get_natsio_event = asyncio.new_event_loop()
 recv_trigger = 0
@@ -109,7 +110,7 @@ async def recieve_nats_data_init(
             ]["registerAddr"]
 
         device = ModbusDevice[str, int, float, int, int, int](
-            connection=mbtcp.TcpMaster(
+            connection=modbus_connection_pool.get_sync(
                 device_API[SN].get_IP(), device_API[SN].get_port()
             ),
             device_SN=device_API[SN].get_SN(),
@@ -118,19 +119,21 @@ async def recieve_nats_data_init(
             json_file_direct=path_driver_file,
         )
 
-        print(
-            device.write_raw_value(
-                type_function=type_function,
-                register=register,
-                input_value=int(recv_data["data"]["new_data"]),
+        try:
+            print(
+                device.write_raw_value(
+                    type_function=type_function,
+                    register=register,
+                    input_value=int(recv_data["data"]["new_data"]),
+                )
             )
-        )
+        finally:
+            # Give pooled connection back
+            device.close_modbus()
 
         data = snappy.compress(data="ok")
         await nc.publish(msg.reply, data)
 
-        device.close_modbus()
-
     await nc.subscribe(topic, cb=messeage_handle)
 
 
@@ -139,6 +139,10 @@ def __reformat_config_data(data: Dict[str, Any]) -> Dict[str, Any]:
         cache.update(site_info)
         cache.update({"topic": data["topic"]})
         cache.update({"Natsio_servers_addr": data["Natsio_servers_addr"]})
+        if "rs485_ports" in data:
+            cache.update({"rs485_ports": data["rs485_ports"]})
+        if "default_gateway" in data:
+            cache.update({"default_gateway": data["default_gateway"]})
         return_data.update({cache["SN"]: cache})
     return return_data
 